@@ -32,6 +32,24 @@ from unidecode import unidecode
 from html import unescape
 from lxml import etree
 import traceback
+import re
+import os
+import json
+import hashlib
+import functools
+from file_util import atomicWrite
+
+# Inline html tags which lxml's parser simply removes, keeping their text content. See _StripSimpleTags().
+_simpleTagNames = frozenset(["a", "abbr", "b", "big", "br", "cite", "code", "em", "font", "i", "img", "mark", "q", "s", "small", "span", "strike", "strong", "sub", "sup", "u"])
+_voidTagNames = frozenset(["br", "img"])
+# Splits text on tags, as: text, (closing slash, tag name, self-closing slash, text)*
+_tagSplitPattern = re.compile(r"<(/?)([A-Za-z][A-Za-z0-9]*)(?=[\s/>])[^<>]*?(/?)>")
+# Characters lxml's html parser may alter or drop; text containing these always goes through lxml
+_lxmlSensitivePattern = re.compile(r"[<>&\x00-\x08\x0b-\x1f\x7f]")
+# Part of the key of on-disk normalized term caches (see NormalizeTerms()); increment it whenever NormalizeText()'s output changes.
+NORMALIZATION_VERSION = 1
+# The NormalizeText() cache size of getSharedNormalizer(); headlines average ~100 chars, so a full cache is tens of MB
+SHARED_CACHE_SIZE = 200000
 
 
 class AsciiTextNormalizer(object):
@@ -39,12 +57,47 @@ class AsciiTextNormalizer(object):
 	An object for making a best-effort attempt to clean english/western input text containing escaped/unescaped unicode/latin-1 and
 	other characters to plain ascii. Its is not true that this can be done in general since these encodings encompass far more
 	characters than ascii, hence its just 'best-effort'.
+
+	@cacheSize: If greater than 0, NormalizeText() memoizes up to this many of its most recently used (text, flags) results, since the same
+	strings (duplicate headlines across snapshots, query and lexicon terms) are normalized over and over. See GetCacheInfo().
 	"""
-	def __init__(self):
+	def __init__(self, cacheSize=0):
 		self._stripCharDict = dict([(ord(c),u" ") for c in u"!@#$%^&*()[]{};:'\",<.>?/~`-_=+|\\/"])
 		self._stripChars = "!@#$%^&*()[]{};:'\",<.>?/~`-_=+|\\/"
 		self._stripCharTable_BlankReplacement = str.maketrans(self._stripChars, "".join([" " for i in range(len(self._stripChars))]))
 		self._stripCharTable_Deletion = str.maketrans({ord(c):None for c in self._stripChars})
+		# Combined single-pass tables for NormalizeText(), keyed by (filterNonAlphaNum, deleteFiltered, lowercase). Each maps '\n' and '\t' to
+		# spaces as CompressWhitespace() does, and filters/lowercases as FilterNonAlphaNum() and lower() do; see _GetNormalizationTables().
+		self._normalizationTables = dict()
+		self._cacheSize = cacheSize
+		self._InitCache()
+
+	def _InitCache(self):
+		self._cachedNormalizeText = None
+		if self._cacheSize > 0:
+			self._cachedNormalizeText = functools.lru_cache(maxsize=self._cacheSize)(self._NormalizeText)
+
+	def __getstate__(self):
+		# the lru cache wraps a bound method and can't be pickled (e.g. when passed to worker processes); each copy starts with an empty cache
+		state = self.__dict__.copy()
+		state["_cachedNormalizeText"] = None
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._InitCache()
+
+	def GetCacheInfo(self):
+		"""
+		Returns the NormalizeText() cache's (hits, misses, maxsize, currsize) namedtuple, or None if caching is disabled.
+		"""
+		if self._cachedNormalizeText is None:
+			return None
+		return self._cachedNormalizeText.cache_info()
+
+	def ClearCache(self):
+		if self._cachedNormalizeText is not None:
+			self._cachedNormalizeText.cache_clear()
 
 	"""
 	For some space-delimited string, filters out all words containing any member of junkSubstrSet as a substr.
@@ -83,9 +136,13 @@ class AsciiTextNormalizer(object):
 
 	def CompressWhitespace(self, s):
 		s = s.replace("\n"," ").replace("\t", " ").strip()
+		return self._CompressSpaces(s)
 
-		#logarithmically reduces the number of whitespaces, 1/2 reduction per iteration
+	def _CompressSpaces(self, s):
+		#logarithmically reduces the number of whitespaces, 1/2 reduction per iteration; so a run of n spaces becomes ceil(n/16) spaces
 		for i in range(4):
+			if "  " not in s:
+				break
 			s = s.replace("  "," ")
 
 		return s
@@ -122,6 +179,54 @@ class AsciiTextNormalizer(object):
 
 		return s
 
+	def _StripSimpleTags(self, s):
+		"""
+		Fast path for DecodeInTextLinks() within NormalizeText(), for text containing only un-nested inline tags, e.g. 'read <a href="...">this</a> now<br/>'.
+		lxml's result is the whitespace-stripped text of each element and its tail, joined by spaces, which for un-nested tags is just the stripped
+		text between the tags, in order. So this gives the same result as DecodeInTextLinks() after CompressWhitespace(), without building a tree.
+		Returns None for anything else (nested tags, which getAllElementText() outputs out of document order, stray closing tags, which lxml ignores,
+		entities, comments, script, other tags, stray '<' or '>', control characters), which must be parsed by lxml.
+		"""
+		parts = _tagSplitPattern.split(s)
+		openTag = None
+		for i in range(1, len(parts), 4):
+			isClosing, name, isSelfClosing = parts[i], parts[i+1].lower(), parts[i+2]
+			if name not in _simpleTagNames:
+				return None
+			if isClosing:
+				if name != openTag or isSelfClosing:
+					return None
+				openTag = None
+			elif openTag is not None or (isSelfClosing and name not in _voidTagNames):
+				return None
+			elif name not in _voidTagNames:
+				openTag = name
+
+		stripped = " ".join([text for text in map(str.strip, parts[0::4]) if len(text) > 0])
+		if _lxmlSensitivePattern.search(stripped) is not None:
+			return None
+		return stripped
+
+	def _GetNormalizationTables(self, filterNonAlphaNum, deleteFiltered, lowercase):
+		"""
+		Returns the (str table, bytes table, bytes deletion chars) that perform the translation and lowercasing steps of NormalizeText() in one pass.
+		The bytes versions are for ascii text, which bytes.translate() processes several times faster than str.translate().
+		"""
+		key = (filterNonAlphaNum, deleteFiltered, lowercase)
+		if key not in self._normalizationTables:
+			fromChars, toChars, deleteChars = "\n\t", "  ", ""
+			if filterNonAlphaNum and deleteFiltered:
+				deleteChars = self._stripChars
+			elif filterNonAlphaNum:
+				fromChars += self._stripChars
+				toChars += " " * len(self._stripChars)
+			byteTable = bytes.maketrans(fromChars.encode("ascii"), toChars.encode("ascii"))
+			# bytes.lower() lowercases only ascii letters, the same as str.lower() does for ascii text
+			if lowercase:
+				byteTable = byteTable.lower()
+			self._normalizationTables[key] = (str.maketrans(fromChars, toChars, deleteChars), byteTable, deleteChars.encode("ascii"))
+		return self._normalizationTables[key]
+
 	def UnescapeUnicode(self, s):
 		"""
 		Resolves a specific/common nuisance with escaped unicode in python3, converting strings like '\\u003c' (literally a backslash followed by u and a literal numeral
@@ -170,19 +275,79 @@ class AsciiTextNormalizer(object):
 		@deleteFiltered: This param only makes sense in the context of @filterNonAlphaNum = True. If both are true, then filtering will delete
 					the filtered characters, rather than replacing them with spaces.
 		"""
+		if self._cachedNormalizeText is not None:
+			return self._cachedNormalizeText(text, filterNonAlphaNum, deleteFiltered, lowercase)
+		return self._NormalizeText(text, filterNonAlphaNum, deleteFiltered, lowercase)
+
+	def _NormalizeText(self, text, filterNonAlphaNum, deleteFiltered, lowercase):
+		#pure ascii text without escapes ('\\u00e0', '&amp;') is unchanged by EncodeAscii(), which can be skipped
+		if not text.isascii() or "\\" in text or "&" in text:
+			text = self.EncodeAscii(text) # must be done before DecodeInTextLinks, to ensure \\u003c becomes '<' for tags for instance.
+
+		if "<" in text and ">" in text:
+			#only build an lxml tree for text that isn't just simple inline tags
+			strippedText = self._StripSimpleTags(text)
+			text = strippedText if strippedText is not None else self.DecodeInTextLinks(text)
+
+		#FilterNonAlphaNum(), lower() and the newline/tab replacement of CompressWhitespace() as a single translation
+		strTable, byteTable, deleteChars = self._GetNormalizationTables(filterNonAlphaNum, deleteFiltered, lowercase)
+		if text.isascii():
+			text = text.encode("ascii").translate(byteTable, deleteChars).decode("ascii")
+		else:
+			text = text.translate(strTable)
+			if lowercase:
+				text = text.lower()
 
-		text = self.EncodeAscii(text) # must be done before DecodeInTextLinks, to ensure \\u003c becomes '<' for tags for instance.
-		text = self.DecodeInTextLinks(text)
-
-		if filterNonAlphaNum:
-			text = self.FilterNonAlphaNum(text, deleteMode=deleteFiltered)
+		text = self._CompressSpaces(text.strip())
 
-		if lowercase:
-			text = text.lower()
+		return text
 
-		text = self.CompressWhitespace(text)
+	def NormalizeTerms(self, terms, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=None):
+		"""
+		Normalizes a list of terms, such as a lexicon, per NormalizeText().
+		@cacheDir: If given, the normalized terms are persisted in this directory as [hash].json, keyed by a sha1 hash of the raw terms (that is, of the
+		lexicon file's contents as loaded), the flags and NORMALIZATION_VERSION, so repeat runs load them instead of renormalizing every term.
+		See getNormalizedTermsCacheDir().
+		"""
+		cachePath = None
+		if cacheDir is not None:
+			keyString = json.dumps([NORMALIZATION_VERSION, bool(filterNonAlphaNum), bool(deleteFiltered), bool(lowercase), terms])
+			cachePath = os.path.join(cacheDir, hashlib.sha1(keyString.encode("utf8")).hexdigest()+".json")
+			if os.path.isfile(cachePath):
+				try:
+					with open(cachePath, "r") as cacheFile:
+						normalized = json.load(cacheFile)
+					if len(normalized) == len(terms):
+						return normalized
+				except:
+					traceback.print_exc()
+
+		normalized = [self.NormalizeText(term, filterNonAlphaNum=filterNonAlphaNum, deleteFiltered=deleteFiltered, lowercase=lowercase) for term in terms]
+		if cachePath is not None:
+			# Failing to cache is not an error
+			try:
+				os.makedirs(cacheDir, exist_ok=True)
+				with atomicWrite(cachePath) as cacheFile:
+					json.dump(normalized, cacheFile)
+			except:
+				traceback.print_exc()
 
-		return text
+		return normalized
 
+def getNormalizedTermsCacheDir(lexiconPath):
+	"""
+	Returns the directory next to a lexicon file or folder where AsciiTextNormalizer.NormalizeTerms() persists its normalized terms.
+	"""
+	return lexiconPath.rstrip(os.sep) + ".normcache"
 
+# The normalizer shared by callers which repeatedly normalize the same strings, see getSharedNormalizer()
+_sharedNormalizer = None
 
+def getSharedNormalizer():
+	"""
+	Returns a process-wide AsciiTextNormalizer with a NormalizeText() cache, so duplicate strings normalized by different callers are only normalized once.
+	"""
+	global _sharedNormalizer
+	if _sharedNormalizer is None:
+		_sharedNormalizer = AsciiTextNormalizer(cacheSize=SHARED_CACHE_SIZE)
+	return _sharedNormalizer
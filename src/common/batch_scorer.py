@@ -0,0 +1,102 @@
+"""
+Vectorized batch cheetah scoring.
+
+cheetah.cheetifyHeadline_optimized() scores one headline at a time, with a python loop over every word to average
+its term vectors. Per src/util/test/sum_of_dot_products, the cheetah score of a document is:
+
+	score = (v_avg dot v_sig) / |v_avg|
+
+where v_avg is the document's average term vector and v_sig is the pre-computed difference of the positive and
+negative sum-of-unit vectors. This computes the same thing for a whole list of documents at once:
+	1) tokenize all documents, mapping each in-vocabulary token to its integer row id in the embedding matrix
+	2) build a sparse (docs x vocab) matrix D, where D[d,w] = (count of w in d) / (in-vocab tokens in d)
+	3) all document mean vectors are then the single sparse-dense product D * E, for embedding matrix E. D's columns are compacted
+	to the batch's distinct terms, and multiplied by only their rows of E, so the (memory-mapped, float32) E is never copied or upcast whole.
+	4) all scores are the single matrix-vector product (D * E) * v_sig, divided by the row norms of D * E
+
+Documents are processed in batches of @batchSize so the dense (batchSize x dim) mean-vector matrix stays bounded for
+multi-million document corpora.
+"""
+
+import sys
+import numpy as np
+import scipy.sparse
+import vector_store
+
+
+def getWordIndex(wv):
+	"""
+	Returns a dict mapping each term in @wv (gensim KeyedVectors or a VectorStore) to its row index in @wv.vectors.
+	"""
+	if isinstance(wv, vector_store.VectorStore):
+		return wv.vocab
+	return dict((word, i) for i, word in enumerate(wv.index2word))
+
+class BatchScorer(object):
+	"""
+	Scores many documents against a single signal vector. See the module header.
+	@model: A cheetah model, as returned by cheetah.loadCheetahModel()
+	@signalVec: The signal vector, e.g. sumPosUnitVec - sumNegUnitVec for sentiment, or a single lexicon's sum-of-unit vector.
+	@batchSize: The number of documents scored per sparse matrix product.
+	"""
+	def __init__(self, model, signalVec, batchSize=20000):
+		self._wordIndex = getWordIndex(model.wv)
+		self._vectors = model.wv.vectors
+		self._signalVec = np.asarray(signalVec, dtype=np.float64)
+		self._batchSize = batchSize
+
+	def _buildTermMatrix(self, texts):
+		"""
+		Tokenizes @texts on whitespace, returning the sparse (docs x batch terms) averaging matrix D described in the header, the
+		embedding matrix row ids of its columns (the batch's distinct terms), and the number of in-vocabulary tokens per document.
+		"""
+		getIndex = self._wordIndex.get
+		indices = []
+		indptr = [0]
+		for text in texts:
+			indices.extend([i for i in map(getIndex, text.split()) if i is not None])
+			indptr.append(len(indices))
+
+		indptr = np.asarray(indptr, dtype=np.int64)
+		counts = np.diff(indptr)
+		#each token contributes 1/n to its document's mean vector; duplicate tokens are summed by the product
+		weights = np.repeat(1.0 / np.maximum(counts, 1), counts)
+		termIds, columns = np.unique(np.asarray(indices, dtype=np.int64), return_inverse=True)
+		termMatrix = scipy.sparse.csr_matrix((weights, columns.ravel(), indptr), shape=(len(texts), len(termIds)))
+		return termMatrix, termIds, counts
+
+	def MeanVectors(self, texts):
+		"""
+		Returns the (docs x dim) float64 matrix of average term vectors of @texts, and the number of in-vocabulary tokens per text.
+		Rows for texts with no in-vocabulary tokens are zero.
+		"""
+		termMatrix, termIds, counts = self._buildTermMatrix(texts)
+		return np.asarray(termMatrix.dot(self._vectors[termIds])), counts
+
+	def ScoreTexts(self, texts):
+		"""
+		Returns a numpy array of cheetah scores for a list of strings. Texts with no in-vocabulary terms score 0.0, as in
+		cheetifyHeadline_optimized().
+		"""
+		meanVecs, counts = self.MeanVectors(texts)
+		hits = counts > 0
+		scores = np.zeros(len(texts))
+		scores[hits] = meanVecs[hits].dot(self._signalVec) / np.linalg.norm(meanVecs[hits], axis=1)
+		return scores
+
+	def ScoreHeadlines(self, headlines, attribKey="cheetah"):
+		"""
+		Scores all @headlines (any objects with GetFullText() and an Attrib dict), storing each score in headline.Attrib[@attribKey].
+		Returns: the scores as a numpy array, in the order of @headlines.
+		"""
+		scores = np.zeros(len(headlines))
+		for start in range(0, len(headlines), self._batchSize):
+			batch = headlines[start:start+self._batchSize]
+			batchScores = self.ScoreTexts([headline.GetFullText() for headline in batch])
+			for headline, score in zip(batch, batchScores):
+				headline.Attrib[attribKey] = float(score)
+			scores[start:start+len(batch)] = batchScores
+			print("\rScored document {} of {}      ".format(start+len(batch), len(headlines)), end="")
+			sys.stdout.flush()
+		print("")
+		return scores
@@ -4,19 +4,167 @@ From VecSent. This is all duplicated code, so maintain both copies appropriately
 
 """
 
+import os
+import hashlib
+import collections
 import gensim
 from random import shuffle
 import numpy as np
+import scipy.sparse
 import traceback
 from lexica import SentimentLexicon
 from lexica import Lexicon
+import vector_store
+from file_util import atomicWrite
+from batch_scorer import BatchScorer, getWordIndex
 
-#A wrapper to make fasttext KeyedVector model look like a gensim Word2Vec model
+#A wrapper to make fasttext KeyedVector model (or a vector_store.VectorStore) look like a gensim Word2Vec model
 class FastTextModelWrapper(object):
 	def __init__(self, model):
 		self.wv = model
 		self.vector_size = model.vector_size
 
+def getSignalCacheDir(modelPath):
+	"""
+	Returns the directory next to a model (text model or vector store) where NormalizedModelWrapper persists lexicon signal vectors.
+	"""
+	return modelPath.rstrip(os.sep) + ".sigcache"
+
+class NormalizedModelWrapper(object):
+	"""
+	Wraps a cheetah model (anything with .wv and .vector_size) to cache the norm work repeated by getSumUnitVec(), sumCossim(),
+	cossimLexiconGenerator() and buildVectorCache():
+		-the row norms and row-normalized (unit) matrix of wv.vectors are computed once, on first use
+		-sum-of-unit vectors for lexica are cached by a sha1 hash of the lexicon's sorted terms (and the model's shape), in memory
+		and, if @cacheDir is given, on disk as [hash].npy files, so repeated analyses with the same lexicon skip all norm work.
+		The in-memory cache holds the @maxCachedLexica most recently used lexica.
+	All other attributes are those of the wrapped model, so this is a drop-in cheetah model. Unit vectors of zero vectors are zero.
+	"""
+	def __init__(self, model, cacheDir=None, maxCachedLexica=64):
+		self._model = model
+		self.wv = model.wv
+		self.vector_size = model.vector_size
+		self._cacheDir = cacheDir
+		self._maxCachedLexica = maxCachedLexica
+		self._wordIndex = None
+		self._norms = None
+		self._unitVectors = None
+		self._sumUnitVecs = collections.OrderedDict()
+
+	def __getattr__(self, name):
+		# only called for attributes not found on the wrapper; private names are excluded so unpickling doesn't recurse on self._model
+		if name.startswith("_"):
+			raise AttributeError(name)
+		return getattr(self._model, name)
+
+	def __getstate__(self):
+		# don't pickle the derived matrices to worker processes; they are cheaper to recompute than to copy
+		state = self.__dict__.copy()
+		state["_norms"] = None
+		state["_unitVectors"] = None
+		state["_wordIndex"] = None
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+
+	def GetWordIndex(self):
+		if self._wordIndex is None:
+			self._wordIndex = getWordIndex(self.wv)
+		return self._wordIndex
+
+	def GetNorms(self):
+		if self._norms is None:
+			self._norms = np.linalg.norm(self.wv.vectors, axis=1)
+		return self._norms
+
+	def GetUnitVectors(self):
+		"""
+		Returns the (vocab x dim) matrix of unit term vectors, in the row order of wv.vectors.
+		"""
+		if self._unitVectors is None:
+			norms = self.GetNorms()
+			self._unitVectors = np.asarray(self.wv.vectors, dtype=np.float32) / np.where(norms > 0, norms, 1.0)[:,None].astype(np.float32)
+		return self._unitVectors
+
+	def DotUnitVectors(self, vec, chunkSize=None):
+		"""
+		Returns the dot product of every unit term vector with @vec, i.e. GetUnitVectors().dot(@vec).
+		@chunkSize: If not None and the unit matrix hasn't been computed, rows are normalized and multiplied @chunkSize at a time,
+		bounding memory to a (@chunkSize x dim) block rather than the full unit matrix.
+		"""
+		vec = np.asarray(vec, dtype=np.float32)
+		if self._unitVectors is not None or chunkSize is None:
+			return self.GetUnitVectors().dot(vec)
+
+		vectors = self.wv.vectors
+		products = np.zeros(vectors.shape[0], dtype=np.float32)
+		for start in range(0, vectors.shape[0], chunkSize):
+			chunk = np.asarray(vectors[start:start+chunkSize], dtype=np.float32)
+			norms = np.linalg.norm(chunk, axis=1)
+			products[start:start+chunk.shape[0]] = chunk.dot(vec) / np.where(norms > 0, norms, 1.0)
+		return products
+
+	def GetUnitVecs(self, words):
+		"""
+		Returns the (len(@words) x dim) matrix of unit vectors of @words, which must all be in the model.
+		"""
+		wordIndex = self.GetWordIndex()
+		rows = [wordIndex[w] for w in words]
+		if self._unitVectors is not None:
+			return self._unitVectors[rows]
+		#normalize just these rows, rather than computing the full unit matrix for a few terms
+		vecs = np.asarray(self.wv.vectors[rows], dtype=np.float32)
+		norms = np.linalg.norm(vecs, axis=1)
+		return vecs / np.where(norms > 0, norms, 1.0)[:,None]
+
+	def _getLexiconKey(self, words):
+		hasher = hashlib.sha1()
+		hasher.update("{} {}\n".format(len(self.GetWordIndex()), self.vector_size).encode("utf-8"))
+		hasher.update("\n".join(sorted(words)).encode("utf-8"))
+		return hasher.hexdigest()
+
+	def _computeSumUnitVec(self, words):
+		sumUnitVec = np.zeros(self.vector_size)
+		if len(words) > 0:
+			sumUnitVec += self.GetUnitVecs(words).sum(axis=0, dtype=np.float64)
+		return sumUnitVec
+
+	def GetSumUnitVec(self, words, persist=True):
+		"""
+		Cached getSumUnitVec(): returns the sum of the unit vectors of @words, which must all be in the model.
+		@persist: If false, the sum is computed without being cached, for one-off term lists such as ad-hoc queries.
+		"""
+		if not persist:
+			return self._computeSumUnitVec(words)
+
+		key = self._getLexiconKey(words)
+		if key in self._sumUnitVecs:
+			self._sumUnitVecs.move_to_end(key)
+			return self._sumUnitVecs[key].copy()
+
+		cachePath = os.path.join(self._cacheDir, key+".npy") if self._cacheDir is not None else None
+		if cachePath is not None and os.path.isfile(cachePath):
+			sumUnitVec = np.load(cachePath)
+		else:
+			sumUnitVec = self._computeSumUnitVec(words)
+			if cachePath is not None:
+				self._saveSumUnitVec(sumUnitVec, cachePath)
+
+		self._sumUnitVecs[key] = sumUnitVec
+		if len(self._sumUnitVecs) > self._maxCachedLexica:
+			self._sumUnitVecs.popitem(last=False)
+		return sumUnitVec.copy()
+
+	def _saveSumUnitVec(self, sumUnitVec, cachePath):
+		# Failing to cache is not an error
+		try:
+			os.makedirs(self._cacheDir, exist_ok=True)
+			with atomicWrite(cachePath, "wb") as cacheFile:
+				np.save(cacheFile, sumUnitVec)
+		except:
+			traceback.print_exc()
+
 """
 Fasttext models can be loaded into gensim, although it aint clear how long this will last, or fasttext will overtake gensim
 From the developer:
@@ -28,45 +176,74 @@ Also, gensim.models.wrappers.FastText.load_word2vec_format is deprecated, and it
 can in fasttext). But it also sounds like bullshit: if vectors (models) can be loaded, they can be trained upon.
 
 """
-def loadFastTextModel(modelPath):
+def loadFastTextModel(modelPath, limit=100000):
+	#prefer the binary store if the model has been converted; see convertFastTextModel()
+	storePath = vector_store.getStorePath(modelPath)
+	if vector_store.isVectorStore(storePath):
+		return loadVectorStoreModel(storePath)
 	#for .vec models only; see header comment
 	if modelPath.endswith(".vec"):
 		print("Loading fasttext model from {}... this can take several seconds to a few minutes...".format(modelPath))
+		print("Convert the model to a binary vector store (see main menu) to load it in milliseconds instead.")
 		#model = gensim.models.wrappers.FastText.load_word2vec_format(modelPath, limit=100000)
-		model = gensim.models.KeyedVectors.load_word2vec_format(modelPath, limit=100000)
-		return FastTextModelWrapper(model)
+		model = gensim.models.KeyedVectors.load_word2vec_format(modelPath, limit=limit)
+		return NormalizedModelWrapper(FastTextModelWrapper(model), getSignalCacheDir(modelPath))
 	else:
 		print("ERROR fasttext model must end in .vec. See loadFasttestModel()")
 		return None
 
+def loadVectorStoreModel(storePath):
+	"""
+	Memory-maps a vector store written by convertFastTextModel(). The vectors are shared read-only across processes via the page cache.
+	"""
+	store = vector_store.VectorStore(storePath)
+	print("Loaded {} {} term vectors from vector store {}".format(len(store), store.GetDtype(), storePath))
+	return NormalizedModelWrapper(FastTextModelWrapper(store), getSignalCacheDir(storePath))
+
+def convertFastTextModel(modelPath, limit=100000, dtype="float32"):
+	"""
+	One-time conversion of a fasttext .vec text model to a binary vector store next to the model (see vector_store.py).
+	Once converted, loadFastTextModel() and loadCheetahModel() load the store instead of re-parsing the text model.
+	@limit: The number of vectors to convert. Defaults to the same limit loadFastTextModel() uses, so results are unchanged; pass None for all of them.
+	@dtype: 'float32' or 'float16'
+	Returns: The store path, or None on failure.
+	"""
+	if not modelPath.endswith(".vec"):
+		print("ERROR fasttext model must end in .vec to convert it: "+modelPath)
+		return None
+	return vector_store.convertVecToStore(modelPath, vector_store.getStorePath(modelPath), dtype=dtype, limit=limit)
+
 """
 
 """
 def loadCheetahModel(modelPath):
+	#prefer a converted vector store, whether @modelPath is the store itself or the text model it was converted from
+	for storePath in [modelPath, vector_store.getStorePath(modelPath)]:
+		if vector_store.isVectorStore(storePath):
+			return loadVectorStoreModel(storePath)
 	print("Loading model for cheetah. WARNING: model path must contain 'fasttext' to load as fasttext. Default is word2vec.")
 	if "fasttext" in modelPath.lower():
 		return loadFastTextModel(modelPath)
-	return gensim.models.Word2Vec.load(modelPath)
+	return NormalizedModelWrapper(gensim.models.Word2Vec.load(modelPath), getSignalCacheDir(modelPath))
 
-def sumCossim(sigTerms1, sigTerms2, model):
+def sumCossim(sigTerms1, sigTerms2, model, verbose=True):
 	"""
 	Returns the net cossine similarity between two term sets using the term vectors in @model, and the number of term-misses in 
 	@sigTerms1 and @sigTerms2. The misses must be returned so the caller can weight the score by term hits.
+	The double sum of cossims factors to a single dot product of the two sets' sums of unit vectors (see util/test/sum_of_dot_products_test.py).
+	@sigTerms2 should be the larger, reused set (e.g. a sentiment lexicon), since its sum-of-unit vector is cached by a NormalizedModelWrapper.
 	"""
 	st1 = [w for w in sigTerms1 if w in model.wv.vocab]
 	st2 = [w for w in sigTerms2 if w in model.wv.vocab]
 	#Track and at least output the number of terms missing from @model
-	print("SumCossim(): num sigTerms1={}, {} after model filter. sigTerms2={}, {} after model filter.".format(len(sigTerms1), len(st1), len(sigTerms2), len(st2)))
+	if verbose:
+		print("SumCossim(): num sigTerms1={}, {} after model filter. sigTerms2={}, {} after model filter.".format(len(sigTerms1), len(st1), len(sigTerms2), len(st2)))
 
+	# sum_x sum_y cossim(x,y) = (sum_x x/|x|) dot (sum_y y/|y|)
 	netSim = 0.0
-	# cossim def: v1.dot(v2) / (|v1| * |v2|).  The norms can be cached and reused.
-	for s1 in st1:
-		s1Vec = model.wv[s1]
-		s1Norm = np.linalg.norm(s1Vec)
-		for s2 in st2:
-			s2Vec = model.wv[s2]
-			s2Norm = np.linalg.norm(s2Vec)
-			netSim += (s1Vec.dot(s2Vec) / (s1Norm*s2Norm))
+	if len(st1) > 0 and len(st2) > 0:
+		sumUnitVec1 = getUnitVecs(model, st1).sum(axis=0, dtype=np.float64)
+		netSim = float(sumUnitVec1.dot(getSumUnitVec(model, st2)))
 
 	sig1Misses = len(sigTerms1) - len(st1)
 	sig2Misses = len(sigTerms2) - len(st2)
@@ -90,17 +267,47 @@ def netAlgebraicSentiment(queryTerms, sentLex, model, avgByHits=True):
 	simple way of comparing that bias for different topics. For the most part this is "showing your work". I'm not yet sure how a model
 	could be normalized w.r.t. some topics to 'un-bias' the model algebraically, but its an important topic.
 	"""
-	posSim, qMisses, posMisses = sumCossim(queryTerms, sentLex.Positives, model)
-	negSim, qMisses, negMisses = sumCossim(queryTerms, sentLex.Negatives, model)
-	
-	if not avgByHits:
-		return posSim - negSim
-
-	posHits = len(sentLex.Positives) - posMisses
-	negHits = len(sentLex.Negatives) - negMisses
+	return float(netAlgebraicSentimentBatch([queryTerms], sentLex, model, avgByHits)[0])
 
+def getSentimentSignalVec(sentLex, model, avgByHits=True):
+	"""
+	Returns the vector s such that netAlgebraicSentiment(topic) = (sum of the topic's unit vectors) dot s, which factors out of both sumCossim() calls:
+		s = sumPosUnitVec / posHits - sumNegUnitVec / negHits, or just sumPosUnitVec - sumNegUnitVec if not @avgByHits.
+	"""
+	positives = [w for w in sentLex.Positives if w in model.wv.vocab]
+	negatives = [w for w in sentLex.Negatives if w in model.wv.vocab]
+	sumPosUnitVec = getSumUnitVec(model, positives)
+	sumNegUnitVec = getSumUnitVec(model, negatives)
+	if not avgByHits:
+		return sumPosUnitVec - sumNegUnitVec
 	# Kludgiest normalization ever...
-	return posSim / posHits - negSim / negHits
+	return sumPosUnitVec / max(len(positives), 1) - sumNegUnitVec / max(len(negatives), 1)
+
+def netAlgebraicSentimentBatch(topicLists, sentLex, model, avgByHits=True):
+	"""
+	Batch version of netAlgebraicSentiment(), for scoring many topics against the same lexicon, e.g. for model-bias audits.
+	The lexicon's signal vector is computed once (see getSentimentSignalVec()), each topic's sum-of-unit vector is a row of the
+	sparse (topics x terms) indicator matrix times the topic terms' unit vectors, and all topics are then scored by one matrix-vector product.
+	@topicLists: A list of topics, each a list of terms like the @queryTerms of netAlgebraicSentiment()
+	Returns: A numpy array of net sentiment scores, one per topic. Topics with no terms in @model score 0.0.
+	"""
+	signalVec = getSentimentSignalVec(sentLex, model, avgByHits)
+	# map each distinct in-vocab topic term to a column
+	termIndex = dict()
+	indices = []
+	indptr = [0]
+	for topic in topicLists:
+		for term in topic:
+			if term in model.wv.vocab:
+				indices.append(termIndex.setdefault(term, len(termIndex)))
+		indptr.append(len(indices))
+	if len(termIndex) == 0:
+		return np.zeros(len(topicLists))
+
+	topicMatrix = scipy.sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(topicLists), len(termIndex)))
+	# Duplicate topic terms are summed, the same as in the double loop of cossims
+	termScores = getUnitVecs(model, list(termIndex.keys())).dot(signalVec)
+	return topicMatrix.dot(termScores)
 
 def buildVectorCache(terms, vecModel):
 	"""
@@ -113,6 +320,12 @@ def buildVectorCache(terms, vecModel):
 	"""
 	# maps term keys to vector 2-ples as: term -> (termVec, termNorm)
 	cache = dict() #pre-compute term vector norms and store vectors for faster lookups
+	if isinstance(vecModel, NormalizedModelWrapper):
+		wordIndex = vecModel.GetWordIndex()
+		norms = vecModel.GetNorms()
+		for term in terms:
+			cache[term] = (vecModel.wv[term], norms[wordIndex[term]])
+		return cache
 	for term in terms:
 		vec = vecModel.wv[term]
 		vecNorm = np.linalg.norm(vec)
@@ -123,19 +336,31 @@ def netAlgebraicSentimentWrapper(queryTerms, sentimentFolder, model, avgByHits=T
 	sentLex = SentimentLexicon(sentFolder=sentimentFolder)
 	return netAlgebraicSentiment(queryTerms, sentLex, model, avgByHits)
 
-#Given a list of terms, rank all terms in @model by their sum cossine similary to these terms
-def cossimLexiconGenerator(model, queryTerms):
-	rankedTerms = []
-
-	#get all query vectors and precompute their norms. no need to store any backward info, e.g. vec -> term
-	qvecs = [(model.wv[qw], np.linalg.norm(model.wv[qw])) for qw in queryTerms if qw in model.wv.vocab]
-	for w in model.wv.vocab:
-		wvec = model.wv[w]
-		wnorm = np.linalg.norm(model.wv[w])
-		cossim = sum([wvec.dot(qtup[0]) / (qtup[1]*wnorm) for qtup in qvecs])
-		rankedTerms.append( (w,cossim) )
-
-	rankedTerms.sort(key=lambda t: t[1], reverse=True)
+def cossimLexiconGenerator(model, queryTerms, k=None, chunkSize=None):
+	"""
+	Given a list of terms, rank all terms in @model by their sum cossine similary to these terms.
+	The sum cossim of term w to all query terms is unit(w).dot(sum of query unit vectors), so the whole vocabulary is scored by a single
+	matrix-vector product over the unit-normalized embedding matrix.
+	@k: If not None, only the top @k terms are returned, selected by np.argpartition instead of sorting the whole vocabulary.
+	@chunkSize: If not None, and the model's unit matrix isn't already cached, the vocabulary is scored @chunkSize rows at a time so
+	the unit matrix is never held in memory. Useful for the full 2M term fasttext model.
+	Returns: A list of (term, cossim) tuples, by descending cossim. Ties keep model order.
+	"""
+	if not isinstance(model, NormalizedModelWrapper):
+		model = NormalizedModelWrapper(model)
+	#queries are ad hoc, so their sums aren't cached like those of lexica
+	sumQueryUnitVec = model.GetSumUnitVec([qw for qw in queryTerms if qw in model.wv.vocab], persist=False)
+	cossims = model.DotUnitVectors(sumQueryUnitVec, chunkSize=chunkSize)
+
+	if k is None or k >= len(cossims):
+		ranking = np.argsort(-cossims, kind="stable")
+	else:
+		#all terms tied with the k-th are candidates, since argpartition picks among ties arbitrarily
+		kth = cossims[np.argpartition(-cossims, k-1)[k-1]]
+		topK = np.flatnonzero(cossims >= kth)
+		ranking = topK[np.lexsort((topK, -cossims[topK]))][0:k]
+	index2word = model.wv.index2word
+	rankedTerms = [(index2word[i], float(cossims[i])) for i in ranking]
 
 	return rankedTerms
 
@@ -176,6 +401,7 @@ def cheetifyHeadline_optimized(headline, avgVec, sumPosUnitVec, sumNegUnitVec, m
 	a double sum over cosine similarities factors to a far more efficient form than actually calculating the
 	full sum, since the signal lexica sum-of-norm vector can be pre-computed and re-used. 
 	Or, just do the math...
+	NOTE: To score many headlines, use batch_scorer.BatchScorer (see analysis3()), which computes the same values with matrix products.
 	"""
 	avgVec[:] = 0.0
 	n = 0.0
@@ -237,11 +463,23 @@ def filterSentLex(model, sentLex):
 	# Re-balance after filtering through model lexicon
 	return sentLex.getBalancedSets()
 
+def getUnitVecs(model, words):
+	"""
+	Returns the (len(@words) x dim) matrix of unit vectors of @words, which must all be in @model.
+	"""
+	if isinstance(model, NormalizedModelWrapper):
+		return model.GetUnitVecs(words)
+	vecs = np.array([model.wv[w] for w in words])
+	return vecs / np.linalg.norm(vecs, axis=1)[:,None]
+
 def getSumUnitVec(model, words):
 	"""
 	Returns the sum of unit vectors from the passed model for some lexica.
 	NOTE: This is not a unit vector, it is a sum of unit vectors.
+	For a NormalizedModelWrapper (as returned by the model loaders), the result is cached per lexicon; see NormalizedModelWrapper.
 	"""
+	if isinstance(model, NormalizedModelWrapper):
+		return model.GetSumUnitVec(words)
 	sumNormVec = np.zeros(model.vector_size)
 	for w in words:
 		vw = model.wv[w]
@@ -252,15 +490,13 @@ def analysis3(model, headlines, sentLex):
 	print("Analysis 3...")
 	
 	sentLex = filterSentLex(model, sentLex)
-	avgVec = np.zeros(model.vector_size)
 	sumPosUnitVec = getSumUnitVec(model, sentLex.Positives)
 	sumNegUnitVec = getSumUnitVec(model, sentLex.Negatives)
 
 	try:
-		for i, headline in enumerate(headlines):
-			sumSimilarity = cheetifyHeadline_optimized(headline, avgVec, sumPosUnitVec, sumNegUnitVec, model)
-			if i % 10000 == 9999:
-				print("\rSim: {:.3f}, document {} of {}      ".format(sumSimilarity, i, len(headlines)), end="")
+		#batch equivalent of calling cheetifyHeadline_optimized() on each headline
+		scorer = BatchScorer(model, sumPosUnitVec - sumNegUnitVec)
+		scorer.ScoreHeadlines(headlines, attribKey="cheetah")
 	except:
 		traceback.print_exc()
 
@@ -271,16 +507,13 @@ def analysis3_SingleLexicon(model, headlines, lexicon):
 	input("WARNING: I haven't tested/verified this yet. Enter any key to continue, and remove this input line once tested.")
 
 	signalTerms = filterLex(model, lexicon.Words)
-	avgVec = np.zeros(model.vector_size)
-	sumLexUnitVec = getSumUnitVec(model, lexicon.Words)
-	signalTerms = [term for term in lexicon.Words if term in model.wv]
 	print("After filtering by model vocab, lexicon contains {} terms ({} before filtering)".format(len(signalTerms), len(lexicon.Words)))
+	sumLexUnitVec = getSumUnitVec(model, signalTerms)
 
 	try:
-		for i, headline in enumerate(headlines):
-			sumSimilarity = cheetifyHeadline_singleLex_optimized(headline, avgVec, sumUnitVec, model)
-			if i % 10000 == 9999:
-				print("Sim: {:.3f}, object {} of {}".format(sumSimilarity, i, len(headlines)))
+		#batch equivalent of calling cheetifyHeadline_singleLex_optimized() on each headline
+		scorer = BatchScorer(model, sumLexUnitVec)
+		scorer.ScoreHeadlines(headlines, attribKey="cheetah_lex")
 	except:
 		traceback.print_exc()
 
@@ -1,9 +1,15 @@
 import os
 import json
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from lexica import Lexicon, SentimentLexicon
 import cheetah
 from data_transformer import DataTransformer
+from score_aggregation import HeadlineScores, getCollectionScoreRange
+import smoothing
 
 
 """
@@ -13,22 +19,17 @@ Random scripts for transforming and presenting cheetah results.
 """
 Given a sequence of say, floats for some plot, and an integer k, this computes
 the k-window average sequence of the same size as @seq. For the left and right ends,
-the segments which may be less than k, a smaller avg is used: k-1 to the left of seq[k],
-k-2 for left of seq[k-1], etc. So the end values will just converge to the actual values there.
+where the window runs off the sequence, only the values within the sequence are averaged,
+so the end values will just converge to the actual values there. See smoothing.movingAverage().
 
 A perferred option is to simply pass in a sequence for which you're interested in only the center len-2k
 portion, such that the k-length ends can just be trimmed, such that all values are true radial averages of size k.
+@edges: "shrink", "nan" or "trim", see smoothing
 
 Returns: k-window smoothed sequence of @seq values
 """
-def _kAverageSequence(seq,k):
-	avgSeq = []
-	for i in range(len(seq)):
-		left = int(max(0, i-k/2))
-		right = int(min(len(seq), i+k/2))	
-		avgSeq.append(float(sum(seq[left:right])) / float(right-left+1))
-
-	return avgSeq
+def _kAverageSequence(seq, k, edges="shrink"):
+	return smoothing.movingAverage(seq, k, edges).tolist()
 
 
 def getColor(topics, colors, index):
@@ -47,73 +48,236 @@ def getColor(topics, colors, index):
 
 #assumes @headlines has already been analyzed by cheetah, with scores stored in @headline.cheetah
 #Returns a single list of sum-scores for each time bin, along with the corresponding list of bin indices/names
+#@headlines: A list of headlines, or their HeadlineScores, to avoid re-reading the scores of the same headlines
+#@dtGrouping: "daily", "weekly", "monthly" or "yearly", see time_binning
 def getCheetahScores(headlines, dtLow, dtHigh, dtGrouping, normalizeScores, cheetahKey="cheetah"):
-	#single dim list
-	netScores = []
-	#plot weekly sentiment
-	binKeys = []
-	i = 0
-	timeBins = DataTransformer.BinHeadlinesByTimespan(headlines, dtLow, dtHigh, dtGrouping)
-	for timeBin in timeBins:
-		binKeys.append(timeBin[0])
-		netScore = sum([headline.Attrib[cheetahKey] for headline in timeBin[1]])
-		if normalizeScores and len(timeBin[1]): # average score over headline count, instead or raw
-			netScore /= float(len(timeBin[1]))
-		netScores.append(netScore)
+	headlineScores = headlines if isinstance(headlines, HeadlineScores) else HeadlineScores(headlines, cheetahKey)
+	#count, sum and mean of each time bin's scores, in one pass
+	binned = headlineScores.BinScores(dtLow, dtHigh, dtGrouping)
+	if binned is None:
+		return [], []
+	binKeys, counts, sums, means = binned
+	# average score over headline count, instead or raw; empty bins score 0
+	scores = means if normalizeScores else sums
+	netScores = [score if count > 0 else 0 for score, count in zip(scores.tolist(), counts.tolist())]
 
 	return netScores, binKeys
 
-def plotCheetahHistogram(resultCollection, asDensity=False, numBins=150, savePath=None, cheetahKey="cheetah"):
+def _getHistogramReport(headlineScores, numBins, asDensity):
+	#the unweighted and share-weighted histograms of each result's scores, over the range of all results' scores; or None if there are no scores
+	valueRange = getCollectionScoreRange(headlineScores)
+	if valueRange is None:
+		return None
+	edges = None
+	counts, shareCounts = [], []
+	for scores in headlineScores:
+		resultCounts, edges = scores.Histogram(numBins, valueRange, density=asDensity)
+		counts.append(resultCounts.tolist())
+		shareCounts.append(scores.Histogram(numBins, valueRange, shareWeighted=True, density=asDensity)[0].tolist())
+	return {"density": asDensity, "edges": edges.tolist(), "counts": counts, "shareCounts": shareCounts, "means": [scores.GetMeanScore() for scores in headlineScores]}
+
+def plotCheetahHistogram(resultCollection, asDensity=False, numBins=150, savePath=None, cheetahKey="cheetah", headlineScores=None):
 	"""
-	Plots a histogram of cheetah sentiment values for a result collection.
-	This could be extended to weight by social shares simply by using the @weights parameter of numpy.histogram
+	Plots a histogram of cheetah sentiment values for a result collection, and another weighted by social shares.
 	@asDensity: If true, each plot will be normed, such that its integral is 1.0
+	@savePath: If given, the histograms are saved to this path, with the share-weighted one suffixed "_share_weighted"; otherwise they're shown
+	@headlineScores: The HeadlineScores of each of resultCollection.QueryResults, if already built
 	"""
+	if headlineScores is None:
+		headlineScores = [HeadlineScores(result.Headlines, cheetahKey) for result in resultCollection.QueryResults]
+	histogram = _getHistogramReport(headlineScores, numBins, asDensity)
+	if histogram is None:
+		print("ERROR no cheetah scores to plot")
+		return
 
-	#get the max/min value to determine the range of the histogram over 
-	maxValue = -100000000000
-	minValue =  100000000000
-	for result in resultCollection.QueryResults:
-		for headline in result.Headlines:
-			sent = headline.Attrib[cheetahKey]
-			if sent > maxValue:
-				maxValue = sent
-			if sent < minValue:
-				minValue = sent
-
-	topics = []
-	for result in resultCollection.QueryResults:
-		sents = [headline.Attrib[cheetahKey] for headline in result.Headlines]
-		plt.hist(sents, numBins, (minValue, maxValue), alpha=0.5, density=asDensity)
-		if len(sents) > 0:
-			avgSent = float(sum(sents)) / float(len(sents))
-			plt.axvline(avgSent, color='k', linestyle='dashed', linewidth=1)
-		topics.append(result.Topics[0])
-
-	plt.title("Gross Cheetah Score 100-bin Histogram")
-	plt.xlabel("Score")
-	plt.ylabel("Frequency")
-	plt.legend(topics, loc="best")
-	if savePath is None:
-		plt.show()
-	else:
-		plt.savefig(savePath)
-		plt.clf()
-
-	for result in resultCollection.QueryResults:
-		sents = [headline.Attrib[cheetahKey] for headline in result.Headlines]
-		weights = [headline.Attrib["share_count"] if "share_count" in headline.Attrib and headline.Attrib["share_count"] > 0 else 1 for headline in result.Headlines]
-		plt.hist(sents, numBins, (minValue, maxValue), alpha=0.5, weights=weights, density=asDensity)
-
-	plt.title("Gross Cheetah Score 100-bin Histogram, Share Weighted")
-	plt.xlabel("Sentiment")
-	plt.ylabel("Share Frequency")
-	plt.legend(topics, loc="best")
-	if savePath is None:
+	topics = [result.Topics[0] for result in resultCollection.QueryResults]
+	savePaths = [[], []] if savePath is None else [[savePath], [_getShareWeightedPath(savePath)]]
+	_plotHistograms(histogram, topics, savePaths, show=savePath is None, headless=False)
+
+def _getShareWeightedPath(path):
+	root, ext = os.path.splitext(path)
+	return root + "_share_weighted" + ext
+
+"""
+Cheetah reports.
+
+A report holds every series a cheetah analysis of one result collection plots: per-topic binned net scores, their k-bin averages and
+gross totals, and score histograms, each computed once. It is a dict of plain python values, so it can be written as json or sent to a
+worker process, and rendered separately from the (model-bound) analysis. renderCheetahReport() draws a report on matplotlib Figures
+directly, rather than via pyplot's global state, so headless rendering uses the Agg canvas and needs no display; renderCheetahReports()
+renders many reports in parallel worker processes, for unattended batch runs over many sources and topic sets.
+"""
+
+#@title: The title of the raw score series plot, e.g. "Gross Cheetah Sentiment"
+#@k: The window of the smoothed series
+#@smoothingEdges: How the smoothed series handles windows running off its ends, see smoothing
+#@numHistBins: The number of histogram bins
+def buildCheetahReport(resultCollection, dtLow, dtHigh, dtGrouping="weekly", normalizeScores=True, cheetahKey="cheetah", title="Gross Cheetah Sentiment", useScoreWeight=False, k=2, numHistBins=75, smoothingEdges="shrink"):
+	#the scores of each result are read into arrays once, for both the time series and the histograms
+	headlineScores = [HeadlineScores(result.Headlines, cheetahKey) for result in resultCollection.QueryResults]
+	#netScores outer-list indexed by topicIndex, inner lists indexed via binKeys
+	netScores = []
+	topicLists = []
+	binKeys = []
+	for result, scores in zip(resultCollection.QueryResults, headlineScores):
+		topicScores, binKeys = getCheetahScores(scores, dtLow, dtHigh, dtGrouping, normalizeScores, cheetahKey=cheetahKey)
+		netScores.append(topicScores)
+		topicLists.append(result.Topics)
+
+	return {
+		"name": resultCollection.Name,
+		"cheetahKey": cheetahKey,
+		"title": title,
+		"dtGrouping": dtGrouping,
+		"useScoreWeight": useScoreWeight,
+		"topicLists": topicLists,
+		"binKeys": binKeys,
+		"netScores": netScores,
+		"grossScores": [int(sum(scores)) for scores in netScores],
+		"k": k,
+		"smoothedScores": [_kAverageSequence(scores, k, smoothingEdges) for scores in netScores],
+		"numHistBins": numHistBins,
+		"histograms": [_getHistogramReport(headlineScores, numHistBins, asDensity) for asDensity in [False, True]]
+	}
+
+def getReportFilePrefix(report, resultFolder):
+	topics = "_".join([topicList[0] for topicList in report["topicLists"]])
+	return os.path.join(resultFolder, report["name"]+"_"+topics)
+
+def _newFigure(headless):
+	if headless:
+		figure = Figure()
+		FigureCanvasAgg(figure)
+		return figure
+	return plt.figure()
+
+def _finishFigure(figure, savePaths, show, headless):
+	for savePath in savePaths:
+		figure.savefig(savePath)
+	if show and not headless:
 		plt.show()
+	if not headless:
+		plt.close(figure)
+
+def _getXAxisLabel(dtGrouping):
+	if dtGrouping == "weekly":
+		return "ISO Week"
+	elif dtGrouping == "monthly":
+		return "Month"
+	elif dtGrouping == "daily":
+		return "Day"
+	return "Year"
+
+def _plotSeries(report, series, title, savePaths, show, headless):
+	colors = ["r","b","g","c","m","y","k"]
+	topicLists, grossScores, binKeys = report["topicLists"], report["grossScores"], report["binKeys"]
+	figure = _newFigure(headless)
+	axes = figure.add_subplot(111)
+	legendLabels = []
+	#plot each topic
+	for topicIndex in range(len(topicLists)):
+		color = getColor(topicLists[topicIndex], colors, topicIndex)
+		#a trimmed smoothed series starts at the first full window
+		offset = report["k"] // 2 if len(series[topicIndex]) < len(binKeys) else 0
+		axes.plot(range(offset, offset + len(series[topicIndex])), series[topicIndex], color=color)
+		grossStr = str(grossScores[topicIndex])
+		if grossScores[topicIndex] > 0:
+			grossStr = "+" + grossStr
+		legendLabels.append(topicLists[topicIndex][0]+" "+grossStr)
+
+	xlabels = ["-".join(str(k) for k in binKey) for binKey in binKeys]
+	xlabels = [xlabels[i] for i in range(len(xlabels)) if i % 4 == 0]
+	xticks = [i for i in range(len(binKeys)) if i % 4 == 0]
+	axes.set_xticks(xticks)
+	axes.set_xticklabels(xlabels, rotation=60)
+	axes.set_title(title)
+	axes.set_xlabel(_getXAxisLabel(report["dtGrouping"]))
+	axes.legend(legendLabels, loc="best")
+	axes.grid()
+	_finishFigure(figure, savePaths, show, headless)
+
+#@savePaths: The lists of paths of the unweighted and of the share-weighted histogram
+def _plotHistograms(histogram, topics, savePaths, show, headless):
+	#the histograms are computed with numpy, and plotted as one weighted sample per bin
+	edges = histogram["edges"]
+	for countsKey, title, xlabel, ylabel, paths in [
+			("counts", "Gross Cheetah Score 100-bin Histogram", "Score", "Frequency", savePaths[0]),
+			("shareCounts", "Gross Cheetah Score 100-bin Histogram, Share Weighted", "Sentiment", "Share Frequency", savePaths[1])]:
+		figure = _newFigure(headless)
+		axes = figure.add_subplot(111)
+		for resultIndex, counts in enumerate(histogram[countsKey]):
+			axes.hist(edges[:-1], edges, weights=counts, alpha=0.5)
+			if countsKey == "counts" and histogram["means"][resultIndex] is not None:
+				axes.axvline(histogram["means"][resultIndex], color='k', linestyle='dashed', linewidth=1)
+		axes.set_title(title)
+		axes.set_xlabel(xlabel)
+		axes.set_ylabel(ylabel)
+		axes.legend(topics, loc="best")
+		_finishFigure(figure, paths, show, headless)
+
+def renderCheetahReport(report, resultFolder=None, formats=("png",), show=False, headless=True):
+	"""
+	Writes a report's netscores json, and renders its raw and smoothed score series and histograms.
+	@resultFolder: The folder of the output files, named as "<source>_<topics>_<cheetahKey>_..."; if None, nothing is written
+	@formats: The image formats to write, e.g. ("png", "svg")
+	@show: If true and not @headless, shows the series plots interactively (and the histograms, if they aren't written)
+	@headless: If true, renders with the Agg canvas, without pyplot or a display
+	"""
+	stem = report["cheetahKey"]
+	expected = "_expected" if report["useScoreWeight"] else ""
+	k = report["k"]
+	filePrefix = None
+	if resultFolder is not None:
+		filePrefix = getReportFilePrefix(report, resultFolder)
+		#save the raw netscores; this provides direct reproducibility of the output values, e.g. for regression
+		scoreDicts = [{"scores": scores, "topics": topicList} for scores, topicList in zip(report["netScores"], report["topicLists"])]
+		with open(filePrefix+"_"+stem+"_netscores.json", "w+") as jsonReproFile:
+			jsonReproFile.write(json.dumps({"binKeys": report["binKeys"], "output": scoreDicts}, indent=2))
+
+	def getPaths(suffix):
+		if filePrefix is None:
+			return []
+		return [filePrefix+suffix+"."+fmt for fmt in formats]
+
+	_plotSeries(report, report["netScores"], report["title"], getPaths(expected+"_"+stem+"_raw_"+report["dtGrouping"]), show, headless)
+	_plotSeries(report, report["smoothedScores"], report["title"]+", "+str(k)+"-Bin Average", getPaths(expected+"_"+stem+"_smoothed_"+str(k)+"bin_avg"), show, headless)
+
+	topics = [topicList[0] for topicList in report["topicLists"]]
+	for histogram in report["histograms"]:
+		if histogram is None:
+			continue
+		suffix = "_"+stem+"_hist_"+("as_density_" if histogram["density"] else "")+str(report["numHistBins"])+"bin"
+		_plotHistograms(histogram, topics, [getPaths(suffix), getPaths(suffix+"_share_weighted")], show and filePrefix is None, headless)
+
+def _renderCheetahReportHeadless(report, resultFolder, formats):
+	#headless rendering draws on Agg canvases directly, so the pyplot backend (e.g. of an interactive session calling this in-process) is left as is
+	try:
+		renderCheetahReport(report, resultFolder, formats, show=False, headless=True)
+	except Exception:
+		traceback.print_exc()
+		return False
+	return True
+
+def renderCheetahReports(reports, resultFolder, formats=("png",), numWorkers=None):
+	"""
+	Renders @reports headlessly (see renderCheetahReport()) in a pool of @numWorkers processes, defaulting to the number of cpus.
+	Returns: The number of reports rendered successfully; failed reports are reported but don't stop the others.
+	"""
+	if numWorkers is None:
+		numWorkers = os.cpu_count()
+	os.makedirs(resultFolder, exist_ok=True)
+	print("Rendering {} cheetah reports to {} with {} workers...".format(len(reports), resultFolder, numWorkers))
+	if numWorkers <= 1 or len(reports) <= 1:
+		rendered = [_renderCheetahReportHeadless(report, resultFolder, formats) for report in reports]
 	else:
-		plt.savefig(savePath)
-		plt.clf()
+		with ProcessPoolExecutor(max_workers=min(numWorkers, len(reports))) as executor:
+			rendered = list(executor.map(_renderCheetahReportHeadless, reports, [resultFolder]*len(reports), [formats]*len(reports)))
+	return sum(rendered)
+
+def _printGrossScores(report, heading):
+	print(heading)
+	for topicList, grossScore in zip(report["topicLists"], report["grossScores"]):
+		print(topicList[0]+": "+str(grossScore))
 
 """
 Cheetah analysis
@@ -121,6 +285,8 @@ Cheetah analysis
 Remember to filter lexicon of topic/target terms. For example 'trump' is both a topic term and often a positive lexicon term.
 
 @normalizeScores: If true, normalize topical scores by headline count for that topic
+@headless: If true, plots are only written to @resultFolder (using the Agg canvas), rather than also shown
+@formats: The image formats to write, e.g. ("png", "svg")
 """
 def cheetahSentimentAnalysis(\
 		resultCollections,\
@@ -132,7 +298,9 @@ def cheetahSentimentAnalysis(\
 		resultFolder=None,\
 		useScoreWeight=False,\
 		useSoftMatch=False,\
-		normalizeScores=True):
+		normalizeScores=True,\
+		headless=False,\
+		formats=("png",)):
 
 	print("Running cheetah sentiment analysis. Remember to filter input lexicon of topic/target terms to prevent ambiguity, e.g. 'trump'=positive term and topic term.")
 
@@ -143,116 +311,38 @@ def cheetahSentimentAnalysis(\
 	#print("Resaving cheetah data...")
 	#ResultCollection.SaveCollections(resultCollections, "cheetah.json")
 
-	#netScores outer-list indexed by topicIndex, inner lists indexed via binKeys
-	netScores = []
-	topicLists = []
-	for result in resultCollections[0].QueryResults:
-		topicScores, binKeys = getCheetahScores(result.Headlines, dtLow, dtHigh, dtGrouping, normalizeScores, cheetahKey="cheetah")
-		netScores.append(topicScores)
-		topicLists.append(result.Topics)
-
-	#save the raw netscores; this provides direct reproducibility of the output values, e.g. for regression
-	if resultFolder is not None:
-		if resultFolder[-1] != os.sep:
-			resultFolder += os.sep
-		topics = "_".join([topicList[0] for topicList in topicLists])
-		src = resultCollections[0].Name
-		filePrefix = resultFolder+src+"_"+topics
-		fileStr = filePrefix+"_cheetah_netscores.json"
-		#dictify the scores, topics, date-labels
-		dicts = []
-		for i in range(len(netScores)):
-			scores = netScores[i]
-			topicList = topicLists[i]
-			scoreDict = {"scores": scores, "topics": topicList}
-			dicts.append(scoreDict)
-		reproDict = dict()
-		reproDict["binKeys"] = binKeys
-		reproDict["output"] = dicts
-		with open(fileStr, "w+") as jsonReproFile:
-			jsonReproFile.write(json.dumps(reproDict, indent=2))
-
+	report = buildCheetahReport(resultCollections[0], dtLow, dtHigh, dtGrouping, normalizeScores, "cheetah", "Gross Cheetah Sentiment", useScoreWeight)
 	#print gross values
-	print("Gross Cheetah Sentiment Values ")
-	grossSents = []
-	for topicListIndex in range(len(topicLists)):
-		grossSents.append(int(sum([t for t in netScores[topicListIndex]])))
-		print(topicLists[topicListIndex][0]+": "+str(int(sum([t for t in netScores[topicListIndex]]))))
+	_printGrossScores(report, "Gross Cheetah Sentiment Values ")
+	renderCheetahReport(report, resultFolder, formats, show=not headless, headless=headless)
 
-	#plot raw pmi values
-	colors = ["r","b","g","c","m","y","k"]
-	legendLabels = []
-	xs = [i for i in range(len(netScores[0]))]
-	#plot each topic
-	for topicIndex in range(len(topicLists)):
-		color = getColor(topicLists[topicIndex], colors, topicIndex)
-		plt.plot(xs, [t for t in netScores[topicIndex]], color=color)
-		grossStr = str(grossSents[topicIndex])
-		if grossSents[topicIndex] > 0:
-			grossStr = "+" + grossStr
-		legendLabels.append(topicLists[topicIndex][0]+" "+grossStr)
-		
-	xlabels = [str(binKey[0])+"-"+str(binKey[1]) for binKey in binKeys]
-	#print("LABELS: "+str(xlabels))
-	xlabels = [xlabels[i] for i in range(len(xlabels)) if i % 4 == 0]
-	xticks = [i for i in range(len(binKeys)) if i % 4 == 0]
-	#print("LABELS: "+str(xlabels))
-	#time.sleep(30)
-	if dtGrouping == "weekly":
-		xAxisLabel="ISO Week"
-	elif dtGrouping == "monthly":
-		xAxisLabel = "Month" 
+	return report["smoothedScores"]
 
-	plt.xticks(xticks, xlabels, rotation= 60)
-	plt.title("Gross Cheetah Sentiment")
-	plt.xlabel(xAxisLabel)
-	plt.legend(legendLabels, loc="best")
-	plt.grid()
-	if resultFolder is not None:
-		if useScoreWeight:
-			plt.savefig(filePrefix+"_expected_cheetah_raw_"+dtGrouping+".png")
-		else:
-			plt.savefig(filePrefix+"_cheetah_raw_"+dtGrouping+".png")
-	plt.show()
-	#plt.clf()
-	
-	#smooth values over a k-bin window
-	k = 2
-	legendLabels = []
-	meanScores = [_kAverageSequence([t for t in netScores[topicIndex]], k) for topicIndex in range(len(topicLists))]
-	xs = [i for i in range(len(meanScores[0]))]
-	#plot each topic
-	for topicIndex in range(len(topicLists)):
-		color = getColor(topicLists[topicIndex], colors, topicIndex)
-		plt.plot(xs, meanScores[topicIndex], color=color)
-		grossStr = str(grossSents[topicIndex])
-		if grossSents[topicIndex] > 0:
-			grossStr = "+" + grossStr
-		legendLabels.append(topicLists[topicIndex][0]+" "+grossStr)
-
-	plt.xticks(xticks, xlabels, rotation = 60)
-	plt.title("Gross Cheetah Sentiment, "+str(k)+"-Bin Average")
-	plt.legend(legendLabels, loc="best")
-	plt.xlabel(xAxisLabel)
-	plt.grid()
-	if resultFolder is not None:
-		if useScoreWeight:
-			plt.savefig(filePrefix+"_expected_cheetah_smoothed_"+str(k)+"bin_avg.png")
-		else:
-			plt.savefig(filePrefix+"_cheetah_smoothed_"+str(k)+"bin_avg.png")
-	plt.show()
-	#plt.clf()
-
-	#plot sentiment histogram
-	plotCheetahHistogram(resultCollections[0], False, 75, filePrefix+"_cheetah_hist_75bin.png")
-	plotCheetahHistogram(resultCollections[0], True, 75, filePrefix+"_cheetah_hist_as_density_75bin.png")
-
-	return meanScores
+"""
+Batch cheetah sentiment analysis: analyzes every result collection (e.g. one per source), then renders all of their reports headlessly
+in parallel. Scoring needs the model, so it runs in this process; only the rendering is parallel.
+@numWorkers: The number of rendering processes, defaulting to the number of cpus
+Returns: The list of reports, one per result collection
+"""
+def cheetahSentimentReports(resultCollections, lexicon, model, dtLow, dtHigh, resultFolder, dtGrouping="weekly", useScoreWeight=False, normalizeScores=True, formats=("png",), numWorkers=None):
+	reports = []
+	for collection in resultCollections:
+		print("Running cheetah sentiment analysis of {}...".format(collection.Name))
+		for result in collection.QueryResults:
+			cheetah.analysis3(model, result.Headlines, lexicon)
+		report = buildCheetahReport(collection, dtLow, dtHigh, dtGrouping, normalizeScores, "cheetah", "Gross Cheetah Sentiment", useScoreWeight)
+		_printGrossScores(report, "Gross Cheetah Sentiment Values of {}".format(collection.Name))
+		reports.append(report)
+
+	numRendered = renderCheetahReports(reports, resultFolder, formats, numWorkers)
+	print("Rendered {} of {} reports".format(numRendered, len(reports)))
+	return reports
 
 """
 Cheetah analysis, using a single lexicon as input. This is used to analyze a topic or set of topics with respect to a single lexicon.
+@normalizeScores: If true, each time bin scores the mean of its headlines' scores, otherwise their sum
 """
-def cheetahLexicalAnalysis(resultCollections, lexiconPath, model, dtLow, dtHigh, dtGrouping="weekly", resultFolder=None, useScoreWeight=False, useSoftMatch=False):
+def cheetahLexicalAnalysis(resultCollections, lexiconPath, model, dtLow, dtHigh, dtGrouping="weekly", resultFolder=None, useScoreWeight=False, normalizeScores=True, headless=False, formats=("png",)):
 	#Topic terms are removed from sentiment lexica in GetNetPPmiSentimentScores..()
 	lexicon = Lexicon(lexiconPath)
 	cheetahKey = "cheetah_lex"
@@ -266,110 +356,9 @@ def cheetahLexicalAnalysis(resultCollections, lexiconPath, model, dtLow, dtHigh,
 	#print("here")
 	#time.sleep(5)
 
-	#netScores outer-list indexed by topicIndex, inner lists indexed via binKeys
-	netScores = []
-	topicLists = []
-	for result in resultCollections[0].QueryResults:
-		topicScores, binKeys = getCheetahScores(result.Headlines, dtLow, dtHigh, dtGrouping, useScoreWeight, useSoftMatch, cheetahKey=cheetahKey)
-		netScores.append(topicScores)
-		topicLists.append(result.Topics)
-
-	#save the raw netscores; this provides direct reproducibility of the output values, e.g. for regression
-	if resultFolder is not None:
-		if resultFolder[-1] != os.sep:
-			resultFolder += os.sep
-		topics = "_".join([topicList[0] for topicList in topicLists])
-		src = resultCollections[0].Name
-		filePrefix = resultFolder+src+"_"+topics
-		fileStr = filePrefix+"_cheetah_lex_netscores.json"
-		#dictify the scores, topics, date-labels
-		dicts = []
-		print(str(netScores))
-		print(str(topicLists))
-		for i in range(len(netScores)):
-			scores = netScores[i]
-			topicList = topicLists[i]
-			scoreDict = {"scores": scores, "topics": topicList}
-			dicts.append(scoreDict)
-		reproDict = dict()
-		reproDict["binKeys"] = binKeys
-		reproDict["output"] = dicts
-		with open(fileStr, "w+") as jsonReproFile:
-			jsonReproFile.write(json.dumps(reproDict, indent=2))
-
+	report = buildCheetahReport(resultCollections[0], dtLow, dtHigh, dtGrouping, normalizeScores, cheetahKey, "Gross Cheetah Score", useScoreWeight)
 	#print gross values
-	print("Gross Cheetah Lexicon Values ")
-	grossSents = []
-	for topicListIndex in range(len(topicLists)):
-		grossSents.append(int(sum([t for t in netScores[topicListIndex]])))
-		print(topicLists[topicListIndex][0]+": "+str(int(sum([t for t in netScores[topicListIndex]]))))
+	_printGrossScores(report, "Gross Cheetah Lexicon Values ")
+	renderCheetahReport(report, resultFolder, formats, show=False, headless=headless)
 
-	#plot raw pmi values
-	colors = ["r","b","g","c","m","y","k"]
-	legendLabels = []
-	xs = [i for i in range(len(netScores[0]))]
-	#plot each topic
-	for topicIndex in range(len(topicLists)):
-		color = getColor(topicLists[topicIndex], colors, topicIndex)
-		plt.plot(xs, [t for t in netScores[topicIndex]], color=color)
-		grossStr = str(grossSents[topicIndex])
-		if grossSents[topicIndex] > 0:
-			grossStr = "+" + grossStr
-		legendLabels.append(topicLists[topicIndex][0]+" "+grossStr)
-		
-	xlabels = [str(binKey[0])+"-"+str(binKey[1]) for binKey in binKeys]
-	#print("LABELS: "+str(xlabels))
-	xlabels = [xlabels[i] for i in range(len(xlabels)) if i % 4 == 0]
-	xticks = [i for i in range(len(binKeys)) if i % 4 == 0]
-	#print("LABELS: "+str(xlabels))
-	#time.sleep(30)
-	if dtGrouping == "weekly":
-		xAxisLabel="ISO Week"
-	elif dtGrouping == "monthly":
-		xAxisLabel = "Month" 
-
-	plt.xticks(xticks, xlabels, rotation= 60)
-	plt.title("Gross Cheetah Score")
-	plt.xlabel(xAxisLabel)
-	plt.legend(legendLabels, loc="best")
-	plt.grid()
-	if resultFolder is not None:
-		if useScoreWeight:
-			plt.savefig(filePrefix+"_expected_cheetah_lex_raw_"+dtGrouping+".png")
-		else:
-			plt.savefig(filePrefix+"_cheetah_lex_raw_"+dtGrouping+".png")
-	#plt.show()
-	plt.clf()
-	
-	#smooth values over a k-bin window
-	k = 2
-	legendLabels = []
-	meanScores = [_kAverageSequence([t for t in netScores[topicIndex]], k) for topicIndex in range(len(topicLists))]
-	xs = [i for i in range(len(meanScores[0]))]
-	#plot each topic
-	for topicIndex in range(len(topicLists)):
-		color = getColor(topicLists[topicIndex], colors, topicIndex)
-		plt.plot(xs, meanScores[topicIndex], color=color)
-		grossStr = str(grossSents[topicIndex])
-		if grossSents[topicIndex] > 0:
-			grossStr = "+" + grossStr
-		legendLabels.append(topicLists[topicIndex][0]+" "+grossStr)
-
-	plt.xticks(xticks, xlabels, rotation = 60)
-	plt.title("Gross Cheetah Score, "+str(k)+"-Bin Average")
-	plt.legend(legendLabels, loc="best")
-	plt.xlabel(xAxisLabel)
-	plt.grid()
-	if resultFolder is not None:
-		if useScoreWeight:
-			plt.savefig(filePrefix+"_expected_cheetah_lex_smoothed_"+str(k)+"bin_avg.png")
-		else:
-			plt.savefig(filePrefix+"_cheetah_lex_smoothed_"+str(k)+"bin_avg.png")
-	#plt.show()
-	plt.clf()
-
-	#plot sentiment histogram
-	plotCheetahHistogram(resultCollections[0], False, 75, filePrefix+"_cheetah_lex_hist_75bin.png", cheetahKey)
-	plotCheetahHistogram(resultCollections[0], True, 75, filePrefix+"_cheetah_lex_hist_as_density_75bin.png", cheetahKey)
-
-	return meanScores
+	return report["smoothedScores"]
@@ -1,28 +1,185 @@
 import csv
 import os
 import sys
+import json
+import datetime
+import shutil
 import traceback
+from concurrent.futures import ProcessPoolExecutor
+from file_util import atomicWrite
 
 """
 Iterator for csv data.
 See Pandas before reusing this--they may have better interfaces for transforming csv data.
+
+The file is read as bytes, line by line, so that @Offset always holds the byte offset just past the last record
+yielded. This allows iterating only the records within a byte range [@startOffset, @endOffset), where both offsets
+must lie on record boundaries, as returned by findRecordBoundaries(). The header is always read from the start of the file.
 """
 class CsvRecordGenerator(object):
-	def __init__(self, csvPath, delimiter=',', encoding="utf-8"):
-		self._csvFile = open(csvPath,"r", encoding=encoding)
-		self._csvReader = csv.reader(self._csvFile, delimiter=delimiter)
+	def __init__(self, csvPath, delimiter=',', encoding="utf-8", startOffset=None, endOffset=None, verbose=True):
+		self._csvFile = open(csvPath,"rb")
+		self._encoding = encoding
+		self._endOffset = endOffset
+		self._verbose = verbose
+		self.Offset = 0
+		self._csvReader = csv.reader(self._readLines(), delimiter=delimiter)
 		self.fieldnames = next(self._csvReader)
+		if startOffset is not None:
+			self._csvFile.seek(startOffset)
+			self.Offset = startOffset
+
+	def _readLines(self):
+		while self._endOffset is None or self.Offset < self._endOffset:
+			line = self._csvFile.readline()
+			if not line:
+				break
+			self.Offset += len(line)
+			yield line.decode(self._encoding)
 
 	def __iter__(self):
 		i = 0
 		for record in self._csvReader:
 			i+=1
-			if i % 1000 == 999:
+			if self._verbose and i % 1000 == 999:
 				print("\r{} records processed     ".format(i), end="")
 				sys.stdout.flush()
 			yield record
 		self._csvFile.close()
 
+	def Close(self):
+		self._csvFile.close()
+
+def findRecordBoundaries(csvPath, numShards, delimiter=',', encoding="utf-8"):
+	"""
+	Splits the records of a csv file into @numShards contiguous byte ranges of roughly equal size. The split points always
+	fall on record boundaries, even for quoted fields containing newlines, since they are found by parsing the file with
+	the same csv reader used to transform it. This costs one parsing pass, which is negligible compared to any transform
+	expensive enough to be worth running in parallel.
+	Returns: A list of (startOffset, endOffset) byte ranges covering all records after the header, in file order.
+	"""
+	reader = CsvRecordGenerator(csvPath, delimiter=delimiter, encoding=encoding, verbose=False)
+	dataStart = reader.Offset
+	shardSize = float(os.path.getsize(csvPath) - dataStart) / max(numShards, 1)
+	boundaries = [dataStart]
+	for _ in reader:
+		if len(boundaries) < numShards and reader.Offset >= dataStart + shardSize * len(boundaries):
+			boundaries.append(reader.Offset)
+	if reader.Offset > boundaries[-1]:
+		boundaries.append(reader.Offset)
+
+	return list(zip(boundaries[:-1], boundaries[1:]))
+
+def getCheckpointPath(opath):
+	return opath + ".checkpoint"
+
+def _getShardsPath(opath):
+	return opath + ".shards"
+
+def isResumable(opath):
+	"""
+	Returns True if a checkpoint of an interrupted transformCsv() or transformCsvParallel() run to @opath exists, which can
+	be continued by passing resume=True.
+	"""
+	return os.path.exists(getCheckpointPath(opath)) or os.path.exists(_getShardsPath(opath))
+
+def _loadJson(path):
+	with open(path, "r") as jsonFile:
+		return json.load(jsonFile)
+
+def _saveJson(obj, path):
+	# a crash while writing never leaves a truncated checkpoint behind
+	with atomicWrite(path, fsync=True) as jsonFile:
+		jsonFile.write(json.dumps(obj))
+
+def _transformRecords(csvPath, recTransformFunc, opath, delimiter, encoding, startOffset=None, endOffset=None, header=None, resume=False, batchSize=1000, verbose=True):
+	"""
+	Transforms the records in the byte range [@startOffset, @endOffset) of @csvPath, writing them to @opath (preceded by @header, if passed).
+
+	Output is written in batches of @batchSize records. After each batch, the output is flushed to disk and a checkpoint
+	recording the input byte offset just past the batch, the output row count and the output byte size is written to
+	getCheckpointPath(@opath). With @resume=True and an existing checkpoint, the output is truncated to its size at the
+	last checkpoint (discarding any partially written batch) and the transform continues from the checkpointed input offset.
+	The checkpoint is removed once the whole range is transformed.
+	Returns: the number of records written to @opath.
+	"""
+	checkpointPath = getCheckpointPath(opath)
+	checkpoint = None
+	if resume and os.path.exists(checkpointPath):
+		checkpoint = _loadJson(checkpointPath)
+		if checkpoint["inputPath"] != os.path.abspath(csvPath):
+			raise Exception("Checkpoint {} is for input {}, not {}".format(checkpointPath, checkpoint["inputPath"], csvPath))
+
+	if checkpoint is not None:
+		with open(opath, "ab") as outputFile:
+			outputFile.truncate(checkpoint["outputOffset"])
+		startOffset = checkpoint["inputOffset"]
+		numRecords = checkpoint["outputRows"]
+		if verbose:
+			print("Resuming from checkpoint at input offset {} with {} records already transformed".format(startOffset, numRecords))
+	else:
+		numRecords = 0
+
+	reader = CsvRecordGenerator(csvPath, delimiter=delimiter, encoding=encoding, startOffset=startOffset, endOffset=endOffset, verbose=verbose)
+	if startOffset is None:
+		startOffset = reader.Offset
+	with open(opath, "w+" if checkpoint is None else "a", encoding=encoding) as outputFile:
+		writer = csv.writer(outputFile, delimiter=delimiter)
+
+		def commitBatch(inputOffset):
+			outputFile.flush()
+			os.fsync(outputFile.fileno())
+			state = {
+				"inputPath": os.path.abspath(csvPath),
+				"inputOffset": inputOffset,
+				"outputRows": numRecords,
+				"outputOffset": os.fstat(outputFile.fileno()).st_size
+			}
+			_saveJson(state, checkpointPath)
+
+		if checkpoint is None:
+			if header is not None:
+				writer.writerow(header)
+			commitBatch(startOffset)
+
+		outputCache = []
+		for rec in reader:
+			outputCache.append(recTransformFunc(rec))
+			if len(outputCache) >= batchSize:
+				writer.writerows(outputCache)
+				numRecords += len(outputCache)
+				outputCache = []
+				commitBatch(reader.Offset)
+
+		# write final cache content
+		writer.writerows(outputCache)
+		numRecords += len(outputCache)
+		outputFile.flush()
+		os.fsync(outputFile.fileno())
+
+	os.remove(checkpointPath)
+	return numRecords
+
+def _getDonePath(shardPath):
+	return shardPath + ".done"
+
+def _transformShard(csvPath, startOffset, endOffset, recTransformFunc, shardPath, delimiter, encoding, resume, shardStatsFunc):
+	# Worker process function for transformCsvParallel(): transforms the records in one byte range to a temporary shard file.
+	# A shard is complete only once its .done marker, holding its record count and stats, is written after the shard's final fsync; any
+	# other shard file left by an interrupted run (even one without a checkpoint, if it was killed before its first commit) is redone.
+	# Returns: (the number of records in the shard, its stats)
+	donePath = _getDonePath(shardPath)
+	if resume and os.path.exists(donePath):
+		done = _loadJson(donePath)
+		return done["outputRows"], done["stats"]
+	if shardStatsFunc is not None:
+		# discard any counts left in this worker by a previous shard
+		shardStatsFunc()
+	numRecords = _transformRecords(csvPath, recTransformFunc, shardPath, delimiter, encoding, startOffset=startOffset, endOffset=endOffset, resume=resume, verbose=False)
+	stats = shardStatsFunc() if shardStatsFunc is not None else dict()
+	_saveJson({"outputRows": numRecords, "stats": stats}, donePath)
+	return numRecords, stats
+
 """
 This is for consuming csv data, performing transformations on each record, and outputing
 a new csv file to an output path; with minimal in-memory data.
@@ -31,10 +188,53 @@ a new csv file to an output path; with minimal in-memory data.
 @recTransformFunc: A function to apply to each record in the input csv, to generate an output csv record
 @headerTransformFunc: The function to apply to the input csv's header (e.g., append a new set of columns)
 @opath: The output path for the new csv file
+@resume: If True and @opath has a checkpoint from an interrupted run, continue from its last committed batch instead of
+starting over. Progress is checkpointed every 1000 records; see _transformRecords().
 
 Csv header is required.
 """
-def transformCsv(csvPath, recTransformFunc, headerTransformFunc, opath, delimiter=',', encoding="utf-8"):
+def transformCsv(csvPath, recTransformFunc, headerTransformFunc, opath, delimiter=',', encoding="utf-8", resume=False):
+	# IO checks
+	if opath == csvPath:
+		print("ERROR: input cannot be output: {} {}".format(csvPath, opath))
+		return
+	resume = resume and os.path.exists(getCheckpointPath(opath))
+	if os.path.exists(opath) and not resume:
+		if os.path.exists(getCheckpointPath(opath)):
+			print("ERROR: output path exists from an interrupted run. Pass resume=True to continue it, or move or delete it before running: {}".format(opath))
+		else:
+			print("ERROR: output path already exists. Move or delete it before running: {}".format(opath))
+		return
+
+	try:
+		print("Transforming {} and outputting to {}...".format(csvPath, opath))
+		reader = CsvRecordGenerator(csvPath, delimiter=delimiter, encoding=encoding)
+		reader.Close()
+		# Copy the header out, with new fields using @headerTransformFunc
+		fieldnames = headerTransformFunc(reader.fieldnames)
+		numRecords = _transformRecords(csvPath, recTransformFunc, opath, delimiter, encoding, header=fieldnames, resume=resume)
+		print("\nTransform completed, {} records written".format(numRecords))
+	except:
+		traceback.print_exc()
+
+def transformCsvParallel(csvPath, recTransformFunc, headerTransformFunc, opath, numWorkers=None, delimiter=',', encoding="utf-8", initializer=None, initargs=(), resume=False, shardStatsFunc=None):
+	"""
+	Parallel version of transformCsv(), for expensive record transforms. The input is split into byte ranges on record
+	boundaries (see findRecordBoundaries()), each range is transformed to a temporary shard file in a ProcessPoolExecutor,
+	and the shards are then merged into @opath in their original order, so the output is the same as that of transformCsv().
+
+	@recTransformFunc: Must be picklable, i.e. a module-level function. Any state it needs (models, lexica) should be set up
+	in each worker by @initializer(*@initargs), rather than passed with every record.
+	@numWorkers: The number of worker processes; defaults to the number of cpus.
+	@resume: Each shard is checkpointed like transformCsv(), and the shard ranges are saved to @opath.shards. If a run fails,
+	its shard files are kept, and with @resume=True the next run reuses the saved ranges, skips the shards marked complete and
+	continues the others from their checkpoints (or from the start of their range, if they have none).
+	@shardStatsFunc: Optional, and picklable like @recTransformFunc. Called in the worker before and after each shard, it returns a dict of
+	the counts (e.g. of records that couldn't be transformed) kept by the worker's state since its last call, and resets them. The counts of
+	all shards are summed, since any state @recTransformFunc keeps is per worker. A shard resumed from a checkpoint only counts the records
+	transformed after it.
+	Returns: A dict of the summed shard stats, or None on failure.
+	"""
 	# IO checks
 	if opath == csvPath:
 		print("ERROR: input cannot be output: {} {}".format(csvPath, opath))
@@ -42,29 +242,162 @@ def transformCsv(csvPath, recTransformFunc, headerTransformFunc, opath, delimite
 	if os.path.exists(opath):
 		print("ERROR: output path already exists. Move or delete it before running: {}".format(opath))
 		return
+	if numWorkers is None:
+		numWorkers = os.cpu_count()
 
+	shardsPath = _getShardsPath(opath)
+	resume = resume and os.path.exists(shardsPath)
+	shardPaths = []
 	try:
-		print("Transforming {} and outputting to {}...".format(csvPath, opath))
-		reader = CsvRecordGenerator(csvPath, delimiter=delimiter)
-		with open(opath, "w+", encoding=encoding) as outputFile:
+		if resume:
+			shards = [tuple(shard) for shard in _loadJson(shardsPath)]
+			print("Resuming {} shards of {}...".format(len(shards), csvPath))
+		else:
+			print("Splitting {} into {} shards...".format(csvPath, numWorkers))
+			shards = findRecordBoundaries(csvPath, numWorkers, delimiter=delimiter, encoding=encoding)
+			_saveJson(shards, shardsPath)
+		shardPaths = ["{}.shard{}".format(opath, i) for i in range(len(shards))]
+		print("Transforming {} shards of {} with {} workers and outputting to {}...".format(len(shards), csvPath, numWorkers, opath))
+		with ProcessPoolExecutor(max_workers=numWorkers, initializer=initializer, initargs=initargs) as executor:
+			futures = [executor.submit(_transformShard, csvPath, start, end, recTransformFunc, shardPath, delimiter, encoding, resume, shardStatsFunc) for (start, end), shardPath in zip(shards, shardPaths)]
+			numRecords = 0
+			stats = dict()
+			for i, future in enumerate(futures):
+				shardRecords, shardStats = future.result()
+				numRecords += shardRecords
+				for key, count in shardStats.items():
+					stats[key] = stats.get(key, 0) + count
+				print("\rShard {} of {} completed, {} records transformed      ".format(i+1, len(futures), numRecords), end="")
+				sys.stdout.flush()
+		print("")
+
+		# merge the shards in order, after the transformed header; renamed on completion, so @opath is never partial
+		reader = CsvRecordGenerator(csvPath, delimiter=delimiter, encoding=encoding)
+		reader.Close()
+		tempPath = opath + ".tmp"
+		with open(tempPath, "w+", encoding=encoding) as outputFile:
 			writer = csv.writer(outputFile, delimiter=delimiter)
-			# Copy the header out, with new fields using @headerTransformFunc
-			fieldnames = headerTransformFunc(reader.fieldnames)
-			writer.writerow(fieldnames)
-			outputCache = []
+			writer.writerow(headerTransformFunc(reader.fieldnames))
+		with open(tempPath, "ab") as outputFile:
+			for shardPath in shardPaths:
+				with open(shardPath, "rb") as shardFile:
+					shutil.copyfileobj(shardFile, outputFile)
+		os.replace(tempPath, opath)
+
+		for shardPath in shardPaths:
+			os.remove(shardPath)
+			os.remove(_getDonePath(shardPath))
+		os.remove(shardsPath)
+		print("Transform completed, {} records written".format(numRecords))
+		return stats
+	except:
+		traceback.print_exc()
+		if shardPaths:
+			print("Shard files were kept; rerun with resume=True to continue from their checkpoints.")
+
+	return None
+
+def _toDatetime(value):
+	return datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+
+# Column type name -> function converting a non-empty csv string to that type
+_columnConverters = {
+	"string": str,
+	"float": float,
+	"int": int,
+	"datetime": _toDatetime
+}
+
+def _convertColumn(values, converter):
+	# Empty and unconvertible values (e.g. 'undateable' dates) become nulls, like pandas' read_csv with errors='coerce'
+	converted = []
+	for value in values:
+		try:
+			converted.append(converter(value) if len(value) > 0 else None)
+		except ValueError:
+			converted.append(None)
+	return converted
+
+def exportCsvColumns(csvPath, opath, columnTypes, delimiter=',', encoding="utf-8", batchSize=100000):
+	"""
+	Streams selected columns of a csv file to a typed, columnar file, so analyses can load only the columns they need without parsing the csv.
+	The format is chosen by @opath's extension: '.parquet' for Parquet, or '.feather'/'.arrow' for Feather (Arrow IPC).
+	Requires pyarrow.
+
+	@columnTypes: A list of (column name, type) pairs in output order, where type is one of 'string', 'float', 'int' or 'datetime'
+	(formatted as "%Y-%m-%d %H:%M:%S"). Empty or unconvertible values are stored as nulls.
+	@batchSize: The number of records converted and written per row group/record batch.
+	Returns: @opath, or None on failure.
+	"""
+	try:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+	except ImportError:
+		print("ERROR: pyarrow is required for columnar export. Install it with 'pip install pyarrow'.")
+		return None
+
+	arrowTypes = {"string": pa.string(), "float": pa.float64(), "int": pa.int64(), "datetime": pa.timestamp("ms")}
+	if opath == csvPath:
+		print("ERROR: input cannot be output: {} {}".format(csvPath, opath))
+		return None
+	if os.path.exists(opath):
+		print("ERROR: output path already exists. Move or delete it before running: {}".format(opath))
+		return None
+	isParquet = opath.lower().endswith(".parquet")
+	if not isParquet and not opath.lower().endswith((".feather", ".arrow")):
+		print("ERROR: columnar output path must end in .parquet, .feather or .arrow: {}".format(opath))
+		return None
+	for name, colType in columnTypes:
+		if colType not in _columnConverters:
+			print("ERROR: unknown type {} for column {}; must be one of {}".format(colType, name, sorted(_columnConverters.keys())))
+			return None
+
+	reader = CsvRecordGenerator(csvPath, delimiter=delimiter, encoding=encoding)
+	missing = [name for name, _ in columnTypes if name not in reader.fieldnames]
+	if len(missing) > 0:
+		reader.Close()
+		print("ERROR: columns {} not found in {} header: {}".format(missing, csvPath, reader.fieldnames))
+		return None
+	colIndices = [reader.fieldnames.index(name) for name, _ in columnTypes]
+	schema = pa.schema([(name, arrowTypes[colType]) for name, colType in columnTypes])
+
+	def toRecordBatch(records):
+		columns = []
+		for (name, colType), i in zip(columnTypes, colIndices):
+			values = [rec[i] if i < len(rec) else "" for rec in records]
+			columns.append(pa.array(_convertColumn(values, _columnConverters[colType]), type=schema.field(name).type))
+		return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+	# written to a temporary file and renamed on completion, so an interrupted export never leaves a partial file behind
+	tempPath = opath + ".tmp"
+	try:
+		print("Exporting columns {} of {} to {}...".format([name for name, _ in columnTypes], csvPath, opath))
+		if isParquet:
+			writer = pq.ParquetWriter(tempPath, schema)
+			writeBatch = lambda batch: writer.write_table(pa.Table.from_batches([batch]))
+		else:
+			writer = pa.ipc.new_file(tempPath, schema)
+			writeBatch = writer.write_batch
+		numRecords = 0
+		try:
+			records = []
 			for rec in reader:
-				outputRec = recTransformFunc(rec)
-				outputCache.append(outputRec)
-				if len(outputCache) > 1000:
-					writer.writerows(outputCache)
-					outputCache = []
-        
-			# write final cache content
-			if len(outputCache) > 0:
-				writer.writerows(outputCache)
-				outputCache = []
-        
-			print("Transform completed")
+				records.append(rec)
+				if len(records) >= batchSize:
+					writeBatch(toRecordBatch(records))
+					numRecords += len(records)
+					records = []
+			if len(records) > 0 or numRecords == 0:
+				writeBatch(toRecordBatch(records))
+				numRecords += len(records)
+		finally:
+			writer.close()
+		os.replace(tempPath, opath)
+		print("\nExported {} records to {}".format(numRecords, opath))
+		return opath
 	except:
 		traceback.print_exc()
+		if os.path.exists(tempPath):
+			os.remove(tempPath)
 
+	return None
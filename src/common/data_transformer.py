@@ -7,9 +7,18 @@ import urllib.parse
 import datetime
 import string
 import traceback
+import time
 #from analysis import *
-from ascii_text_normalizer import AsciiTextNormalizer
+from ascii_text_normalizer import getSharedNormalizer
+from term_stripper import TermStripper
+from topic_matcher import getTopicMatcher
+import time_binning
+import dedup
+import operator
+from headline import getFieldAttribute
 
+# the stages of DataTransformer.PrimaryResultCollectionFilter(), in order, for its timing report
+FILTER_STAGES = ["date", "topics", "uniquify", "normalize", "condense", "crossfilter", "offtopic"]
 
 """
 Everything within this class is basically stateless, just transforming data and returning the results.
@@ -152,14 +161,15 @@ class DataTransformer(object):
 		return uriDict
 
 	"""
-	Removes stop words from headlines in passed result collections.
+	Removes stop words, as whole tokens, from headlines in passed result collections.
 	"""
 	@staticmethod
 	def RemoveStopWords(resultCollections, stopWords):
+		stripper = TermStripper(stopWords)
 		for resultCollection in resultCollections:
 			for queryResult in resultCollection.QueryResults:
 				for headline in queryResult.Headlines:
-					headline.StripTerms(stopWords)
+					headline.StripTerms(stripper)
 		return resultCollections
 
 	"""
@@ -172,6 +182,15 @@ class DataTransformer(object):
 	
 	NOTE: This should be called after soft-match expansion has been applied, and likely other text normalizations, especially lowercasing.
 	"""
+	@staticmethod
+	def _warnNonDisjointTopicSets(topicSets):
+		#warn if topic sets are not disjoint; this could implement non-disjoint term removal (just ignore common terms) but I dislike the ambiguity
+		for topicSet in topicSets:
+			for otherSet in topicSets:
+				if topicSet != otherSet and any(topicSet.intersection(otherSet)):
+					print("WARNING topic terms not disjoint in RemoveOffTopicTerms: {} {}".format(topicSet, otherSet))
+					print("Only disjoint terms will be removed")
+
 	@staticmethod
 	def RemoveOffTopicTerms(resultCollections):
 		topicSets = resultCollections[0].GetTopicSets(resultCollections)
@@ -179,19 +198,15 @@ class DataTransformer(object):
 
 		#no need to filter single-topicset queries
 		if len(topicSets) > 1:
-			#warn if topic sets are not disjoint; this could implement non-disjoint term removal (just ignore common terms) but I dislike the ambiguity
-			for topicSet in topicSets:
-				for otherSet in topicSets:
-					if topicSet != otherSet and any(topicSet.intersection(otherSet)):
-						print("WARNING topic terms not disjoint in RemoveOffTopicTerms: {} {}".format(topicSet, otherSet))
-						print("Only disjoint terms will be removed")
+			DataTransformer._warnNonDisjointTopicSets(topicSets)
 
 			for collection in resultCollections:
 				for result in collection.QueryResults:
 					offTopicTerms = allTerms.difference(set(result.Topics))
 					print("Removing {} from topical {} headlines".format(offTopicTerms, result.Topics))
+					stripper = TermStripper(offTopicTerms)
 					for headline in result.Headlines:
-						headline.StripTerms(offTopicTerms)
+						headline.StripTerms(stripper)
 
 			"""
 			print("Removing off-topic terms...")
@@ -274,9 +289,12 @@ class DataTransformer(object):
 
 	@staticmethod
 	def FilterResultCollectionsByDtRange(resultCollections, dtLow, dtHigh):
+		#uses each QueryResult's sorted dt index, instead of scanning every headline
 		for collection in resultCollections:
 			for result in collection.QueryResults:
-				result.Headlines = DataTransformer.FilterHeadlinesByDtDate(result.Headlines, dtLow, dtHigh)
+				numHeadlines = len(result.Headlines)
+				result.Headlines = result.FilterByDtDate(dtLow, dtHigh)
+				print("Filtered {} headlines by dtLow-dtHigh {} {} to {}".format(numHeadlines, dtLow, dtHigh, len(result.Headlines)))
 
 	"""
 	A best effort to convert html/xml escaped characters using html.unescape(), and unicode/latin-1 encoded chars to ascii
@@ -285,10 +303,11 @@ class DataTransformer(object):
 	@filterNonAlphaNum: If true, filter non-alphanumeric chars
 	@deleteFiltered: Only meaningful if @filterNonAlphaNum=True; if true, filtered chars will be deleted rather than replace with spaces.
 	@lowercase: Lowercase the terms in the headlines.
+	Text is normalized with the shared caching normalizer, so duplicate headlines (e.g. across snapshots) are only normalized once.
 	"""
 	@staticmethod
 	def TextNormalizeHeadlines(headlines, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True):
-		normalizer = AsciiTextNormalizer()
+		normalizer = getSharedNormalizer()
 		for headline in headlines:
 			DataTransformer.TextNormalizeHeadline(headline, normalizer, filterNonAlphaNum=filterNonAlphaNum, deleteFiltered=deleteFiltered, lowercase=lowercase)
 
@@ -299,9 +318,11 @@ class DataTransformer(object):
 		headline.FullText    = normalizer.NormalizeText(headline.FullText, filterNonAlphaNum=filterNonAlphaNum, deleteFiltered=deleteFiltered, lowercase=lowercase)
 
 	@staticmethod
-	def TextNormalizeTerms(terms, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True):
-		normalizer = AsciiTextNormalizer()
-		return [normalizer.NormalizeText(term, filterNonAlphaNum=filterNonAlphaNum, deleteFiltered=deleteFiltered, lowercase=lowercase) for term in terms]
+	def TextNormalizeTerms(terms, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=None):
+		"""
+		@cacheDir: Optional directory in which to persist the normalized terms, e.g. of a lexicon. See AsciiTextNormalizer.NormalizeTerms().
+		"""
+		return getSharedNormalizer().NormalizeTerms(terms, filterNonAlphaNum=filterNonAlphaNum, deleteFiltered=deleteFiltered, lowercase=lowercase, cacheDir=cacheDir)
 
 	"""
 	The result collection contains results and their corresponding query terms. During analysis, 
@@ -343,52 +364,59 @@ class DataTransformer(object):
 	topic T1, but contains some topic terms from T2, then these terms are removed. This is a criticizable filter, but the intuition is that
 	a headline about T1 and its language distribution identifies T1, not any opposiing topics that may also be in the text.
 	Returns: all headlines as a list, after all selected filters have been applied
+
+	The filters are fused: the query terms are normalized and condensed, and each result's cross-filter matcher and off-topic term stripper
+	built, once up front; then each result's headlines stream once through all enabled per-headline stages (see filterQueryResultHeadlines()),
+	rather than one full pass and new list per stage. The output is the same as running the stages in sequence. Per-stage timings are printed.
+	Headlines are filtered in place, in this process, so references held elsewhere to the surviving headlines see their normalized text.
 	"""
 	@staticmethod
 	def PrimaryResultCollectionFilter(resultCollections, dtLow, dtHigh, topicCrossFilter=False, removeOffTopicTerms=False, uniquify=False):
-		topicSuperset = set(tuple(result.Topics) for collection in resultCollections for result in collection.QueryResults)
-		topicLists = [list(topics) for topics in topicSuperset]
+		stageTimes = dict.fromkeys(FILTER_STAGES, 0.0)
+		startTime = time.perf_counter()
+		queryResults = [result for collection in resultCollections for result in collection.QueryResults]
 
 		print("Filtering results by date...")
 		DataTransformer.FilterResultCollectionsByDtRange(resultCollections, dtLow, dtHigh)
+		stageTimes["date"] = time.perf_counter() - startTime
 
-		if uniquify:
-			print("Uniquifying results by day/uri...")
-			#filter by unique uri, but only by day
-			for collection in resultCollections:
-				for result in collection.QueryResults:
-					result.Headlines = DataTransformer.UniquifyHeadlinesByDay(result.Headlines, "URI")
-
-		#normalize all text
+		#normalize the query terms themselves, to match the headline normalization (otherwise term-matching won't work)
 		print("Normalizing headline text AND query terms (keep in mind for foreign character sets)...")
-		for collection in resultCollections:
-			for result in collection.QueryResults:
-				#get the topics to remove from the headlines on this topic
-				DataTransformer.TextNormalizeHeadlines(result.Headlines, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
-				#normalize the query terms themselves, to match the headline normalization (otherwise term-matching won't work)
-				result.Topics = DataTransformer.TextNormalizeTerms(result.Topics, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
-
-		#resolve multiword query terms to single terms, for analyses ("north korea" --> "northkorea"); NOTE: Its easier for this to occur after text normalization/lowercasing
-		if any(" " in queryTerm for topicList in topicLists for queryTerm in topicList):
-			DataTransformer.CondenseMultiwordQueryTerms(resultCollections)
-			#update the topic list info local to this function
-			topicSuperset = set(tuple(result.Topics) for collection in resultCollections for result in collection.QueryResults)
-			topicLists = [list(topics) for topics in topicSuperset]
-
-		#should run after text normalization
-		for topicList in topicLists:
-			ct = sum(collection.CountTopicalHeadlines(topicList) for collection in resultCollections)
-			print("({} #headlines: {}".format(topicList[0],ct))
+		stageStart = time.perf_counter()
+		hasMultiwordTerms = any(" " in queryTerm for result in queryResults for queryTerm in result.Topics)
+		for result in queryResults:
+			result.Topics = DataTransformer.TextNormalizeTerms(result.Topics, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
+
+		#resolve multiword query terms to single terms, for analyses ("north korea" --> "northkorea"); NOTE: Its easier for this to occur after text normalization/lowercasing,
+		#so the headline text is condensed per headline, right after it is normalized
+		termMap = dict()
+		if hasMultiwordTerms:
+			termMap = {term:term.replace(" ","") for result in queryResults for term in result.Topics if " " in term}
+			if any(termMap):
+				print("Condensing multiword query-terms {} to --> {}".format(termMap.keys(), termMap.values()))
+				for result in queryResults:
+					result.Topics = [topic.replace(" ","") for topic in result.Topics]
+		topicLists = [list(topics) for topics in set(tuple(result.Topics) for result in queryResults)]
 
-		#disambiguate topics for better statistics
-		if topicCrossFilter:
-			print("Cross filtering topical headlines...")
-			topicUnion = [topic for topicList in topicLists for topic in topicList]
-			for collection in resultCollections:
-				for result in collection.QueryResults:
-					#get the topics to remove from the headlines on this topic
-					filterTopics = [topic for topic in topicUnion if topic not in result.Topics]
-					result.Headlines = DataTransformer.TopicFilterHeadlines(result.Headlines, filterTopics)
+		#experimental: strip opposed topic terms from within the textual data of other topic's headlines; no need to filter single-topicset queries
+		if removeOffTopicTerms:
+			topicSets = resultCollections[0].GetTopicSets(resultCollections)
+			allTerms = set(term for topicSet in topicSets for term in topicSet)
+			removeOffTopicTerms = len(topicSets) > 1
+			if removeOffTopicTerms:
+				DataTransformer._warnNonDisjointTopicSets(topicSets)
+
+		#build each result's per-headline stages: cross-filter terms to disambiguate topics for better statistics, and off-topic terms to strip
+		topicUnion = [topic for topicList in topicLists for topic in topicList]
+		jobs = []
+		for result in queryResults:
+			filterTopics = [topic for topic in topicUnion if topic not in result.Topics] if topicCrossFilter else None
+			offTopicTerms = None
+			if removeOffTopicTerms:
+				offTopicTerms = allTerms.difference(set(result.Topics))
+				print("Removing {} from topical {} headlines".format(offTopicTerms, result.Topics))
+			jobs.append((result.Headlines, uniquify, termMap, filterTopics, offTopicTerms))
+		stageTimes["topics"] = time.perf_counter() - stageStart
 
 		""" REMOVED: Run this in frequency calculation, so as to boost query terms and signal term hits alike. At this point we can only soft-match
 		query terms.
@@ -400,10 +428,25 @@ class DataTransformer(object):
 			DataTransformer.TopicTermSoftmatchReplacement(resultCollections, caseInsensitive=True)
 		"""
 
-		#experimental: strip opposed topic terms from within the textual data of other topic's headlines
-		if removeOffTopicTerms:
-			print("Removing off-topic terms...")
-			DataTransformer.RemoveOffTopicTerms(resultCollections)
+		print("Filtering headlines of {} query results (uniquify={} topicCrossFilter={} removeOffTopicTerms={})...".format(len(jobs), uniquify, topicCrossFilter, removeOffTopicTerms))
+		outputs = [filterQueryResultHeadlines(*job) for job in jobs]
+
+		numHeadlines = sum(len(result.Headlines) for result in queryResults)
+		for result, (headlines, stats) in zip(queryResults, outputs):
+			result.Headlines = headlines
+			for stage in FILTER_STAGES:
+				stageTimes[stage] += stats[stage]
+		if uniquify:
+			print("{} headlines after uniquify by day, of {}".format(sum(stats["unique"] for _, stats in outputs), numHeadlines))
+		print("Normalization cache hits: {}  misses: {}".format(sum(stats["cacheHits"] for _, stats in outputs), sum(stats["cacheMisses"] for _, stats in outputs)))
+
+		#topical headline counts, after uniquify but before cross-filtering
+		for topicList in topicLists:
+			ct = sum(stats["unique"] for result, (_, stats) in zip(queryResults, outputs) if set(result.Topics) == set(topicList))
+			print("({} #headlines: {}".format(topicList[0],ct))
+
+		print("Filter stage seconds: " + "  ".join("{}: {:.3f}".format(stage, stageTimes[stage]) for stage in FILTER_STAGES))
+		print("Filtered {} headlines to {} in {:.3f}s".format(numHeadlines, sum(len(result.Headlines) for result in queryResults), time.perf_counter() - startTime))
 
 		"""
 		This was an important experiment, borne out of my fear of potential bias due to coverage volume differences for different topics.
@@ -434,8 +477,8 @@ class DataTransformer(object):
 	"""
 	@staticmethod
 	def TopicFilterHeadlines(headlineList, topicWords):
-		topics = [topic.lower() for topic in topicWords]
-		return [headline for headline in headlineList if not headline.HasTopicalHeadlineHit(topics)]
+		matcher = getTopicMatcher([topicWords])
+		return [headline for headline in headlineList if not matcher.HasHit(headline.Headline)]
 
 	"""
 	A positive grep filter: return only headlines in headlineList containing any of @topicWords strings in headline
@@ -443,7 +486,8 @@ class DataTransformer(object):
 	"""
 	@staticmethod
 	def FilterHeadlinesInclusive(headlineList, topicWords):
-		return [headline for headline in headlineList if headline.HasTopicHit(topicWords)]
+		matcher = getTopicMatcher([topicWords])
+		return [headline for headline in headlineList if matcher.HasHit(headline.GetFullText(), ignoreCase=True)]
 
 	"""
 	Filters headlines below a certain rank
@@ -571,37 +615,34 @@ class DataTransformer(object):
 	"""
 	@staticmethod
 	def UniquifyHeadlines(headlineList,field):
-		uniqVals = set()
-		filteredList = []
-	
-		for headline in headlineList:
-			value = headline.GetValue(field)
-			if value not in uniqVals:
-				filteredList.append(headline)
-				uniqVals.add(value)
-
-		return filteredList
+		return dedup.uniquify(headlineList, dedup.getKeyFunc([field]))
 
 	"""
 	Uniquifies headlines by the @field value (eg, 'uri', for deduplication), but only within
 	the scope of the same day.
 	"""
 	@staticmethod
-	def UniquifyHeadlinesByDay(headlineList, field):
-		uniqVals = set()
-		filteredList = []
-
-		print("Uniquifying "+str(len(headlineList))+" headlines...")
-		for headline in headlineList:
-			#store unique value as a tuple of (@field, date)
-			value = (headline.GetValue(field), headline.DT.date())
-			if value not in uniqVals:
-				filteredList.append(headline)
-				uniqVals.add(value)
-		print(str(len(filteredList))+" headlines after uniquify by day.")
+	def UniquifyHeadlinesByDay(headlineList, field, verbose=False):
+		filteredList = dedup.uniquify(headlineList, dedup.getKeyFunc([field], byDay=True))
+		if verbose:
+			print("Uniquified {} headlines to {} by day.".format(len(headlineList), len(filteredList)))
 
 		return filteredList
 
+	"""
+	Removes near-duplicate headlines, such as syndicated stories differing by a few characters, keeping the first of each.
+	See dedup.uniquifyNearDuplicates() for the MinHash/LSH parameters.
+	@field: The text field to compare, e.g. "headline" or "description"
+	@threshold: The estimated Jaccard similarity of character shingles above which headlines are near-duplicates
+	"""
+	@staticmethod
+	def UniquifyNearDuplicateHeadlines(headlineList, field="headline", threshold=0.8):
+		attr = getFieldAttribute(field)
+		if attr is None:
+			print("ERROR field "+field+" not found")
+			return headlineList
+		return dedup.uniquifyNearDuplicates(headlineList, textFunc=operator.attrgetter(attr), threshold=threshold)
+
 	"""
 	Initializes the headline db, then performs basic differential volumetric analyses. IOW, just compares quantity of content.
 
@@ -928,8 +969,11 @@ class DataTransformer(object):
 		elif dtGrouping == "monthly":
 			print("Binning headlines by month...")
 			bins = DataTransformer.BetterBinHeadlinesByMonth(headlines, dtLow, dtHigh)
+		elif dtGrouping in time_binning.DT_GROUPINGS:
+			print("Binning headlines {}...".format(dtGrouping))
+			bins = DataTransformer.BinHeadlinesByDtGrouping(headlines, dtLow, dtHigh, dtGrouping)
 		else:
-			print("ERROR: date bin not implemented: %s. Use only weekly and monthly"%dtGrouping)
+			print("ERROR: date bin not implemented: %s. Use only %s"%(dtGrouping, time_binning.DT_GROUPINGS))
 
 		return bins			
 
@@ -943,48 +987,38 @@ class DataTransformer(object):
 	"""
 	@staticmethod
 	def BetterBinHeadlinesByMonth(headlines, dtLow, dtHigh):
+		bins = DataTransformer.BinHeadlinesByDtGrouping(headlines, dtLow, dtHigh, "monthly")
+		if bins is None:
+			print("Headlines must be pre-filtered per dtLow/dtHigh")
+			exit()
+
+		return bins
 
+	"""
+	Bins headlines between dtLow and dtHigh by day, week, month or year, via time_binning.binDays().
+
+	@headlines: headline list, PRE FILTERED by dtLow/dtHigh
+	@dtLow/dtHigh: high and low datetime filter boundaries; if None, the min/max dt in the headlines will be used
+	@dtGrouping: One of time_binning.DT_GROUPINGS, "daily", "weekly", "monthly" or "yearly"
+
+	Returns: A date-ordered list of tuples (binKey, [headlines...]), per time_binning's bin keys, or None if any headline is out of range.
+	"""
+	@staticmethod
+	def BinHeadlinesByDtGrouping(headlines, dtLow, dtHigh, dtGrouping):
 		if dtLow is None:
-			dtLow  = _getHeadlinesDtMin(headlines)
+			dtLow  = DataTransformer._getHeadlinesDtMin(headlines)
 		if dtHigh is None:
-			dtHigh = _getHeadlinesDtMax(headlines)
+			dtHigh = DataTransformer._getHeadlinesMaxDt(headlines)
 
-		#sanity check: verify 
-		for headline in headlines:
-			if headline.DT.date() < dtLow:
-				print("ERROR headline "+headline.URI+" < dtLow in BetterBinHeadlinesByMonth() dtLow="+str(dtLow))
-				print("Headlines must be pre-filtered per dtLow/dtHigh")
-				exit()
-			elif headline.DT.date() > dtHigh:
-				print("ERROR headline "+headline.URI+" > dtHigh in BetterBinHeadlinesByMonth() dtHigh="+str(dtHigh))
-				print("Headlines must be pre-filtered per dtLow/dtHigh")
-				exit()
-	
-		iterDate = datetime.date(dtLow.year, dtLow.month, dtLow.day)
-		endDate = datetime.date(dtHigh.year, dtHigh.month, dtHigh.day)
-	
-		delta = datetime.timedelta(days=1)
-		monthIndices = {}
-		monthBins = []
-		while iterDate <= endDate:
-			monthKey = (iterDate.month, iterDate.year)
-			if monthKey not in monthIndices.keys():
-				monthBins.append((monthKey,[]))
-				monthIndices[monthKey] = len(monthBins)-1
-			iterDate += delta
-
-		#fill the bins
-		for headline in headlines:
-			monthKey = (headline.DT.month, headline.DT.year)
-			if monthKey in monthIndices.keys():
-				index = monthIndices[monthKey]
-				monthBins[index][1].append(headline)
-			else:
-				#inly should happen if @headlines was not pre-filtered by dtLow, dtHigh, as required
-				print("WARNING headline not found in weekIndices in BetterBinHeadlinesByMonth() ???")
-				print("Prefilter headlines by dtLow/dtHigh before calling.")
+		binned = time_binning.binDays(time_binning.toDayArray([headline.DT for headline in headlines]), dtLow, dtHigh, dtGrouping)
+		if binned is None:
+			return None
+		binKeys, binIndices = binned
+		bins = [(binKey, []) for binKey in binKeys]
+		for headline, binIndex in zip(headlines, binIndices.tolist()):
+			bins[binIndex][1].append(headline)
 
-		return monthBins
+		return bins
 
 
 	"""
@@ -1025,90 +1059,12 @@ class DataTransformer(object):
 	"""
 	@staticmethod
 	def BetterBinHeadlinesByWeek(headlines, dtLow, dtHigh, trimEnds=False):
-
-		if dtLow is None:
-			dtLow  = _getHeadlinesDtMin(headlines)
-		if dtHigh is None:
-			dtHigh = _getHeadlinesDtMax(headlines)
-
-		#sanity check: verify 
-		for headline in headlines:
-			if headline.DT.date() < dtLow:
-				print("ERROR headline "+headline.URI+" Dt < dtLow in BetterBinHeadlinesByWeek() dtLow="+str(dtLow))
-				print("Headlines must be pre-filtered per dtLow/dtHigh")
-				return []
-			elif headline.DT.date() > dtHigh:
-				print("ERROR headline "+headline.URI+" DT > dtHigh in BetterBinHeadlinesByWeek() dtHigh="+str(dtHigh))
-				print("Headlines must be pre-filtered per dtLow/dtHigh")
-				return []
-	
-		iterDate = datetime.date(dtLow.year, dtLow.month, dtLow.day)
-		endDate = datetime.date(dtHigh.year, dtHigh.month, dtHigh.day)
-
 		print("Binning "+str(len(headlines))+" headlines by week...")
-	
-		delta = datetime.timedelta(days=1)
-		weekIndices = {}
-		weekBins = []
-		while iterDate <= endDate:
-			weekKey = (iterDate.isocalendar()[1], iterDate.year)
-			if weekKey not in weekIndices.keys():
-				weekBins.append((weekKey,[]))
-				weekIndices[weekKey] = len(weekBins)-1
-			iterDate += delta
-
-		#fill the bins
-		for headline in headlines:
-			weekKey = (headline.IsoWeek, headline.DT.year)
-			if weekKey in weekIndices.keys():
-				index = weekIndices[weekKey]
-				weekBins[index][1].append(headline)
-			else:
-				#inly should happen if @headlines was not pre-filtered by dtLow, dtHigh, as required
-				print("WARNING headline not found in weekIndices in BetterBinHeadlinesByWeek() ???")
-				print("Prefilter headlines by dtLow/dtHigh before calling.")
-
-		#two exceptions: isoweek is 52 or 53 for the last week of the year (53 is leap week), since it occurs in the new year
-		if weekBins[0][0][0] == 52:
-			weekBins.append(weekBins[0])
-			weekBins = weekBins[1:]
-
-		if weekBins[0][0][0] == 53:
-			weekBins.append(weekBins[0])
-			weekBins = weekBins[1:]
-
-
-		"""
-		#trim the leading and trailing empty bins
-		if trimEnds:
-			#trim the leading empty bins
-			startIndex = -1
-			i = 0
-			while i < len(weekBins):
-				if len(weekBins[i][1]) > 0:
-					startIndex = i
-				i+=1
-
-			#error case: all bins empty
-			if startIndex >= len(weekBins):
-				print("ERROR passed trimEnds to BetterBinHeadlinesByWeek, but bins empty")
-				return weekBins
-
-			if startIndex > 0:
-				#trim leading empty bins
-				weekBins = weekBins[startIndex:]
-
-			#trim the trailing empty bins
-			endIndex = len(weekBins) - 1
-			while endIndex >= 0 and len(weekBins[endIndex]) == 0:
-				endIndex -= 1
-			if endIndex > 0:
-				weekBins = weekBins[:endIndex+1]
-		"""
+		weekBins = DataTransformer.BinHeadlinesByDtGrouping(headlines, dtLow, dtHigh, "weekly")
+		if weekBins is None:
+			print("Headlines must be pre-filtered per dtLow/dtHigh")
+			return []
 
-		#print("len weekbins: "+str(len(weekBins)))
-		#print("week zero: "+str(len(weekBins[0][1])))
-	
 		return weekBins
 
 	#utility for topical frequency analysis
@@ -1130,7 +1086,59 @@ class DataTransformer(object):
 
 		return headlines
 
-
-
-
-
+def filterQueryResultHeadlines(headlines, uniquify=False, termMap=None, filterTopics=None, offTopicTerms=None):
+	"""
+	Streams @headlines once through the per-headline stages of DataTransformer.PrimaryResultCollectionFilter(), in order:
+	uniquify, normalize, condense multiword query terms, cross-filter, and strip off-topic terms.
+	@uniquify: Keep only the first headline of each URI per day
+	@termMap: A dict of the (normalized) multiword query terms to replace in the normalized text, e.g. {"north korea": "northkorea"}
+	@filterTopics: If not None, headlines whose normalized headline contains any of these terms are dropped
+	@offTopicTerms: If not None, these terms are stripped from the text of the remaining headlines
+	Returns: (headlines, stats), the filtered headlines and a dict of the number of headlines left after uniquify ("unique"), the normalization
+	cache "cacheHits" and "cacheMisses", and the seconds spent in each stage of FILTER_STAGES.
+	"""
+	stats = dict.fromkeys(FILTER_STAGES, 0.0)
+	normalizer = getSharedNormalizer()
+	cacheInfo = normalizer.GetCacheInfo()
+	keyFunc = dedup.getKeyFunc(["URI"], byDay=True) if uniquify else None
+	seen = set()
+	termItems = list(termMap.items()) if termMap else []
+	matcher = getTopicMatcher([filterTopics]) if filterTopics else None
+	stripper = TermStripper(offTopicTerms) if offTopicTerms is not None else None
+	uniquifyTime, normalizeTime, condenseTime, crossFilterTime, offTopicTime = 0.0, 0.0, 0.0, 0.0, 0.0
+	clock = time.perf_counter
+
+	numUnique = 0
+	filtered = []
+	for headline in headlines:
+		t0 = clock()
+		if keyFunc is not None:
+			key = keyFunc(headline)
+			if key in seen:
+				uniquifyTime += clock() - t0
+				continue
+			seen.add(key)
+		numUnique += 1
+		t1 = clock()
+		DataTransformer.TextNormalizeHeadline(headline, normalizer, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
+		t2 = clock()
+		for term, condensedTerm in termItems:
+			headline.ReplaceTerm(term, condensedTerm)
+		t3 = clock()
+		isCrossTopical = matcher is not None and matcher.HasHit(headline.Headline)
+		t4 = clock()
+		uniquifyTime += t1 - t0
+		normalizeTime += t2 - t1
+		condenseTime += t3 - t2
+		crossFilterTime += t4 - t3
+		if isCrossTopical:
+			continue
+		if stripper is not None:
+			headline.StripTerms(stripper)
+			offTopicTime += clock() - t4
+		filtered.append(headline)
+
+	newCacheInfo = normalizer.GetCacheInfo()
+	stats.update({"uniquify": uniquifyTime, "normalize": normalizeTime, "condense": condenseTime, "crossfilter": crossFilterTime, "offtopic": offTopicTime})
+	stats.update({"unique": numUnique, "cacheHits": newCacheInfo.hits - cacheInfo.hits, "cacheMisses": newCacheInfo.misses - cacheInfo.misses})
+	return filtered, stats
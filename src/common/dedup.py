@@ -0,0 +1,123 @@
+"""
+Headline deduplication.
+
+Exact deduplication keeps the first headline of each key, where keys are tuples of headline fields read by operator.attrgetter (see
+getKeyFunc()), optionally with the headline's date. This is a single linear pass with one set lookup per headline.
+
+Near-duplicate deduplication catches syndicated stories whose text differs by a few characters (a wire headline with a different
+dash, a dropped word, a source suffix), which exact keys miss. It uses MinHash signatures with locality sensitive hashing:
+	1) each text is normalized and split into overlapping character shingles, e.g. "trump wins" -> "trump", "rump ", "ump w", ...
+	2) its MinHash signature is the minimum of each of @numPerm random hash functions over its shingles. Two texts agree on a
+	signature position with probability equal to the Jaccard similarity of their shingle sets.
+	3) signatures are split into @numBands bands; texts sharing any band's values land in the same bucket. Each text is only
+	compared against the kept texts in its buckets (not all kept texts), and is a near-duplicate if the fraction of signature
+	positions they agree on is at least @threshold.
+With the defaults (64 hashes, 16 bands of 4), texts with Jaccard similarity 0.8 share a bucket with probability ~1, and texts with
+similarity 0.3 with probability ~0.12.
+"""
+
+import operator
+import zlib
+import numpy as np
+from headline import getFieldAttribute
+from ascii_text_normalizer import getSharedNormalizer
+
+# a Mersenne prime above the 32-bit shingle hashes, for the universal hash functions (a*x + b) mod p; with a, x < 2^32, a*x + b stays below 2^64
+_mersennePrime = (1 << 61) - 1
+_maxHash = (1 << 32) - 1
+
+def getKeyFunc(fields, byDay=False):
+	"""
+	Returns a function mapping a headline to its dedup key: the values of @fields (Headline.GetValue() field names, e.g. ["uri"]), plus
+	its DT.date() if @byDay. As in Headline.GetValue(), the value of an unknown field is "".
+	"""
+	attrs = [getFieldAttribute(field) for field in fields]
+	if None in attrs:
+		print("ERROR unknown headline field in {}".format(fields))
+		getters = [operator.attrgetter(attr) if attr is not None else (lambda headline: "") for attr in attrs]
+		getter = getters[0] if len(getters) == 1 else (lambda headline: tuple(get(headline) for get in getters))
+	else:
+		getter = operator.attrgetter(*attrs)
+	if byDay:
+		return lambda headline: (getter(headline), headline.DT.date())
+	return getter
+
+def uniquify(headlines, keyFunc):
+	"""
+	Returns the first headline of each distinct @keyFunc(headline) value, in their original order.
+	"""
+	seen = set()
+	unique = []
+	for headline in headlines:
+		key = keyFunc(headline)
+		if key not in seen:
+			seen.add(key)
+			unique.append(headline)
+	return unique
+
+class NearDuplicateIndex(object):
+	"""
+	An LSH index of the MinHash signatures of texts, for streaming near-duplicate detection; see module notes.
+	@threshold: The minimum estimated Jaccard similarity of two texts' shingle sets for them to be near-duplicates
+	@numPerm: The number of hash functions, i.e. signature length; must be a multiple of @numBands
+	@numBands: The number of LSH bands. More bands find less similar pairs, at the cost of more candidate comparisons.
+	@shingleSize: The length of the character shingles
+	@seed: Seed for the hash functions, so signatures are reproducible across runs
+	"""
+	def __init__(self, threshold=0.8, numPerm=64, numBands=16, shingleSize=5, seed=1):
+		if numPerm % numBands != 0:
+			raise ValueError("numPerm must be a multiple of numBands")
+		self.Threshold = threshold
+		self._numBands = numBands
+		self._rowsPerBand = numPerm // numBands
+		self._shingleSize = shingleSize
+		rng = np.random.RandomState(seed)
+		self._a = rng.randint(1, 1 << 32, size=numPerm, dtype=np.uint64)
+		self._b = rng.randint(0, 1 << 32, size=numPerm, dtype=np.uint64)
+		self._buckets = dict()
+		self._signatures = []
+
+	def GetSignature(self, text):
+		"""
+		Returns the MinHash signature of @text, which should already be normalized, as a numpy uint64 array.
+		"""
+		k = self._shingleSize
+		shingles = set(text[i:i+k] for i in range(max(1, len(text) - k + 1)))
+		hashes = np.fromiter((zlib.crc32(shingle.encode("utf8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+		return (((self._a[:, None] * hashes[None, :]) + self._b[:, None]) % _mersennePrime & _maxHash).min(axis=1)
+
+	def _GetBandKeys(self, signature):
+		r = self._rowsPerBand
+		return [(band, signature[band*r:(band+1)*r].tobytes()) for band in range(self._numBands)]
+
+	def AddIfUnique(self, text):
+		"""
+		Returns False if @text is a near-duplicate of a text already added; otherwise adds @text to the index and returns True.
+		"""
+		signature = self.GetSignature(text)
+		bandKeys = self._GetBandKeys(signature)
+		checked = set()
+		for bandKey in bandKeys:
+			for candidate in self._buckets.get(bandKey, []):
+				if candidate not in checked:
+					checked.add(candidate)
+					if np.count_nonzero(self._signatures[candidate] == signature) >= self.Threshold * len(signature):
+						return False
+
+		index = len(self._signatures)
+		self._signatures.append(signature)
+		for bandKey in bandKeys:
+			self._buckets.setdefault(bandKey, []).append(index)
+		return True
+
+def uniquifyNearDuplicates(headlines, textFunc=None, threshold=0.8, numPerm=64, numBands=16, shingleSize=5):
+	"""
+	Returns the first headline of each group of near-duplicate headlines, in their original order.
+	@textFunc: Maps a headline to the text to compare; defaults to the headline text. Text is normalized with the shared normalizer.
+	See NearDuplicateIndex for the other parameters.
+	"""
+	if textFunc is None:
+		textFunc = operator.attrgetter("Headline")
+	normalizer = getSharedNormalizer()
+	index = NearDuplicateIndex(threshold, numPerm, numBands, shingleSize)
+	return [headline for headline in headlines if index.AddIfUnique(normalizer.NormalizeText(textFunc(headline)))]
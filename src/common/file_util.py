@@ -0,0 +1,29 @@
+"""
+File helpers shared by the modules that persist caches, checkpoints and results.
+"""
+
+import os
+import contextlib
+
+@contextlib.contextmanager
+def atomicWrite(path, mode="w", fsync=False, **kwargs):
+	"""
+	Context manager for writing @path all-or-nothing: yields a file opened on a temporary path next to @path, which is renamed over @path
+	only once the block completes, so readers never see a partial file. The temporary path is per-process, so concurrent writers of the
+	same file don't interleave; the last rename wins. If the block raises, the temporary file is removed and @path is left as it was.
+	@mode: The open() mode, e.g. "w" or "wb"
+	@fsync: If true, the file is flushed to disk before the rename, so its content survives a crash as well (e.g. for checkpoints)
+	@kwargs: Passed to open(), e.g. encoding or buffering
+	"""
+	tempPath = "{}.{}.tmp".format(path, os.getpid())
+	try:
+		with open(tempPath, mode, **kwargs) as tempFile:
+			yield tempFile
+			if fsync:
+				tempFile.flush()
+				os.fsync(tempFile.fileno())
+		os.replace(tempPath, path)
+	except:
+		if os.path.exists(tempPath):
+			os.remove(tempPath)
+		raise
@@ -1,10 +1,12 @@
 import csv
+import copy
 import sys
 import traceback
 import datetime
 from headline import Headline
 from data_transformer import DataTransformer
 from ascii_text_normalizer import AsciiTextNormalizer
+from topic_matcher import getTopicMatcher
 
 def harvardRecordToHeadline(record):
 	"""
@@ -34,10 +36,23 @@ def harvardRecordToHeadline(record):
 
 #A completely one-time-use function for retrieving headlines directly from a csv formatted as per Harvard media 2017 study
 def getHeadlinesFromHarvardCsv(csvPath, targetYear=None, targetTerms=None):
-	print("Reading headlines from {}, targetTerms={} (case insensitive, if not None), targetYear={} (ignored if None))".format(csvPath, targetTerms, targetYear))
-	headlines = []
-	if targetTerms is not None:
-		targetTerms = [term.lower() for term in targetTerms]
+	return getTopicalHeadlinesFromHarvardCsv(csvPath, [targetTerms], targetYear)[0]
+
+def getTopicalHeadlinesFromHarvardCsv(csvPath, topicLists, targetYear=None):
+	"""
+	Single-pass version of getHeadlinesFromHarvardCsv() for multiple topics: the csv is read and each record normalized only once,
+	and each headline is routed to every topic it matches.
+	@topicLists: A list of topic term lists, e.g. [["trump","donald"], ["hillary","clinton"]]. A topic list of None matches every headline.
+	@targetYear: Only headlines dated in this year are returned, if not None.
+	Returns: A list of headline lists, one per topic list, in the order of @topicLists. A headline matching several topics is shallow-copied
+	for each additional topic, with its own Attrib dict, so each topic's headlines can be scored/annotated independently.
+	"""
+	print("Reading headlines from {}, topics={} (case insensitive, if not None), targetYear={} (ignored if None))".format(csvPath, topicLists, targetYear))
+	topicHeadlines = [[] for _ in topicLists]
+	# a None topic list matches everything; the rest are matched together in a single scan of each headline
+	matchAll = [targetTerms is None for targetTerms in topicLists]
+	matcher = getTopicMatcher([targetTerms for targetTerms in topicLists if targetTerms is not None])
+	numHits = 0
 
 	normalizer = AsciiTextNormalizer()
 
@@ -48,29 +63,37 @@ def getHeadlinesFromHarvardCsv(csvPath, targetYear=None, targetTerms=None):
 		for record in csvReader:
 			try:
 				headline = harvardRecordToHeadline(record)
-				if headline is not None:
+				# match on year, if passed; checked before normalization, which is the expensive part
+				if headline is not None and (targetYear is None or (headline.DT is not None and headline.DT.year == targetYear)):
 					DataTransformer.TextNormalizeHeadline(headline, normalizer, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
-					dt = headline.DT
-					# match on year, if passed
-					if targetYear is None or (dt is not None and dt.year == targetYear):
-						# match on topics, if passed
-						if targetTerms is None or headline.HasTopicalHeadlineHit(targetTerms):
-							headlines.append(headline)
-					#	else:
-					#		print("topic miss: ", targetTerms, headline.GetFullText())
-					#else:
-					#	print("year miss")
+					isHit = False
+					# match on topics, if passed
+					topicHits = iter(matcher.HasTopicHits(headline.Headline))
+					for isMatchAll, headlines in zip(matchAll, topicHeadlines):
+						if isMatchAll or next(topicHits):
+							if isHit:
+								headlines.append(_copyHeadline(headline))
+							else:
+								headlines.append(headline)
+								isHit = True
+					if isHit:
+						numHits += 1
 			except:
 				traceback.print_exc()
 
 			i+=1
 			if i % 10000 == 9999:
-				hitRate = 100.0 * (float(len(headlines)) / float(i))
-				print("\r{} records processed, {} hits, {}% hit rate      ".format(i, len(headlines), str(hitRate)[0:8]), end="")
+				hitRate = 100.0 * (float(numHits) / float(i))
+				print("\r{} records processed, {} hits, {}% hit rate      ".format(i, numHits, str(hitRate)[0:8]), end="")
 				sys.stdout.flush()
 
-	#for headline in headlines:
-	#	headline.PrintTerse()
-	print("Parsed {} csv lines, {} hits.".format(i, len(headlines)))
-	
-	return headlines
+	print("Parsed {} csv lines, {} hits.".format(i, numHits))
+	for targetTerms, headlines in zip(topicLists, topicHeadlines):
+		print("  {} hits for {}".format(len(headlines), targetTerms))
+
+	return topicHeadlines
+
+def _copyHeadline(headline):
+	h = copy.copy(headline)
+	h.Attrib = dict(headline.Attrib)
+	return h
@@ -8,10 +8,12 @@ Use-case: you want to run cheetah against every content item, append its score t
 save/persist all records such that you can analyze them later without re-running the full analysis/algorithm.
 """
 
+import os
 import sys
 import traceback
 import datetime
 import math
+import multiprocessing
 from headline import Headline
 import cheetah
 import numpy as np
@@ -19,6 +21,21 @@ import csv_transformer
 from data_transformer import DataTransformer
 import harvard_loader
 from ascii_text_normalizer import AsciiTextNormalizer
+from term_stripper import TermStripper
+import vector_store
+
+# The visitor used by each worker process in HarvardCsvCheetahVisitor.cheetifyHarvardCsv(numWorkers > 1).
+_workerVisitor = None
+
+def _initWorkerVisitor(visitor):
+	global _workerVisitor
+	_workerVisitor = visitor
+
+def _workerTransformRecord(inputRec):
+	return _workerVisitor._transformRecord(inputRec)
+
+def _workerShardStats():
+	return _workerVisitor._popStats()
 
 class HarvardCsvCheetahVisitor(object):
 	def __init__(self, model, sentLex, stopLex):
@@ -31,6 +48,7 @@ class HarvardCsvCheetahVisitor(object):
 
 		self._textNormalizer = AsciiTextNormalizer()
 		self._stopLex = stopLex
+		self._stopStripper = TermStripper(stopLex.Words)
 		self._model = model
 		self._misses = 0
 		self._recCount = 0
@@ -76,7 +94,7 @@ class HarvardCsvCheetahVisitor(object):
 		if headline is not None:
 			DataTransformer.TextNormalizeHeadline(headline, self._textNormalizer, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
 			#drop stop words from headline
-			headline.StripTerms(self._stopLex.Words)
+			headline.StripTerms(self._stopStripper)
 			sumSimilarity = cheetah.cheetifyHeadline_optimized(headline, self._avgVec, self._sumPosUnitVec, self._sumNegUnitVec, self._model)
 			#sumSimilarity = cheetah.cheetifyHeadline(headline, self._avgVec, self._posCache, self._negCache, self._model)
 			#append similarity to rec, output that to csv
@@ -89,22 +107,77 @@ class HarvardCsvCheetahVisitor(object):
 
 		return inputRec
 
+	def _popStats(self):
+		# Returns and resets the record and miss counts; in parallel runs, these are a worker's counts for one shard
+		stats = {"records": self._recCount, "misses": self._misses}
+		self._recCount = 0
+		self._misses = 0
+		return stats
+
 	def _transformHeader(self, inputHeader):
 		inputHeader.append("cheetah")
 		return inputHeader
 
-	def cheetifyHarvardCsv(self, csvPath, opath):
+	def cheetifyHarvardCsv(self, csvPath, opath, numWorkers=1, resume=False):
 		"""
 		This is just a csv transformer for the Harvard Shorenstein csv data: consume the data, transform each record,
 		and output to a new csv file.
 		This transformer calculates cheetah scores for all records in the csv, appending a new 'cheetah' column for these scores,
 		so they can be persisted and analyzed offline without re-running cheetah.
-		NOTE: This will take up to 48 hours to run...
+		NOTE: This will take up to 48 hours to run single-process...
+		@numWorkers: If greater than 1, the csv is split into shards on record boundaries which are scored in parallel worker
+		processes, then merged into @opath in their original order. See csv_transformer.transformCsvParallel().
+		@resume: Continue an interrupted run to @opath from its last checkpoint. See csv_transformer.isResumable().
 		"""
 		self._misses = 0
 		self._recCount = 0
 
+		if resume and os.path.exists(csv_transformer.getCheckpointPath(opath)):
+			# an interrupted single-process run can only be continued single-process
+			numWorkers = 1
+
 		print("Adding cheetah values to csv. Note: text normalization is done inline, and not retained. No stemmer is used.")
-		csv_transformer.transformCsv(csvPath, self._transformRecord, self._transformHeader, opath, delimiter=',')
-	
+		if numWorkers > 1:
+			self._warnIfModelIsCopied()
+			stats = csv_transformer.transformCsvParallel(csvPath, _workerTransformRecord, self._transformHeader, opath, numWorkers=numWorkers, delimiter=',', initializer=_initWorkerVisitor, initargs=(self,), resume=resume, shardStatsFunc=_workerShardStats)
+		else:
+			csv_transformer.transformCsv(csvPath, self._transformRecord, self._transformHeader, opath, delimiter=',', resume=resume)
+			stats = self._popStats()
+		if stats is not None:
+			print("{} of {} records transformed in this run could not be parsed as headlines, and were scored NaN".format(stats.get("misses", 0), stats.get("records", 0)))
 
+	def _warnIfModelIsCopied(self):
+		"""
+		Workers share the model read-only if they are forked (copy-on-write pages), or if the model is a memory-mapped VectorStore, which
+		is pickled by path and re-mapped by each worker. Otherwise each worker receives its own pickled copy of the model.
+		"""
+		if multiprocessing.get_start_method() != "fork" and not isinstance(self._model.wv, vector_store.VectorStore):
+			print("WARNING: each worker process will receive its own copy of the model. Convert the model to a vector store (see main menu) to share it across workers.")
+
+
+# The typed columns of cheetified harvard data used by offline analyses (see scripts/topical_sentiment_series.py)
+HARVARD_COLUMNS = [
+	("publish_date", "datetime"),
+	("cheetah", "float"),
+	("media_url", "string"),
+	("title", "string"),
+	("facebook_share_count", "int")
+]
+
+def getColumnarPath(csvPath):
+	"""
+	Returns the default columnar export path for a cheetified csv: stories_election_web_cheetofied2.csv -> stories_election_web_cheetofied2.parquet
+	"""
+	return os.path.splitext(csvPath)[0] + ".parquet"
+
+def exportCheetifiedColumns(csvPath, opath=None):
+	"""
+	Exports the HARVARD_COLUMNS of a cheetified harvard csv (as output by HarvardCsvCheetahVisitor.cheetifyHarvardCsv()) to a typed Parquet
+	or Feather file, so analyses can load just these columns in well under a second instead of parsing the full multi-GB csv.
+	'undateable' publish dates are stored as nulls.
+	@opath: Output path; defaults to getColumnarPath(@csvPath)
+	Returns: The output path, or None on failure.
+	"""
+	if opath is None:
+		opath = getColumnarPath(csvPath)
+	return csv_transformer.exportCsvColumns(csvPath, opath, HARVARD_COLUMNS, delimiter=',')
@@ -0,0 +1,174 @@
+"""
+A cached query layer over the cheetified harvard shorenstein data frame, for the interactive loop of topical_sentiment_series.
+
+Each source/topic/date query used to filter the whole data frame by date, then run a case-insensitive regex str.contains over every title,
+once per topic list, and again for every plot and every pass of the loop. A HarvardQueryEngine prepares the frame once:
+	1) rows are sorted by publish_date (stably), so a date range is a slice found by binary search rather than a scan.
+	2) titles are lowercased once, so topic patterns match without case folding.
+	3) the topic masks of many topic lists are evaluated in one vectorized pass: each list's pattern becomes an optional lookahead with a
+	named group, ^(?:(?=.*?(?P<t0>trump|donald)))?(?:(?=.*?(?P<t1>clinton|hillary)))?..., and a single str.extract() gives the
+	boolean topic matrix of all titles by all topic lists.
+	4) topic masks, source masks and query results are cached by key, so repeated queries in a session are dictionary lookups.
+Sources are looked up in a SourceIndex, which scans the distinct media_urls rather than every row.
+Query results are shared between callers, so they must not be modified in place.
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+# patterns with none of these are plain text, and can be lowercased to match the lowercased titles
+_regexChars = set("\\()[]{}?*+|^$.")
+
+def isKleene(queryTerms):
+	return "*" in queryTerms
+
+def _getTopicPattern(topics):
+	pattern = "|".join(topics)
+	if not any(c in _regexChars for c in pattern):
+		return pattern.lower(), 0
+	return pattern, re.IGNORECASE
+
+
+class SourceIndex(object):
+	"""
+	An index of the rows of a data frame by their distinct media_url, so source queries scan the (thousands of) distinct urls rather than
+	the (millions of) rows, and gather the rows of the matching urls.
+	@df: A data frame with a "media_url" column
+	"""
+	def __init__(self, df):
+		codes, self.Urls = pd.factorize(df["media_url"], sort=True)
+		self.Urls = list(self.Urls)
+		self._numRows = len(codes)
+		# the row positions of each url, as contiguous runs of the rows sorted by url code; rows without a url (code -1) sort first
+		order = np.argsort(codes, kind="mergesort")
+		self.Counts = np.bincount(codes[codes >= 0], minlength=len(self.Urls))
+		bounds = np.concatenate(([0], np.cumsum(self.Counts))) + int((codes < 0).sum())
+		self._rowPositions = [order[bounds[i]:bounds[i+1]] for i in range(len(self.Urls))]
+
+	def GetUrlIndices(self, urls):
+		"""
+		Returns the indices into self.Urls of the urls containing any of @urls (substrings or regex'es, case insensitive), or all indices for "*".
+		"""
+		if isKleene(urls):
+			return list(range(len(self.Urls)))
+		pattern = re.compile("|".join(urls), re.IGNORECASE)
+		return [i for i, url in enumerate(self.Urls) if pattern.search(str(url)) is not None]
+
+	def GetMatchingUrls(self, urls):
+		"""
+		Returns (matchingUrls, numRows), the sorted distinct urls matching @urls and their total number of rows (for "*", all rows).
+		"""
+		indices = self.GetUrlIndices(urls)
+		numRows = self._numRows if isKleene(urls) else int(self.Counts[indices].sum())
+		return [self.Urls[i] for i in indices], numRows
+
+	def GetRowPositions(self, urls):
+		"""
+		Returns the sorted positions of the rows whose url matches @urls; for "*", all rows, including those without a url.
+		"""
+		if isKleene(urls):
+			return np.arange(self._numRows)
+		indices = self.GetUrlIndices(urls)
+		if len(indices) == 0:
+			return np.zeros(0, dtype=np.int64)
+		return np.sort(np.concatenate([self._rowPositions[i] for i in indices]))
+
+	def GetMask(self, urls):
+		"""
+		Returns a boolean array, true for the rows whose url matches @urls.
+		"""
+		mask = np.zeros(self._numRows, dtype=bool)
+		mask[self.GetRowPositions(urls)] = True
+		return mask
+
+
+class HarvardQueryEngine(object):
+	"""
+	@df: The harvard data frame, with at least "publish_date" (as datetimes), "title", "media_url" and "cheetah" columns
+	Sources is the SourceIndex of @df itself (not of the date-sorted self.Df), so it can be used with filterBySource(@df, ...).
+	"""
+	def __init__(self, df):
+		# the (stable) date order of the positions of @df, whose sources are indexed in @df's own row order, as loaded
+		self._order = pd.Series(df["publish_date"].values).sort_values(kind="mergesort").index.values
+		self.Df = df.iloc[self._order]
+		self.Sources = SourceIndex(df)
+		dates = self.Df["publish_date"].values
+		# NaT dates are sorted last, and are never in a date range
+		self._dates = dates[:len(dates) - int(np.isnat(dates).sum())]
+		titles = self.Df["title"]
+		self._hasTitle = titles.notnull().values
+		self._titles = titles.fillna("").astype(str).str.lower()
+		self._topicMasks = dict()
+		self._sourceMasks = dict()
+		self._results = dict()
+
+	def GetTopicMatrix(self, topicLists):
+		"""
+		Returns a DataFrame of booleans, with a row per row of self.Df and a column per topic list (named by its position), which is true
+		where the title matches any of the list's terms (which may be regex'es). Uncached topic lists are all evaluated in one pass.
+		"""
+		keys = [tuple(topics) for topics in topicLists]
+		newKeys = [key for key in dict.fromkeys(keys) if key not in self._topicMasks]
+		for key in [key for key in newKeys if isKleene(key)]:
+			#if querying all records, match all records. Note this will include even those with empty titles.
+			self._topicMasks[key] = np.ones(len(self.Df), dtype=bool)
+		newKeys = [key for key in newKeys if not isKleene(key)]
+
+		patterns = {key: _getTopicPattern(key) for key in newKeys}
+		#patterns with groups of their own (and so possibly backreferences, whose numbers would shift in the combined pattern) are matched separately
+		separateKeys = [key for key in newKeys if re.compile(patterns[key][0]).groups > 0]
+		combinedKeys = [key for key in newKeys if key not in separateKeys]
+		if len(combinedKeys) > 0:
+			flags = re.DOTALL | (re.IGNORECASE if any(patterns[key][1] for key in combinedKeys) else 0)
+			combined = "^" + "".join("(?:(?=.*?(?P<t{}>{})))?".format(i, patterns[key][0]) for i, key in enumerate(combinedKeys))
+			matches = self._titles.str.extract(combined, flags=flags)
+			for i, key in enumerate(combinedKeys):
+				self._topicMasks[key] = matches["t{}".format(i)].notnull().values & self._hasTitle
+		for key in separateKeys:
+			pattern, flag = patterns[key]
+			search = re.compile(pattern, flag | re.DOTALL).search
+			self._topicMasks[key] = np.fromiter((search(title) is not None for title in self._titles), dtype=bool, count=len(self._titles)) & self._hasTitle
+
+		return pd.DataFrame({i: self._topicMasks[key] for i, key in enumerate(keys)}, index=self.Df.index)
+
+	def _GetSourceMask(self, urls):
+		key = tuple(urls)
+		if key not in self._sourceMasks:
+			self._sourceMasks[key] = self.Sources.GetMask(urls)[self._order]
+		return self._sourceMasks[key]
+
+	def _GetDateSlice(self, minDt, maxDt):
+		low = np.datetime64(minDt) if minDt is not None else None
+		high = np.datetime64(maxDt) if maxDt is not None else None
+		start = 0 if low is None else int(np.searchsorted(self._dates, low, side="left"))
+		stop = len(self._dates) if high is None else int(np.searchsorted(self._dates, high, side="right"))
+		return slice(start, max(start, stop))
+
+	def Query(self, urls, topics, minDt=None, maxDt=None, dropNans=True, dropZeroes=False):
+		"""
+		Returns the rows of self.Df from any of the sources of @urls (substrings of media_url; or "*" for all) with titles on @topics (terms or
+		regex'es; or "*" for all), published within @minDt and @maxDt inclusive, sorted by publish_date. The result is cached, and must not be
+		modified in place.
+		@dropNans: Drop rows without a cheetah score
+		@dropZeroes: Drop rows with a cheetah score of zero, which for short headlines usually means no score
+		"""
+		key = (tuple(urls), tuple(topics), minDt, maxDt, dropNans, dropZeroes)
+		if key not in self._results:
+			self.GetTopicMatrix([topics])
+			dates = self._GetDateSlice(minDt, maxDt)
+			mask = self._topicMasks[tuple(topics)][dates] & self._GetSourceMask(urls)[dates]
+			if dropNans or dropZeroes:
+				scores = self.Df["cheetah"].values[dates]
+				if dropNans:
+					mask &= ~pd.isnull(scores)
+				if dropZeroes:
+					mask &= scores != 0.0
+			self._results[key] = self.Df.iloc[dates][mask]
+			print("Got {} records on topic query {}".format(self._results[key].size, topics))
+		return self._results[key]
+
+	def ClearCache(self):
+		self._topicMasks.clear()
+		self._sourceMasks.clear()
+		self._results.clear()
@@ -7,13 +7,52 @@ import json
 from datetime import datetime
 import dateutil.parser
 import re
+import gc
+import functools
+from topic_matcher import getTopicMatcher
+from term_stripper import TermStripper, getTermStripper
 
 """
 Primitive storage object for holding headlines.
+
+Headlines use __slots__, since millions are held in memory when loading multi-year corpora: a slotted Headline is ~200 bytes before any
+text, versus ~600 for an instance __dict__. So only the attributes below can be set; put variable attributes in Attrib.
 """
 
+def _intern(value):
+	# interns repeated, low-cardinality string fields (layouts, sources, authors...) so all headlines share one copy of each value
+	return sys.intern(value) if type(value) is str else value
+
+_dtFormat = "%Y-%m-%d %H:%M:%S"
+
+@functools.lru_cache(maxsize=1 << 16)
+def _parseDt(dtString):
+	# datetime.fromisoformat() is ~30x faster than strptime(), but only used for exactly "YYYY-MM-DD HH:MM:SS" strings; anything else that
+	# strptime() accepts (e.g. single-digit fields) or rejects still goes through strptime(). Headlines of the same snapshot share their
+	# datetime string, so results are cached, and the (immutable) datetimes shared.
+	if len(dtString) == 19 and dtString[10] == " " and dtString[4] == "-" and dtString[7] == "-" and dtString[13] == ":" and dtString[16] == ":":
+		try:
+			return datetime.fromisoformat(dtString)
+		except ValueError:
+			pass
+	return datetime.strptime(dtString, _dtFormat)
+
+def _formatDt(dt):
+	# aware datetimes of the same instant at different offsets are equal (and hash equal) but format differently, so only naive ones are cached
+	if dt.tzinfo is not None:
+		return dt.strftime(_dtFormat)
+	return _formatNaiveDt(dt)
+
+@functools.lru_cache(maxsize=1 << 16)
+def _formatNaiveDt(dt):
+	# isoformat() is several times faster than strftime(), and identical for naive datetimes with 4-digit years
+	if dt.year >= 1000:
+		return dt.isoformat(" ", "seconds")
+	return dt.strftime(_dtFormat)
+
 class Headline():
 	sourceUrlRegex = re.compile("/web/\d{14}")
+	__slots__ = ("Description", "Headline", "DT", "Rank", "URI", "Thumbnail", "Banner", "Authors", "IconType", "Duration", "Id", "Layout", "ArchiveSource", "FullText", "IsoWeek", "Attrib")
 
 	def __init__(self):
 		self.Description = ""
@@ -175,48 +214,14 @@ class Headline():
 		print("%s::%s::%s" % (self.Headline,self.URI,str(self.DT)))
 	
 	"""
-	Gets the value for a given field via the field string.
-	
-	TODO: This if-else is awful. Use a dictionary instead.
+	Gets the value for a given field via the field string (case insensitive), per the _valueFields table.
 	"""
 	def GetValue(self, field):
-		value = ""
-		field = field.lower()
-		
-		if field == "description":
-			value = self.Description
-		elif field == "headline":
-			value = self.Headline
-		elif field == "dt":
-			value = self.DT
-		elif field == "week":
-			value = self.IsoWeek
-		elif field == "isoweek":
-			value = self.IsoWeek
-		elif field == "rank":
-			value = self.Rank
-		elif field == "uri":
-			value = self.URI
-		elif field == "thumbnail":
-			value = self.Thumbnail
-		elif field == "banner":
-			value = self.Banner
-		elif field == "icontype":
-			value = self.IconType
-		elif field == "duration":
-			value = self.Duration
-		elif field == "id":
-			value = self.Id
-		elif field == "layout":
-			value = self.Layout
-		elif field == "authors" or field == "author":
-			value = self.Authors
-		elif field == "archivesource":
-			value = self.ArchiveSource
-		else:
-			print("ERROR field "+field+" not found")
-			
-		return value
+		attr = getFieldAttribute(field)
+		if attr is None:
+			print("ERROR field "+field.lower()+" not found")
+			return ""
+		return getattr(self, attr)
 			
 	"""
 		Given string formatted exactly as "Sun Oct 23 01:46:21 UTC 2016", returns iso-calendar week number.
@@ -261,10 +266,7 @@ class Headline():
 	#other topics), since the larger text of an article will usually include multiple topics. IOW, this identifies
 	#content uniquely identifying a particular topic, even though it could include ther topics in its body.
 	def HasTopicalHeadlineHit(self, topics):
-		for topic in topics:
-			if topic.lower() in self.Headline:
-				return True
-		return False
+		return getTopicMatcher([topics]).HasHit(self.Headline)
 
 	def HasTopicHit(self, topics):
 		"""
@@ -277,23 +279,23 @@ class Headline():
 		
 	#Note this counts the frequency of the hits, not just number of hits; so if a term occurs twice, 2 will be included in the sum
 	def CountTopicHits(self, topics):
-		txt = self.GetFullText().lower()
-		return sum([txt.count(topic.lower()) for topic in topics])
+		return getTopicMatcher([topics]).CountTopicHits(self.GetFullText(), ignoreCase=True)[0]
 	
 	"""
 	Used to remove terms, for various filtering.
 
-	Note that this removes any occurrence of @term in @terms, such that longer term 
-	references will be left as potential fragments: "Trump's day at the office..."
-	will be converted to "'s at the office..." for @terms=["Trump"].
+	Note that this removes @terms only as whole whitespace-delimited tokens, in a single pass per field, so other words containing them are
+	preserved: "trumps day at the office" becomes "trumps day at office" for @terms=["the", "trump"]. The remaining tokens are joined by single
+	spaces. See term_stripper.TermStripper.
 
 	Also note the case-sensitivity; this method is case-sensitive.
+	@terms: A collection of terms, or a TermStripper; pass a TermStripper when stripping the same terms from many headlines.
 	"""
 	def StripTerms(self, terms):
-		for term in terms:
-			self.Headline = self.Headline.replace(term,"")
-			self.Description = self.Description.replace(term,"")
-			self.FullText = self.FullText.replace(term,"")
+		stripper = terms if isinstance(terms, TermStripper) else getTermStripper(terms)
+		self.Headline = stripper.Strip(self.Headline)
+		self.Description = stripper.Strip(self.Description)
+		self.FullText = stripper.Strip(self.FullText)
 
 	#Used to replace term
 	def ReplaceTerm(self, target, replacement):
@@ -309,80 +311,73 @@ class Headline():
 		return self.DT.date() >= lowDate and self.DT.date() <= highDate
 
 	"""
-	Inverse of ToDict(), given a python dictionary, maps its keys  to corresponding headline data members.
+	Inverse of ToDict(), given a python dictionary, maps its keys  to corresponding headline data members, via the _dictFields table.
 	"""	
 	def FromDict(self,d):
-		success = len(d.keys()) > 4
-		for key in d.keys():
-			if key == "description":
-				self.Description = d[key]
-			elif key == "headline":
-				self.Headline = d[key]
+		if d.keys() == _toDictKeys or d.keys() == _toDictKeysWithSource:
+			return self._FromToDict(d)
+
+		success = len(d) > 4
+		for key, value in d.items():
+			field = _dictFields.get(key)
+			if field is not None:
+				attr, convert = field
+				setattr(self, attr, value if convert is None else convert(value))
 			elif key == "datetime": #datetime must be formatted as "%Y-%m-%d %H:%M:%S", like isoformat() result but without microseconds
 				try:
-					self.DT = datetime.strptime(d[key], "%Y-%m-%d %H:%M:%S")
+					self.DT = _parseDt(value)
 					self.IsoWeek = self.DT.isocalendar()[1]
 				except:
 					success = False
-					print("ERROR could not parse datetime str into Headline.DT: "+d[key])
-					self.DT = d[key]
-			elif key == "rank":
-				self.Rank = int(d[key])
-			elif key == "uri":
-				self.URI = d[key]
-			elif key == "thumbnail" or key == "imageuri":
-				self.Thumbnail = d[key]
-			elif key == "banner":
-				self.Banner = d[key]
-			elif key == "authors":
-				try:
-					self.Authors = d[key]
-				except:
-					success = False
-					traceback.print_exc()
-					print("ERROR failed to deserialize Headline authors: "+str(d[key]))
-					self.Authors = d[key]
-			elif key == "duration":
-				self.Duration = d[key]
-			elif key == "id":
-				self.Id = int(d[key])
-			elif key == "layout":
-				self.Layout = d[key]
-			elif key == "fullText":
-				self.FullText = d[key]
-			elif key == "isoWeek":
-				self.IsoWeek = int(d[key])
-			elif key == "attrib":
-				try:
-					self.Attrib = d[key]
-				except:
-					success = False
-					traceback.print_exc()
-					print("ERROR could not deserialize Headline attrib dict: "+str(d[key]))
-					self.Attrib = dict()
-			elif key == "archiveSource":
-				self.ArchiveSource = d[key]
+					print("ERROR could not parse datetime str into Headline.DT: "+value)
+					self.DT = value
 			else:
 				print("ERROR key not found in Headline.FromDict(): "+key)
 
 		return success
 
+	def _FromToDict(self, d):
+		# FromDict() for dicts with exactly the keys output by ToDict(), which are assigned directly instead of dispatched per key
+		self.Description = d["description"]
+		self.Headline = d["headline"]
+		success = True
+		try:
+			self.DT = _parseDt(d["datetime"])
+		except:
+			success = False
+			print("ERROR could not parse datetime str into Headline.DT: "+d["datetime"])
+			self.DT = d["datetime"]
+		self.Rank = int(d["rank"])
+		self.URI = d["uri"]
+		self.Thumbnail = d["thumbnail"]
+		self.Banner = _intern(d["banner"])
+		self.Authors = _intern(d["authors"])
+		self.Duration = _intern(d["duration"])
+		self.Id = int(d["id"])
+		self.Layout = _intern(d["layout"])
+		self.FullText = d["fullText"]
+		self.IsoWeek = int(d["isoWeek"]) #as in ToDict() output (and its sorted keys), isoWeek follows and overrides the datetime's week
+		self.Attrib = d["attrib"]
+		if "archiveSource" in d:
+			self.ArchiveSource = _intern(d["archiveSource"])
+		return success
+
 	def ToDict(self,filterSource=True):
-		keyVals = dict()
-
-		keyVals["description"] = self.Description
-		keyVals["headline"] = self.Headline
-		#the conversion of DT to string is required for serialization
-		keyVals["datetime"] = self.DT.strftime("%Y-%m-%d %H:%M:%S") #same as dt.isoformat(), but without microseconds or 'T'
-		keyVals["rank"] = self.Rank
-		keyVals["banner"] = self.Banner
-		keyVals["authors"] = self.Authors
-		keyVals["duration"] = self.Duration
-		keyVals["id"] = self.Id
-		keyVals["layout"] = self.Layout
-		keyVals["fullText"] = self.FullText
-		keyVals["isoWeek"] = self.IsoWeek
-		keyVals["attrib"] = self.Attrib
+		keyVals = {
+			"description": self.Description,
+			"headline": self.Headline,
+			#the conversion of DT to string is required for serialization
+			"datetime": _formatDt(self.DT), #same as dt.isoformat(), but without microseconds or 'T'
+			"rank": self.Rank,
+			"banner": self.Banner,
+			"authors": self.Authors,
+			"duration": self.Duration,
+			"id": self.Id,
+			"layout": self.Layout,
+			"fullText": self.FullText,
+			"isoWeek": self.IsoWeek,
+			"attrib": self.Attrib
+		}
 
 		if filterSource: #strip or omit source info
 			keyVals["uri"] = self._getSourceUrl(self.URI)  #source info should be filtered on ingress/read, not here, this is just a second egress protection
@@ -394,8 +389,39 @@ class Headline():
 
 		return keyVals
 
+	@staticmethod
+	def FromDicts(dicts):
+		"""
+		Bulk FromDict(): returns the Headlines for a list of dicts, skipping (with a warning) any that fail to load.
+		The cyclic garbage collector is paused meanwhile: allocating millions of headlines otherwise triggers repeated full collections,
+		which cost ~40% of the load time, and headlines contain no reference cycles for it to collect.
+		"""
+		gcEnabled = gc.isenabled()
+		gc.disable()
+		try:
+			headlines = []
+			for d in dicts:
+				headline = Headline()
+				if headline.FromDict(d):
+					headlines.append(headline)
+				else:
+					print("WARNING: load failed for headline dict: "+str(d))
+		finally:
+			if gcEnabled:
+				gc.enable()
+		return headlines
+
+	@staticmethod
+	def ToDicts(headlines, filterSource=True):
+		"""
+		Bulk ToDict() for a list of Headlines.
+		"""
+		return [headline.ToDict(filterSource) for headline in headlines]
+
 	def _getSourceUrl(self, url):
 		#print(str(type(url)))
+		if "/web/" not in url:
+			return url
 		match = self.sourceUrlRegex.search(url)
 		if match is not None:
 			return url[match.end()+1:] # [1:] to slice the leading '/'
@@ -437,9 +463,9 @@ class Headline():
 			if "Id" == description[i][0]:
 				self.Id = rec[i]
 			elif "authors" in description[i][0]:
-				self.Authors = rec[i]
+				self.Authors = _intern(rec[i])
 			elif "layout" in description[i][0]:
-				self.Layout = rec[i]
+				self.Layout = _intern(rec[i])
 			elif "description" in description[i][0]:
 				self.Description = rec[i].lower()
 			elif "headline" in description[i][0]:
@@ -457,12 +483,12 @@ class Headline():
 			elif "iconType" in description[i][0]:
 				self.IconType = ""
 				if rec[i] != None:
-					self.IconType = rec[i]
+					self.IconType = _intern(rec[i])
 			elif "isprimary" in description[i][0].lower():
 				self.Attrib["isPrimary"] = rec[i].lower()
 				#print("IsPrimary: {}".format(rec[i].lower()))
 			elif "archiveSource" in description[i][0]:
-				self.ArchiveSource = rec[i] 
+				self.ArchiveSource = _intern(rec[i])
 				dateStr = self.ArchiveSource.replace("_", " ")
 				#print("ARCHIVE SOURCE: "+dateStr)
 				self.DT = datetime.strptime(dateStr, "%a %b %d %H:%M:%S %Z %Y")  #formatting: "Sun Oct 23 01:46:21 UTC 2016"
@@ -487,3 +513,51 @@ class Headline():
 		return self
 		
 
+# The key sets output by Headline.ToDict(filterSource=True) and ToDict(filterSource=False)
+_toDictKeys = frozenset(["description", "headline", "datetime", "rank", "banner", "authors", "duration", "id", "layout", "fullText", "isoWeek", "attrib", "uri", "thumbnail"])
+_toDictKeysWithSource = _toDictKeys.union(["archiveSource"])
+
+# Maps Headline.ToDict() keys to (attribute, converter) for FromDict(); "datetime" is handled separately, since it sets both DT and IsoWeek.
+_dictFields = {
+	"description": ("Description", None),
+	"headline": ("Headline", None),
+	"rank": ("Rank", int),
+	"uri": ("URI", None),
+	"thumbnail": ("Thumbnail", None),
+	"imageuri": ("Thumbnail", None),
+	"banner": ("Banner", _intern),
+	"authors": ("Authors", _intern),
+	"duration": ("Duration", _intern),
+	"id": ("Id", int),
+	"layout": ("Layout", _intern),
+	"fullText": ("FullText", None),
+	"isoWeek": ("IsoWeek", int),
+	"attrib": ("Attrib", None),
+	"archiveSource": ("ArchiveSource", _intern)
+}
+
+# Maps the (lowercased) field names accepted by Headline.GetValue() to attributes
+_valueFields = {
+	"description": "Description",
+	"headline": "Headline",
+	"dt": "DT",
+	"week": "IsoWeek",
+	"isoweek": "IsoWeek",
+	"rank": "Rank",
+	"uri": "URI",
+	"thumbnail": "Thumbnail",
+	"banner": "Banner",
+	"icontype": "IconType",
+	"duration": "Duration",
+	"id": "Id",
+	"layout": "Layout",
+	"authors": "Authors",
+	"author": "Authors",
+	"archivesource": "ArchiveSource"
+}
+
+def getFieldAttribute(field):
+	"""
+	Returns the Headline attribute name for a Headline.GetValue() @field name (case insensitive), e.g. "uri" -> "URI", or None if there is none.
+	"""
+	return _valueFields.get(field.lower(), None)
@@ -25,12 +25,59 @@ SourceResultCollection: a container for one source's search results
 
 """
 
+import os
+import gc
 import json
 from headline import Headline
+from file_util import atomicWrite
+from topic_matcher import getTopicMatcher
 import traceback
 import inspect
+import numpy as np
 from datetime import datetime
 
+class HeadlineDtIndex(object):
+	"""
+	A datetime index over a list of headlines: their positions sorted by DT, and the sorted DTs' dates as a numpy datetime64 array.
+	Date range queries are then np.searchsorted() slices, and the min/max DT are just the first and last sorted headlines.
+	The indexed list itself is not reordered, so range queries return headlines in their original order, as linear filtering does.
+	Use Build(), and IsValidFor() to detect that the list has been replaced or resized since.
+	"""
+	def __init__(self, headlines, order, dates):
+		self.Headlines = headlines
+		self._length = len(headlines)
+		self._order = order
+		self._dates = dates
+
+	@staticmethod
+	def Build(headlines):
+		"""
+		Returns the index of @headlines, or None if any headline's DT is not a naive datetime (None or '' for undated headlines, or
+		tz-aware datetimes, whose order and dates depend on their timezones). Callers fall back to linear scans for these.
+		"""
+		dts = [headline.DT for headline in headlines]
+		if not all(type(dt) is datetime and dt.tzinfo is None for dt in dts):
+			return None
+		dtArray = np.array(dts, dtype="datetime64[us]")
+		order = np.argsort(dtArray, kind="stable")
+		return HeadlineDtIndex(headlines, order, dtArray[order].astype("datetime64[D]"))
+
+	def IsValidFor(self, headlines):
+		return headlines is self.Headlines and len(headlines) == self._length
+
+	def GetMinMaxDt(self):
+		if self._length == 0:
+			return datetime.max, datetime.min
+		return self.Headlines[self._order[0]].DT, self.Headlines[self._order[-1]].DT
+
+	def GetDateRange(self, lowDate, highDate):
+		"""
+		Returns the headlines dated (by DT.date()) within @lowDate and @highDate inclusive, as per Headline.IsInDateRange().
+		"""
+		lo = np.searchsorted(self._dates, np.datetime64(lowDate, "D"), side="left")
+		hi = np.searchsorted(self._dates, np.datetime64(highDate, "D"), side="right")
+		return [self.Headlines[i] for i in np.sort(self._order[lo:hi]).tolist()]
+
 class QueryResult(object):
 	"""
 	@queryTopics: A list of query terms comprising one topic: ["donald", "trump", "djt"]
@@ -39,19 +86,58 @@ class QueryResult(object):
 	def __init__(self, queryTopics, headlines):
 		self.Topics = sorted(queryTopics)
 		self.Headlines = headlines
+		self._dtIndex = None
 
 	def GetSummary(self):
 		return "{}:{}".format(str(self.Topics), len(self.Headlines))
 
+	def GetDtIndex(self):
+		"""
+		Returns the HeadlineDtIndex of self.Headlines, (re)building it if self.Headlines has been replaced or resized since; or None if it
+		has undated or tz-aware headlines. Note that changing headlines' DT in place, or replacing list items, requires ClearDtIndex().
+		"""
+		if self._dtIndex is None or not self._dtIndex.IsValidFor(self.Headlines):
+			self._dtIndex = HeadlineDtIndex.Build(self.Headlines)
+		return self._dtIndex
+
+	def ClearDtIndex(self):
+		self._dtIndex = None
+
+	def FilterByDtDate(self, lowDate, highDate):
+		"""
+		Returns the headlines of this result within datetime.date's @lowDate and @highDate, inclusive, in their original order.
+		"""
+		dtIndex = self.GetDtIndex()
+		if dtIndex is None:
+			return [headline for headline in self.Headlines if headline.IsInDateRange(lowDate, highDate)]
+		return dtIndex.GetDateRange(lowDate, highDate)
+
+	def GetMinMaxDt(self):
+		"""
+		Returns the (min, max) headline DT, or (datetime.max, datetime.min) if there are no headlines.
+		"""
+		dtIndex = self.GetDtIndex()
+		if dtIndex is not None:
+			return dtIndex.GetMinMaxDt()
+		minDt = datetime.max
+		maxDt = datetime.min
+		for headline in self.Headlines:
+			if headline.DT < minDt:
+				minDt = headline.DT
+			if headline.DT > maxDt:
+				maxDt = headline.DT
+		return minDt, maxDt
+
 #Container for many TopicSearchResults, for a unique source. 
 class ResultCollection(object):
 	"""
 	@name: Name of the ContentSource, e.g. "cnn" per the content-source, NOT the org
 	@topicalResults: A list of QueryResults for this source.
 	"""
-	def __init__(self, name, topicalResults=[]):
+	def __init__(self, name, topicalResults=None):
 		self.Name = name
-		self.QueryResults = topicalResults
+		# not a [] default arg, which every collection constructed without results would share
+		self.QueryResults = topicalResults if topicalResults is not None else []
 
 	def _isHeadline(self, o):
 		try:
@@ -75,6 +161,9 @@ class ResultCollection(object):
 		#print("Type: {}".format(type(o)))
 		if self._isHeadline(o):  #isinstance much safer and more stable than 'type(o)==Headline' which gets fucked by relative imports and qualified class names common.headline.Headline for some reason
 			return o.ToDict()
+		elif isinstance(o, QueryResult):
+			#omit the dt index
+			return {"Topics": o.Topics, "Headlines": o.Headlines}
 		else:
 			#print("Returning __dict__ for object type {}".format(type(o)))
 			return o.__dict__
@@ -96,11 +185,11 @@ class ResultCollection(object):
 		minDt = datetime.max
 		maxDt = datetime.min
 		for queryResult in self.QueryResults:
-			for headline in queryResult.Headlines:
-				if headline.DT < minDt:
-					minDt = headline.DT
-				if headline.DT > maxDt:
-					maxDt = headline.DT
+			resultMinDt, resultMaxDt = queryResult.GetMinMaxDt()
+			if resultMinDt < minDt:
+				minDt = resultMinDt
+			if resultMaxDt > maxDt:
+				maxDt = resultMaxDt
 		return minDt, maxDt
 
 	@staticmethod
@@ -127,11 +216,14 @@ class ResultCollection(object):
 		in @topicLists, each of which includes all headlines containing any terms in that topic-list.
 		Note this is for partitioning headlines via topics, not "load these headlines directly with these topics".
 		"""
-		results = []
-		for topicList in topicLists:
-			hits = [headline for headline in headlines if headline.HasTopicHit(topicList)]
-			result = QueryResult(topicList, hits)
-			results.append(result)
+		#scan each headline once for all topic lists
+		matcher = getTopicMatcher(topicLists)
+		topicHits = [[] for _ in topicLists]
+		for headline in headlines:
+			for hits, isHit in zip(topicHits, matcher.HasTopicHits(headline.GetFullText(), ignoreCase=True)):
+				if isHit:
+					hits.append(headline)
+		results = [QueryResult(topicList, hits) for topicList, hits in zip(topicLists, topicHits)]
 
 		return ResultCollection(name, results)
 
@@ -184,7 +276,7 @@ class ResultCollection(object):
 		for collection in resultCollections:
 			for result in collection.QueryResults:
 				if dtLow is not None and dtHigh is not None:
-					headlines = [headline for headline in result.Headlines if headline.IsInDateRange(dtLow, dtHigh)]
+					headlines = result.FilterByDtDate(dtLow, dtHigh)
 				else:
 					headlines = result.Headlines
 				topicalDict[frozenset(result.Topics)] += headlines
@@ -200,6 +292,9 @@ class ResultCollection(object):
 	"""
 	@staticmethod
 	def SaveCollections(resultCollections, savePath):
+		if savePath.endswith(".jsonl"):
+			return ResultCollection.SaveCollectionsJsonl(resultCollections, savePath)
+
 		print("Saving collections to {}".format(savePath))
 		#save the raw data as one big pot, in a single file, as list of ResultCollection json objects
 		with open(savePath,"w+") as ofile:
@@ -213,6 +308,9 @@ class ResultCollection(object):
 
 	@staticmethod
 	def LoadCollections(jsonPath): #loads ResultCollection from saved json; inverse of SaveCollections()
+		if jsonPath.endswith(".jsonl"):
+			return ResultCollection.LoadCollectionsJsonl(jsonPath)
+
 		resultCollections = []
 		
 		with open(jsonPath,"r") as jsonFile:
@@ -221,19 +319,94 @@ class ResultCollection(object):
 				collection = ResultCollection(name=d["Name"])
 				for qrDict in d["QueryResults"]:
 					topics = qrDict["Topics"]
-					topicalHeadlines = []
-					for headlineDict in qrDict["Headlines"]:
-						headline = Headline()
-						if headline.FromDict(headlineDict):
-							topicalHeadlines.append(headline)
-						else:
-							print("WARNING: load failed for headline dict: "+str(headlineDict))
+					topicalHeadlines = Headline.FromDicts(qrDict["Headlines"])
 					queryResult = QueryResult(topics, topicalHeadlines)
 					collection.QueryResults.append(queryResult)
 				resultCollections.append(collection)
 
 		return resultCollections
 
+	"""
+	JSON Lines storage of result collections, for datasets too large to json.load()/json.dump() as a whole. Each line is one json object:
+		{"Name": "cnn"}                   begins a ResultCollection
+		{"Topics": ["donald", "trump"]}   begins a QueryResult of the current collection
+		{"headline": ..., "uri": ...}     a Headline.ToDict() of the current QueryResult
+	So headlines are written and read one at a time, in constant memory, and can be processed as they are read; see IterJsonl().
+	"""
+	@staticmethod
+	def SaveCollectionsJsonl(resultCollections, savePath, filterSource=True, bufferSize=1 << 20):
+		print("Saving collections to {}".format(savePath))
+		#an interrupted save never leaves a truncated file at @savePath
+		with atomicWrite(savePath, encoding="utf-8", buffering=bufferSize) as ofile:
+			for collection in resultCollections:
+				ofile.write(json.dumps({"Name": collection.Name}, ensure_ascii=False) + "\n")
+				for result in collection.QueryResults:
+					ofile.write(json.dumps({"Topics": result.Topics}, ensure_ascii=False) + "\n")
+					for headline in result.Headlines:
+						ofile.write(json.dumps(headline.ToDict(filterSource), ensure_ascii=False) + "\n")
+
+	@staticmethod
+	def _IterJsonlRecords(jsonlPath):
+		# yields the ("Name", name), ("Topics", topics) and ("Headline", Headline) records of a jsonl file, in file order
+		with open(jsonlPath, "r", encoding="utf-8") as jsonlFile:
+			for line in jsonlFile:
+				if len(line.strip()) == 0:
+					continue
+				d = json.loads(line)
+				if "Name" in d:
+					yield "Name", d["Name"]
+				elif "Topics" in d:
+					yield "Topics", d["Topics"]
+				else:
+					headline = Headline()
+					if headline.FromDict(d):
+						yield "Headline", headline
+					else:
+						print("WARNING: load failed for headline dict: "+str(d))
+
+	@staticmethod
+	def IterJsonl(jsonlPath):
+		"""
+		Lazily reads a file written by SaveCollectionsJsonl(), yielding a (collection name, topics, Headline) triple per headline, in file order.
+		Headlines which fail to load are skipped with a warning, as in LoadCollections().
+		"""
+		name, topics = None, None
+		for kind, value in ResultCollection._IterJsonlRecords(jsonlPath):
+			if kind == "Name":
+				name, topics = value, None
+			elif kind == "Topics":
+				topics = value
+			elif topics is None:
+				print("ERROR headline precedes any topics in {}, skipped".format(jsonlPath))
+			else:
+				yield name, topics, value
+
+	@staticmethod
+	def LoadCollectionsJsonl(jsonlPath):
+		"""
+		Loads the ResultCollections of a file written by SaveCollectionsJsonl(). Empty query results and collections are preserved.
+		"""
+		resultCollections = []
+		#as in Headline.FromDicts(), pause the garbage collector while allocating all headlines
+		gcEnabled = gc.isenabled()
+		gc.disable()
+		try:
+			for kind, value in ResultCollection._IterJsonlRecords(jsonlPath):
+				if kind == "Name":
+					resultCollections.append(ResultCollection(value))
+				elif kind == "Topics":
+					resultCollections[-1].AddResult(value, [])
+				else:
+					resultCollections[-1].QueryResults[-1].Headlines.append(value)
+		except IndexError:
+			print("ERROR {} is not a result collection jsonl file: topics or headlines precede their collection".format(jsonlPath))
+			return None
+		finally:
+			if gcEnabled:
+				gc.enable()
+
+		return resultCollections
+
 	@staticmethod
 	def PrintResultCollectionSummary(resultCollections):
 		for collection in resultCollections:
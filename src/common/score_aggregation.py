@@ -0,0 +1,80 @@
+"""
+Vectorized aggregation of headline scores, such as cheetah sentiment, for reports.
+
+getCheetahScores() and plotCheetahHistogram() used to read headline.Attrib[scoreKey] into a new python list for every time series or
+histogram, and scan every headline again for the histogram range and share weights. A HeadlineScores is built once per QueryResult,
+pulling each headline's score, share weight and date into numpy arrays in one pass; time bins (via time_binning), histograms and
+share-weighted histograms (via np.histogram) and summary stats are then computed from the arrays.
+"""
+
+import numpy as np
+import time_binning
+
+
+class HeadlineScores(object):
+	"""
+	The scores, share weights and dates of a list of headlines, as numpy arrays.
+	@headlines: A list of Headline objects, each with a numeric headline.Attrib[@scoreKey]
+	@scoreKey: The Attrib key of the scores, e.g. "cheetah"
+	"""
+	def __init__(self, headlines, scoreKey="cheetah"):
+		self.ScoreKey = scoreKey
+		self.Scores = np.fromiter((headline.Attrib[scoreKey] for headline in headlines), dtype=np.float64, count=len(headlines))
+		# headlines are weighted by their share count, or 1 if they have none
+		self.ShareWeights = np.fromiter((headline.Attrib.get("share_count", 0) for headline in headlines), dtype=np.float64, count=len(headlines))
+		self.ShareWeights[self.ShareWeights <= 0] = 1
+		self.Days = time_binning.toDayArray([headline.DT for headline in headlines])
+
+	def __len__(self):
+		return len(self.Scores)
+
+	def GetMinMaxScore(self):
+		"""
+		Returns the (min, max) score, or None if there are no scores.
+		"""
+		if len(self.Scores) == 0:
+			return None
+		return self.Scores.min(), self.Scores.max()
+
+	def GetMeanScore(self):
+		"""
+		Returns the mean score, or None if there are no scores.
+		"""
+		if len(self.Scores) == 0:
+			return None
+		return float(self.Scores.mean())
+
+	def BinScores(self, lowDate=None, highDate=None, dtGrouping="weekly"):
+		"""
+		Aggregates the scores by time bin; see time_binning.binScores().
+		@lowDate/@highDate: The date range of the bins; default to the first and last headline dates.
+		Returns: (binKeys, counts, sums, means), or None if binning fails.
+		"""
+		if len(self.Days) > 0:
+			if lowDate is None:
+				lowDate = self.Days.min()
+			if highDate is None:
+				highDate = self.Days.max()
+		if lowDate is None or highDate is None:
+			print("ERROR no headlines from which to determine the date range of the bins")
+			return None
+		return time_binning.binScores(self.Days, self.Scores, lowDate, highDate, dtGrouping)
+
+	def Histogram(self, numBins, valueRange=None, shareWeighted=False, density=False):
+		"""
+		Returns the (counts, binEdges) histogram of the scores, as np.histogram().
+		@valueRange: The (min, max) range of the bins; defaults to the range of the scores
+		@shareWeighted: If true, each score is weighted by its share weight
+		@density: If true, the histogram is normalized such that its integral is 1.0
+		"""
+		weights = self.ShareWeights if shareWeighted else None
+		return np.histogram(self.Scores, numBins, valueRange, weights=weights, density=density)
+
+def getCollectionScoreRange(headlineScores):
+	"""
+	Returns the (min, max) score over a list of HeadlineScores, or None if they have no scores.
+	"""
+	ranges = [scores.GetMinMaxScore() for scores in headlineScores if len(scores) > 0]
+	if len(ranges) == 0:
+		return None
+	return min(low for low, _ in ranges), max(high for _, high in ranges)
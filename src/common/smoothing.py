@@ -0,0 +1,59 @@
+"""
+Smoothing of score series, such as binned cheetah scores, in O(n) regardless of the window.
+
+Moving averages are computed from a cumulative sum: the sum of any window is the difference of two cumulative sums, so every window
+mean is two array lookups, instead of summing each window. Windows are centered as in pandas' rolling(k, center=True): the window of
+index i spans [i - k//2, i + (k-1)//2], so odd windows are symmetric and even windows lean left, e.g. k=2 averages seq[i-1] and seq[i].
+Windows that run off either end of the series are handled per @edges:
+	"shrink": average only the part of the window within the series, so the end values converge to the actual values there
+	"nan": NaN, as pandas does by default
+	"trim": drop them, returning only the len(seq)-k+1 full windows
+
+Exponentially weighted moving averages (EWMA) match pandas' ewm(span=...).mean() for series without NaNs, computed as linear filters.
+"""
+
+import numpy as np
+import scipy.signal
+
+EDGE_MODES = ["shrink", "nan", "trim"]
+
+def movingAverage(seq, k, edges="shrink"):
+	"""
+	Returns the centered @k-window moving average of @seq (a list or array of floats), as a numpy array; see module notes for @edges.
+	Returns None if @edges is unknown.
+	"""
+	values = np.asarray(seq, dtype=np.float64)
+	n = len(values)
+	k = max(1, int(k))
+	if edges not in EDGE_MODES:
+		print("ERROR unknown edge mode {}. Use one of {}".format(edges, EDGE_MODES))
+		return None
+
+	cumsum = np.concatenate(([0.0], np.cumsum(values)))
+	indices = np.arange(n)
+	lows = indices - k // 2
+	highs = indices + (k - 1) // 2 + 1
+	if edges == "trim":
+		full = (lows >= 0) & (highs <= n)
+		lows, highs = lows[full], highs[full]
+	clippedLows, clippedHighs = np.clip(lows, 0, n), np.clip(highs, 0, n)
+	means = (cumsum[clippedHighs] - cumsum[clippedLows]) / np.maximum(clippedHighs - clippedLows, 1)
+	if edges == "nan":
+		means[(lows < 0) | (highs > n)] = np.nan
+	return means
+
+def ewma(seq, span, adjust=True):
+	"""
+	Returns the exponentially weighted moving average of @seq with decay alpha = 2/(@span+1), as pandas' Series.ewm(span=@span, adjust=@adjust).mean().
+	@adjust: If true, each value is the weighted mean of all values so far, with weights (1-alpha)^age; if false, it is the recursive
+	y[i] = (1-alpha)*y[i-1] + alpha*seq[i], with y[0] = seq[0].
+	"""
+	values = np.asarray(seq, dtype=np.float64)
+	if len(values) == 0:
+		return values
+	alpha = 2.0 / (span + 1.0)
+	decay = [1.0, alpha - 1.0]
+	if adjust:
+		#the running weighted sums of the values and of the weights, each a first-order recursive filter
+		return scipy.signal.lfilter([1.0], decay, values) / scipy.signal.lfilter([1.0], decay, np.ones(len(values)))
+	return scipy.signal.lfilter([alpha], decay, values, zi=[(1.0 - alpha) * values[0]])[0]
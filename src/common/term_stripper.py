@@ -0,0 +1,52 @@
+"""
+Token-level term removal, for stop words and off-topic topic terms.
+
+Headline.StripTerms() used to run str.replace once per term per field, which is O(terms x text) and also removed terms from within
+other words: stripping "the" turned "therapy" into "rapy". A TermStripper is built once for a set of terms and removes whole
+whitespace-delimited tokens in a single pass over a text:
+	1) single-token terms are removed by a frozenset membership test per token of text.split().
+	2) multi-token terms, like the normalized stop word "don t", are removed first by one compiled regex alternation, matched only
+	on whitespace boundaries.
+The output tokens are joined by single spaces. Matching is case-sensitive, so terms and text should be normalized the same way.
+
+Use getTermStripper() to reuse strippers for the same terms.
+"""
+
+import re
+import functools
+
+
+class TermStripper(object):
+	"""
+	@terms: An iterable of terms to remove. Whitespace within terms is normalized to single spaces, and empty terms are ignored.
+	"""
+	def __init__(self, terms):
+		terms = set(" ".join(term.split()) for term in terms)
+		terms.discard("")
+		self.Terms = frozenset(terms)
+		self._tokens = frozenset(term for term in terms if " " not in term)
+		multiTokenTerms = [term for term in terms if " " in term]
+		self._multiTokenPattern = None
+		if len(multiTokenTerms) > 0:
+			# longest first, so a term is never pre-empted by a shorter term it starts with; \s+ also matches the multiple spaces and tabs split() would
+			alternation = "|".join(r"\s+".join(re.escape(token) for token in term.split()) for term in sorted(multiTokenTerms, key=len, reverse=True))
+			self._multiTokenPattern = re.compile(r"(?<!\S)(?:" + alternation + r")(?!\S)")
+
+	def Strip(self, text):
+		"""
+		Returns @text with all occurrences of self.Terms as whole tokens removed, and its remaining tokens joined by single spaces.
+		"""
+		if self._multiTokenPattern is not None:
+			text = self._multiTokenPattern.sub(" ", text)
+		tokens = self._tokens
+		return " ".join([token for token in text.split() if token not in tokens])
+
+@functools.lru_cache(maxsize=64)
+def _getTermStripper(terms):
+	return TermStripper(terms)
+
+def getTermStripper(terms):
+	"""
+	Returns a (cached) TermStripper for @terms, so repeated calls with the same terms don't rebuild the stripper.
+	"""
+	return _getTermStripper(frozenset(terms))
@@ -0,0 +1,103 @@
+"""
+Vectorized time binning of headlines and their scores.
+
+DataTransformer.BetterBinHeadlinesByWeek/Month used to build their bin keys by iterating day by day from dtLow to dtHigh, then look up
+each headline's bin key in a dict, and getCheetahScores() then summed each bin's scores in python. Here, dates are numpy datetime64[D]
+arrays:
+	1) the bin key of every day in [lowDate, highDate] is computed with datetime64 arithmetic, and the days are mapped to bin indices
+	in order of the keys' first appearance, exactly as the day-by-day iteration did.
+	2) each headline's bin index is then a single array lookup, by its day offset from lowDate.
+	3) bin counts and score sums are np.bincount()'s, so count, sum and mean are all computed in one pass over the scores.
+
+Bin keys are tuples, as before:
+	daily: (day, month, year)
+	weekly: (isoweek, year). Note the year is the calendar year, not the iso year, so the days of an iso week spanning new year's fall
+	in two bins, and e.g. Dec 29-31 2014, of iso week 1 of 2015, share the bin (1, 2014) with Jan 1-4 2014. As before, if the first bin
+	is week 52 or 53 (the end of the previous iso year), it is moved to the end.
+	monthly: (month, year)
+	yearly: (year,)
+"""
+
+import numpy as np
+
+DT_GROUPINGS = ["daily", "weekly", "monthly", "yearly"]
+
+def toDayArray(dts):
+	"""
+	Converts a list of datetimes or dates (or a datetime64 array) to a datetime64[D] array. None entries become NaT.
+	"""
+	return np.array(dts, dtype="datetime64[D]")
+
+def _getYears(days):
+	return days.astype("datetime64[Y]").astype(np.int64) + 1970
+
+def getDayKeys(days, dtGrouping="weekly"):
+	"""
+	Returns the bin key (see module notes) of each datetime64[D] in @days, as a list of tuples.
+	"""
+	years = _getYears(days)
+	if dtGrouping == "daily":
+		months = days.astype("datetime64[M]")
+		dayOfMonth = (days - months.astype("datetime64[D]")).astype(np.int64) + 1
+		return list(zip(dayOfMonth.tolist(), (months.astype(np.int64) % 12 + 1).tolist(), years.tolist()))
+	elif dtGrouping == "weekly":
+		# the iso week of a day is that of the thursday of its (monday-first) week; 1970-01-01 was a thursday
+		weekdays = (days.astype(np.int64) + 3) % 7
+		thursdays = days - weekdays + 3
+		isoWeeks = (thursdays - thursdays.astype("datetime64[Y]").astype("datetime64[D]")).astype(np.int64) // 7 + 1
+		return list(zip(isoWeeks.tolist(), years.tolist()))
+	elif dtGrouping == "monthly":
+		return list(zip((days.astype("datetime64[M]").astype(np.int64) % 12 + 1).tolist(), years.tolist()))
+	elif dtGrouping == "yearly":
+		return [(year,) for year in years.tolist()]
+	print("ERROR: date bin not implemented: {}. Use one of {}".format(dtGrouping, DT_GROUPINGS))
+	return None
+
+def binDays(days, lowDate, highDate, dtGrouping="weekly"):
+	"""
+	Maps each datetime64[D] in @days to its time bin, over the bins spanning @lowDate to @highDate (dates, datetimes or datetime64) inclusive.
+	Returns: (binKeys, binIndices), the ordered list of bin keys and the bin index of each day in @days; or None if any day is undated (NaT)
+	or outside of @lowDate-@highDate.
+	"""
+	lowDay, highDay = np.datetime64(lowDate, "D"), np.datetime64(highDate, "D")
+	if len(days) > 0 and (np.isnat(days).any() or days.min() < lowDay or days.max() > highDay):
+		print("ERROR days must be dated, and pre-filtered per lowDate/highDate {} {}".format(lowDate, highDate))
+		return None
+
+	rangeKeys = getDayKeys(np.arange(lowDay, highDay + 1, dtype="datetime64[D]"), dtGrouping)
+	if rangeKeys is None:
+		return None
+	binKeys = []
+	keyIndices = dict()
+	dayBins = np.empty(len(rangeKeys), dtype=np.int64)
+	for i, key in enumerate(rangeKeys):
+		if key not in keyIndices:
+			keyIndices[key] = len(binKeys)
+			binKeys.append(key)
+		dayBins[i] = keyIndices[key]
+
+	if dtGrouping == "weekly":
+		# legacy ordering: a leading week 52 (and then 53) bin, the tail of the previous iso year, is moved to the end
+		for week in [52, 53]:
+			if len(binKeys) > 0 and binKeys[0][0] == week:
+				binKeys = binKeys[1:] + binKeys[:1]
+				dayBins = (dayBins - 1) % len(binKeys)
+
+	return binKeys, dayBins[(days - lowDay).astype(np.int64)]
+
+def binScores(dts, scores, lowDate, highDate, dtGrouping="weekly"):
+	"""
+	Aggregates @scores by the time bin of their @dts (see binDays()).
+	@dts: A list of datetimes/dates, or a datetime64 array, one per score
+	@scores: A list or array of floats
+	Returns: (binKeys, counts, sums, means), where counts, sums and means are numpy arrays indexed like binKeys. The mean of an empty bin is 0.
+	Returns None if binning fails.
+	"""
+	binned = binDays(toDayArray(dts), lowDate, highDate, dtGrouping)
+	if binned is None:
+		return None
+	binKeys, binIndices = binned
+	counts = np.bincount(binIndices, minlength=len(binKeys))
+	sums = np.bincount(binIndices, weights=np.asarray(scores, dtype=np.float64), minlength=len(binKeys)).astype(np.float64)
+	means = np.divide(sums, counts, out=np.zeros(len(binKeys)), where=counts > 0)
+	return binKeys, counts, sums, means
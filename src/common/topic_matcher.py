@@ -0,0 +1,112 @@
+"""
+Multi-pattern topic term matching.
+
+Topic filtering (Headline.HasTopicalHeadlineHit, Headline.CountTopicHits, DataTransformer.TopicFilterHeadlines, etc) used
+to run str.count or 'in' once per topic term per headline. A TopicMatcher is compiled once for a set of topic lists, and
+scans a text once for all of their terms:
+	1) all distinct terms are compiled into a single regex alternation, term1|term2|..., which re's C engine scans for
+	in one pass. Most texts contain no topic term at all, and are rejected by this scan alone.
+	2) only texts with a hit are scanned for the start positions of all terms, via zero-width lookaheads (?=term1|term2|...),
+	and at each such position the terms starting with that character are compared, counting non-overlapping occurrences per
+	term exactly as str.count does.
+	3) per-term counts are summed into per-topic-list counts (duplicate terms in a topic list count twice, like the old sum of str.counts).
+
+An Aho-Corasick automaton gives the same single pass, but in pure python its per-character state transitions are far slower
+than re's C implementation for the term sets used here.
+
+Use getTopicMatcher() to reuse matchers for the same topic lists.
+"""
+
+import re
+import functools
+
+
+class TopicMatcher(object):
+	"""
+	@topicLists: A list of topic term lists, e.g. [["trump", "donald"], ["clinton", "hillary"]]
+	@lowercase: If true, the terms are lowercased, as most callers match against lowercased text.
+	"""
+	def __init__(self, topicLists, lowercase=True):
+		self.TopicLists = [[term.lower() if lowercase else term for term in topics] for topics in topicLists]
+		termIndex = dict()
+		for topics in self.TopicLists:
+			for term in topics:
+				termIndex.setdefault(term, len(termIndex))
+		self.Terms = list(termIndex.keys())
+		self._topicTermIndices = [[termIndex[term] for term in topics] for topics in self.TopicLists]
+		# str.count("") is len(text)+1 and "" is in every string, so empty terms can't go in the pattern and are handled separately
+		self._emptyTermIndex = termIndex.get("", None)
+		# maps each first character to the (index, term) pairs starting with it, for the comparisons at each candidate position
+		self._termsByFirstChar = dict()
+		for i, term in enumerate(self.Terms):
+			if len(term) > 0:
+				self._termsByFirstChar.setdefault(term[0], []).append((i, term))
+		self._pattern = None
+		self._positionPattern = None
+		if len(self._termsByFirstChar) > 0:
+			alternation = "|".join(re.escape(term) for term in sorted(self.Terms, key=len, reverse=True) if len(term) > 0)
+			self._pattern = re.compile(alternation)
+			self._positionPattern = re.compile("(?=" + alternation + ")")
+
+	def CountTermHits(self, text, ignoreCase=False):
+		"""
+		Returns a list of the number of non-overlapping occurrences of each term of self.Terms in @text, i.e. [text.count(term) for term in self.Terms].
+		@ignoreCase: Match against @text.lower().
+		"""
+		counts = [0] * len(self.Terms)
+		if self._emptyTermIndex is not None:
+			counts[self._emptyTermIndex] = len(text) + 1
+		if self._pattern is None:
+			return counts
+		if ignoreCase:
+			text = text.lower()
+		firstMatch = self._pattern.search(text)
+		if firstMatch is None:
+			return counts
+
+		# the next position each term may match at, so that its occurrences don't overlap (as per str.count)
+		nextStart = [0] * len(self.Terms)
+		termsByFirstChar = self._termsByFirstChar
+		for match in self._positionPattern.finditer(text, firstMatch.start()):
+			pos = match.start()
+			for i, term in termsByFirstChar[text[pos]]:
+				if pos >= nextStart[i] and text.startswith(term, pos):
+					counts[i] += 1
+					nextStart[i] = pos + len(term)
+		return counts
+
+	def CountTopicHits(self, text, ignoreCase=False):
+		"""
+		Returns the number of topic term hits in @text for each topic list, in the order of self.TopicLists. Note this counts the frequency of
+		the hits, as Headline.CountTopicHits() does: if a term occurs twice, 2 is included in the sum.
+		"""
+		counts = self.CountTermHits(text, ignoreCase)
+		return [sum(counts[i] for i in termIndices) for termIndices in self._topicTermIndices]
+
+	def HasTopicHits(self, text, ignoreCase=False):
+		"""
+		Returns a list of bools, whether @text contains any term of each topic list, in the order of self.TopicLists.
+		"""
+		return [count > 0 for count in self.CountTopicHits(text, ignoreCase)]
+
+	def HasHit(self, text, ignoreCase=False):
+		"""
+		Returns whether @text contains any term of any topic list. This is a single scan of @text.
+		"""
+		if self._emptyTermIndex is not None:
+			return True
+		if self._pattern is None:
+			return False
+		if ignoreCase:
+			text = text.lower()
+		return self._pattern.search(text) is not None
+
+@functools.lru_cache(maxsize=256)
+def _getTopicMatcher(topicTuples, lowercase):
+	return TopicMatcher(topicTuples, lowercase)
+
+def getTopicMatcher(topicLists, lowercase=True):
+	"""
+	Returns a (cached) TopicMatcher for @topicLists, so repeated calls with the same topics don't recompile the matcher.
+	"""
+	return _getTopicMatcher(tuple(tuple(topics) for topics in topicLists), lowercase)
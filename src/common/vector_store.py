@@ -0,0 +1,149 @@
+"""
+A compact, binary, memory-mapped store for term-vector models.
+
+Parsing the fasttext '.vec' text model (cc.en.300.vec) via gensim takes minutes on every run, and every process
+then holds its own private float copy of the vectors. Instead, the text model can be converted once into a store
+directory containing:
+	vectors.bin: the raw row-major vector matrix (float32 or float16), one row per term
+	vocab.txt: the terms, one per line, in row order
+	meta.json: the shape and dtype of the matrix, and some info about its source
+
+The store opens via np.memmap in milliseconds, and since the matrix is mapped read-only, all processes reading the
+same store share the same physical pages through the os page cache.
+
+VectorStore mimics the parts of the gensim KeyedVectors interface used by cheetah (vocab, index2word, vectors,
+vector_size, model[word] and 'word in model'), so it can be wrapped with cheetah.FastTextModelWrapper like any other
+KeyedVectors model.
+"""
+
+import os
+import sys
+import json
+import shutil
+import traceback
+import numpy as np
+
+VECTORS_FNAME = "vectors.bin"
+VOCAB_FNAME = "vocab.txt"
+META_FNAME = "meta.json"
+
+
+def getStorePath(modelPath):
+	"""
+	Returns the default store directory for a text model, which is just placed next to the model: cc.en.300.vec -> cc.en.300.vec.store
+	"""
+	return modelPath.rstrip(os.sep) + ".store"
+
+def isVectorStore(storeDir):
+	return os.path.isfile(os.path.join(storeDir, META_FNAME))
+
+class VectorStore(object):
+	"""
+	A read-only term vector model backed by a memory mapped matrix. See the module header.
+	"""
+	def __init__(self, storeDir):
+		self.StoreDir = storeDir
+		with open(os.path.join(storeDir, META_FNAME), "r") as metaFile:
+			self._meta = json.load(metaFile)
+		self.vector_size = int(self._meta["dim"])
+		numVecs = int(self._meta["count"])
+		self.vectors = np.memmap(os.path.join(storeDir, VECTORS_FNAME), dtype=self._meta["dtype"], mode="r", shape=(numVecs, self.vector_size))
+		self.index2word = self._loadVocab(os.path.join(storeDir, VOCAB_FNAME), numVecs)
+		# maps each term to its row index in @vectors
+		self.vocab = dict((word, i) for i, word in enumerate(self.index2word))
+
+	def _loadVocab(self, vocabPath, numVecs):
+		with open(vocabPath, "r", encoding="utf-8") as vocabFile:
+			words = vocabFile.read().split("\n")[0:numVecs]
+		if len(words) != numVecs:
+			raise Exception("Vector store vocab {} has {} terms but the vector matrix has {} rows".format(vocabPath, len(words), numVecs))
+		return words
+
+	def __reduce__(self):
+		# Pickle only the store location; unpickling (e.g. in a worker process) re-maps the same file instead of copying the matrix.
+		return (VectorStore, (self.StoreDir,))
+
+	def __len__(self):
+		return len(self.index2word)
+
+	def __contains__(self, word):
+		return word in self.vocab
+
+	def __getitem__(self, word):
+		# Like gensim, raises KeyError for terms not in the model. Rows are always returned as float32, even for float16 stores.
+		return np.asarray(self.vectors[self.vocab[word]], dtype=np.float32)
+
+	def GetDtype(self):
+		return self._meta["dtype"]
+
+def convertVecToStore(vecPath, storeDir=None, dtype="float32", limit=None, encoding="utf-8"):
+	"""
+	One-time conversion of a word2vec/fasttext formatted text model (first line is '[count] [dim]', then one '[word] [floats...]' line per term)
+	to a VectorStore directory. The store is written to a temporary directory and renamed on completion, so an interrupted conversion never
+	leaves a partial store behind.
+
+	@vecPath: Path to the '.vec' text model
+	@storeDir: The output directory; defaults to getStorePath(@vecPath). Must not already exist.
+	@dtype: 'float32' or 'float16'. Half precision halves the store size, and is plenty for cosine similarities.
+	@limit: If not None, only the first @limit vectors are stored, same as the @limit param of gensim's load_word2vec_format.
+	Returns: the store directory, or None on failure.
+	"""
+	if storeDir is None:
+		storeDir = getStorePath(vecPath)
+	if dtype not in ["float32", "float16"]:
+		print("ERROR vector store dtype must be float32 or float16: "+str(dtype))
+		return None
+	if os.path.exists(storeDir):
+		print("ERROR vector store already exists. Move or delete it before converting: {}".format(storeDir))
+		return None
+
+	tempDir = storeDir + ".tmp"
+	if os.path.exists(tempDir):
+		shutil.rmtree(tempDir)
+	os.makedirs(tempDir)
+
+	try:
+		print("Converting {} to vector store {}...".format(vecPath, storeDir))
+		with open(vecPath, "r", encoding=encoding, errors="replace") as vecFile:
+			header = vecFile.readline().split()
+			numVecs, dim = int(header[0]), int(header[1])
+			if limit is not None:
+				numVecs = min(numVecs, limit)
+
+			vectors = np.memmap(os.path.join(tempDir, VECTORS_FNAME), dtype=dtype, mode="w+", shape=(numVecs, dim))
+			words = []
+			seen = set()
+			for i, line in enumerate(vecFile):
+				if i >= numVecs:
+					break
+				parts = line.rstrip().split(" ")
+				word = parts[0]
+				if len(parts) != dim + 1:
+					print("\nWARNING skipping malformed line {} for term {} ({} values, expected {})".format(i+2, word, len(parts)-1, dim))
+					continue
+				# same as gensim: duplicate words are ignored, keeping only the first vector
+				if word in seen:
+					continue
+				seen.add(word)
+				vectors[len(words)] = np.asarray(parts[1:], dtype=np.float32)
+				words.append(word)
+				if i % 10000 == 9999:
+					print("\r{} of {} vectors converted      ".format(i+1, numVecs), end="")
+					sys.stdout.flush()
+			vectors.flush()
+			del vectors
+
+		with open(os.path.join(tempDir, VOCAB_FNAME), "w+", encoding="utf-8") as vocabFile:
+			vocabFile.write("\n".join(words))
+		meta = {"count": len(words), "dim": dim, "dtype": dtype, "source": os.path.basename(vecPath), "limit": limit}
+		with open(os.path.join(tempDir, META_FNAME), "w+") as metaFile:
+			metaFile.write(json.dumps(meta, indent=2))
+
+		os.replace(tempDir, storeDir)
+		print("\nConverted {} vectors of dimension {} to {}".format(len(words), dim, storeDir))
+		return storeDir
+	except:
+		traceback.print_exc()
+		shutil.rmtree(tempDir, ignore_errors=True)
+
+	return None
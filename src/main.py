@@ -15,12 +15,14 @@ sys.path.append('./util')
 
 import os
 import harvard_persist
+import csv_transformer
 from datetime import datetime
 from common import cheetah
 from common import cheetah_present
-from harvard_loader import getHeadlinesFromHarvardCsv
+from harvard_loader import getTopicalHeadlinesFromHarvardCsv
 from result_collection import ResultCollection
 from data_transformer import DataTransformer
+from ascii_text_normalizer import getNormalizedTermsCacheDir
 from zipfile import ZipFile
 from util.fasttext_downloader import FastTextDownloader
 from util.file_splitter import GzSplitter
@@ -98,7 +100,7 @@ def selectFromFileList(flist, prompt="File list"):
 
 def selectDataFile(jsonDir):
 	# Select a file by name in some directory
-	jsonPaths = [path for path in listFiles(jsonDir, "json", verbose=False) if "filtered" in path ]
+	jsonPaths = [path for path in listFiles(jsonDir, verbose=False) if "filtered" in path and path.endswith((".json", ".jsonl"))]
 	jsonPath = selectFromFileList(jsonPaths, prompt="Select a repro dataset: ")
 	return os.path.join(jsonDir,jsonPath)
 
@@ -128,13 +130,14 @@ def loadDataset():
 def loadStopWordLexicon():
 	stopPath = os.path.join(lexicaDir, "stop/stopwords.txt")
 	stopLex = cheetah.Lexicon(stopPath)
-	stopLex.Words = DataTransformer.TextNormalizeTerms(stopLex.Words, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
+	stopLex.Words = DataTransformer.TextNormalizeTerms(stopLex.Words, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=getNormalizedTermsCacheDir(stopPath))
 	return stopLex
 
 def loadSentimentLexicon(sentFolder):
 	lexicon = cheetah.SentimentLexicon(sentFolder)
-	lexicon.Positives = DataTransformer.TextNormalizeTerms(lexicon.Positives, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
-	lexicon.Negatives = DataTransformer.TextNormalizeTerms(lexicon.Negatives, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
+	cacheDir = getNormalizedTermsCacheDir(sentFolder)
+	lexicon.Positives = DataTransformer.TextNormalizeTerms(lexicon.Positives, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=cacheDir)
+	lexicon.Negatives = DataTransformer.TextNormalizeTerms(lexicon.Negatives, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=cacheDir)
 	return lexicon
 
 def loadFastTextModel():
@@ -144,6 +147,17 @@ def loadFastTextModel():
 		return
 	return cheetah.loadFastTextModel(modelPath=modelPath)
 
+def convertEnglishModel():
+	# One-time conversion of the fasttext text model to a binary, memory-mapped vector store, which loads in milliseconds instead of minutes.
+	modelPath = os.path.join(modelDir, "english/cc.en.300.vec")
+	if not os.path.exists(modelPath):
+		print("ERROR: model not found at {}. Select 'Download fasttext model' in main menu to download model before converting it.".format(modelPath))
+		return
+	limitStr = input("Enter the number of vectors to convert (enter for 100000, the same limit used to load the text model, or 'all'): ").strip().lower()
+	limit = None if limitStr == "all" else int(limitStr) if len(limitStr) > 0 else 100000
+	halfPrecision = input("Store vectors as float16 to halve the store size? Enter y or n: ").lower() in ["y", "yes"]
+	cheetah.convertFastTextModel(modelPath, limit=limit, dtype="float16" if halfPrecision else "float32")
+
 def runCheetah(resultCollections):
 	topicLists = [result.Topics for collection in resultCollections for result in collection.QueryResults]
 	print("Topic lists: "+str(topicLists))
@@ -184,7 +198,11 @@ def harvardAnalyzeAndPersist():
 	#opath = dataDir+"test.csv"
 	#csvPath = dataDir+"test_out.csv"
 
-	if os.path.isfile(opath):
+	resume = False
+	if csv_transformer.isResumable(opath):
+		print("A checkpoint of an interrupted run to {} exists.".format(opath))
+		resume = input("Resume it? Enter y or n: ").lower() in ["yes","y"]
+	if os.path.isfile(opath) and not resume:
 		print("Output path already exists, and must be moved or deleted before running: {}".format(opath))
 		if input("Remove existing file? Enter y or n: ").lower() not in ["yes","y"]:
 			return
@@ -200,13 +218,25 @@ def harvardAnalyzeAndPersist():
 	sentLex = loadSentimentLexicon(sentFolder)
 	stopLex = loadStopWordLexicon()
 	csvTransformer = harvard_persist.HarvardCsvCheetahVisitor(model, sentLex, stopLex)
-	#TODO: spawn multiple threads for sections of the data; this will speed up cheetah computation on large datasets and multicore systems.
-	# 1) Split input file into n temp files
-	# 2) Spawn a thread for each file: pass the temp file and the output path/lock
-	# 3) In each thread: process each file, grab output file loc, and write out
-	# 4) Alternatively, pass output work back to main thread: have each thread write to its own temp output file, 
-	# then increment a signal; when incremented, the main thread outputs results to a single file and cleans up temp files. Or something similar.
-	csvTransformer.cheetifyHarvardCsv(csvPath, opath)
+	# The csv is split into shards on record boundaries, scored by worker processes sharing the model, and merged back in order.
+	workerStr = input("Enter the number of worker processes (enter for {}, the number of cpus): ".format(os.cpu_count())).strip()
+	numWorkers = int(workerStr) if len(workerStr) > 0 else os.cpu_count()
+	csvTransformer.cheetifyHarvardCsv(csvPath, opath, numWorkers=numWorkers, resume=resume)
+
+def exportHarvardColumns():
+	# One-time export of the cheetified csv's analysis columns to parquet, which the offline analysis loads instead of the csv
+	csvPath = dataDir+"stories_election_web_cheetofied2.csv"
+	if not os.path.isfile(csvPath):
+		print("Csv path not found: {}".format(csvPath))
+		print("First analyze and persist harvard data with cheetah (see main menu), or place the cheetified csv or a link of the same name in {} folder.".format(dataDir))
+		return
+	opath = harvard_persist.getColumnarPath(csvPath)
+	if os.path.isfile(opath):
+		print("Output path already exists, and must be moved or deleted before running: {}".format(opath))
+		if input("Remove existing file? Enter y or n: ").lower() not in ["yes","y"]:
+			return
+		os.remove(opath)
+	harvard_persist.exportCheetifiedColumns(csvPath, opath)
 
 def harvardAnalysis():
 	csvPath = dataDir+"stories_election_web.csv"
@@ -228,11 +258,10 @@ def harvardAnalysis():
 	topicLists = [trumpTopics, clintonTopics]
 	year = 2016
 
-	headlines = getHeadlinesFromHarvardCsv(csvPath, year, topicLists[0])
-	resultCollection = ResultCollection.FromResult(headlines, topicLists[0], "harvard")
-	#load the rest
-	for topicTerms in topicLists[1:]:
-		headlines = getHeadlinesFromHarvardCsv(csvPath, year, topicTerms)
+	#load all topics' headlines in a single pass over the csv
+	topicHeadlines = getTopicalHeadlinesFromHarvardCsv(csvPath, topicLists, year)
+	resultCollection = ResultCollection.FromResult(topicHeadlines[0], topicLists[0], "harvard")
+	for topicTerms, headlines in zip(topicLists[1:], topicHeadlines[1:]):
 		resultCollection.AddResult(topicTerms, headlines)
 
 	print("Result collection contains:")
@@ -258,15 +287,18 @@ def modelAnalysis():
 		return
 	vectorModel = cheetah.loadFastTextModel(modelPath=modelPath)
 	sentFolder = os.path.join(lexicaDir, "sentiment/my_gensim/")
+	# the lexicon and its signal vectors are loaded once; each query is then a single matrix-vector product
+	sentLex = cheetah.SentimentLexicon(sentFolder=sentFolder)
 	quit = False
 	while not quit:
-		queryTerms = input("Enter query terms, separated by commas. Or 'quit' to exit: ")
-		queryTerms = [q.strip() for q in queryTerms.lower().split(",") if len(q.strip()) > 0]
-		quit = "quit" in queryTerms
-		if not quit:
-			print("Query: "+str(queryTerms))
-			topicalSentiment = cheetah.netAlgebraicSentimentWrapper(queryTerms, sentFolder, vectorModel, avgByHits=True)
-			print("{} net sentiment: {}".format(queryTerms,topicalSentiment))
+		query = input("Enter query terms, separated by commas. Separate multiple topics with ';'. Or 'quit' to exit: ")
+		topicLists = [[q.strip() for q in topic.lower().split(",") if len(q.strip()) > 0] for topic in query.split(";")]
+		topicLists = [topic for topic in topicLists if len(topic) > 0]
+		quit = any("quit" in topic for topic in topicLists)
+		if not quit and len(topicLists) > 0:
+			topicalSentiments = cheetah.netAlgebraicSentimentBatch(topicLists, sentLex, vectorModel, avgByHits=True)
+			for queryTerms, topicalSentiment in zip(topicLists, topicalSentiments):
+				print("{} net sentiment: {}".format(queryTerms,topicalSentiment))
 
 def printLogo():
 	logoPaths = [os.path.join(logoDir,logoPath) for logoPath in os.listdir(logoDir)]
@@ -349,10 +381,12 @@ def mainMenu():
 	cmds = [
 		(covidSearch, "Search covid documents"),
 		(downloadEnglishModel, "Download English FastText model"),
+		(convertEnglishModel, "Convert English FastText model to binary vector store (one-time, faster loading)"),
 		(cheetahAbleAnalysis, "Cheetah ABLE-data analysis"),
 		(cheetahHarvardAnalysis, "Cheetah Harvard-Shorenstein offline analysis (use this one)"),
 		(harvardAnalysis, "Cheetah inline analysis--Harvard shorenstein"),
-		(harvardAnalyzeAndPersist, "Analyze and persist Harvard data with cheetah (Warning: 48h+ runtime!)"),
+		(harvardAnalyzeAndPersist, "Analyze and persist Harvard data with cheetah (Warning: 48h+ single-process runtime; use multiple workers!)"),
+		(exportHarvardColumns, "Export cheetified Harvard data to parquet (one-time, faster offline analysis)"),
 		(unzipHarvardData, "Unzip Harvard data (includes cheetah-score column)"),
 		(modelAnalysis, "Model Analysis"),
 		(printIntro, "Intro"),
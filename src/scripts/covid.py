@@ -18,6 +18,7 @@ sys.path.append('../util')
 
 from lexica import Lexicon
 from ascii_text_normalizer import AsciiTextNormalizer
+from term_stripper import TermStripper
 
 import json
 import re
@@ -176,6 +177,7 @@ class CovidDocumentStream(object):
 		"""
 		self._filterStopWords = filterStopWords
 		self._stopWords = self._loadStopWords()
+		self._stopStripper = TermStripper(self._stopWords)
 		self._dataset = CovidDatasetFileStream(dataDir)
 		self._limit = limit
 		self._normalizer = AsciiTextNormalizer()
@@ -221,10 +223,7 @@ class CovidDocumentStream(object):
 		return text.replace(periodAnchor, ".")
 
 	def _dropStopWords(self, text):
-		# TODO: This is extremely slow: for every character in string, lookup in stopwords
-		# 1) Find an algorithmic way to do this; e.g. pre-prepocessing
-		# 2) Use regex or other faster method
-		return " ".join([term for term in text.split() if term not in self._stopWords])
+		return self._stopStripper.Strip(text)
 
 	def __iter__(self):
 		"""
@@ -32,7 +32,7 @@ sys.path.append('../util')
 sys.path.append('../model')
 
 from lexica import SentimentLexicon
-from ascii_text_normalizer import AsciiTextNormalizer
+from ascii_text_normalizer import AsciiTextNormalizer, getSharedNormalizer, getNormalizedTermsCacheDir
 import sys
 #import sklearn
 import cheetah
@@ -130,10 +130,11 @@ def loadFastTextModel():
 
 def loadSentimentLexicon(sentFolder):
 	lexicon = cheetah.SentimentLexicon(sentFolder)
-	normalizer = AsciiTextNormalizer()
+	normalizer = getSharedNormalizer()
+	cacheDir = getNormalizedTermsCacheDir(sentFolder)
 
-	lexicon.Positives = [normalizer.NormalizeText(term, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True) for term in lexicon.Positives]
-	lexicon.Negatives = [normalizer.NormalizeText(term, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True) for term in lexicon.Negatives]
+	lexicon.Positives = normalizer.NormalizeTerms(lexicon.Positives, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=cacheDir)
+	lexicon.Negatives = normalizer.NormalizeTerms(lexicon.Negatives, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True, cacheDir=cacheDir)
 
 	return lexicon
 
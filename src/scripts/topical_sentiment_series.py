@@ -7,10 +7,14 @@ scores per content item.
 """
 
 import os
+import sys
+sys.path.append('../common')
 import datetime
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import smoothing
+from harvard_query import HarvardQueryEngine
 
 def queryTopic(df, topics):
 	"""
@@ -33,14 +37,25 @@ def convertPublishDate(df):
 	df['publish_date'] = pd.to_datetime(df['publish_date'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
 	return df
 
+# The only columns used by these analyses
+dataColumns = ["publish_date", "cheetah", "media_url", "title", "facebook_share_count"]
+
 def loadData():
-	#TODO: only read columns of interest. This reads tons on unused data.
 	dataPath = "../../data/stories_election_web_cheetofied2.csv"
 	if not os.path.isfile(dataPath):
 		dataPath = "../data/stories_election_web_cheetofied2.csv"
 
+	# prefer the typed columnar export (see harvard_persist.exportCheetifiedColumns()), which loads in under a second
+	columnarPath = os.path.splitext(dataPath)[0] + ".parquet"
+	if os.path.isfile(columnarPath):
+		try:
+			print("Loading dataset from "+columnarPath)
+			return pd.read_parquet(columnarPath, columns=dataColumns)
+		except ImportError:
+			print("pyarrow not installed, falling back to csv")
+
 	print("Loading dataset from "+dataPath)
-	df = pd.read_csv(dataPath, header=0)
+	df = pd.read_csv(dataPath, header=0, usecols=dataColumns)
 	return convertPublishDate(df)
 
 def filterByDateTimeRange(df, minDt, maxDt):
@@ -62,7 +77,7 @@ def sumAndPlotCheetahValues(grp, label=None, spanAvg=None):
 	if summed.size > 0:
 		if label is not None and len(label) > 0:
 			if spanAvg is not None and spanAvg > 1:
-				summed = summed.ewm(span=spanAvg).mean()
+				summed = pd.Series(smoothing.ewma(summed.values, spanAvg), index=summed.index)
 			ax = summed.plot(label=label)
 			ax.legend(loc=0)
 		else:
@@ -71,8 +86,8 @@ def sumAndPlotCheetahValues(grp, label=None, spanAvg=None):
 		print("Error, sum contains no data")
 
 def weightCheetahScoresByShares(df, shareCol="facebook_share_count"): #harvard data only has fb shares; other share columns are all zero or bad data.
-	df["cheetah"] = df["cheetah"] * df[shareCol]
-	return df
+	# returns a new frame, since @df may be a cached query result
+	return df.assign(cheetah=df["cheetah"] * df[shareCol])
 
 def filterCheetahNans(df):
 	# Missing cheetah values (e.g. not headline/language data) are stored as NaN. This filters them.
@@ -94,15 +109,15 @@ def filterCheetahZeroes(df):
 	"""
 	return df[ df['cheetah'] != 0.0 ]
 
-def plotTopicalCheetahTimeSeries(df, topicLists, minDt, maxDt, weightByShares=False):
+def plotTopicalCheetahTimeSeries(engine, urls, topicLists, minDt, maxDt, weightByShares=False):
 	spanAvg = 2
 	shareCol = "facebook_share_count"
 	# Plot topical cheetah values as time series, for multiple time series on a single plot
-	#@df: A source-filtered df derived from the harvard data frame. NOTE: Must have publish_date values converted to datetime before calling!
+	#@engine: A HarvardQueryEngine of the harvard data frame. NOTE: Must have publish_date values converted to datetime before calling!
+	#@urls: The sources by which to filter, see filterBySource()
+	engine.GetTopicMatrix(topicLists)
 	for topicList in topicLists:
-		dtf = filterByDateTimeRange(df, minDt, maxDt)
-		tf = queryTopic(dtf, topicList)
-		tf = filterCheetahNans(tf)
+		tf = engine.Query(urls, topicList, minDt, maxDt)
 		if weightByShares:
 			tf = weightCheetahScoresByShares(tf, shareCol)
 		grp = groupByWeekYear(tf)
@@ -134,19 +149,18 @@ def plotHist(df, col, numBins=100, weightCol=None, bestFit=True, label=None, asD
 		plt.plot(bins, ys, "--", color=lastColor, lw=2.0, alpha=1.0)
 	return n, bins, patches
 
-def plotTopicalCheetahHistograms(df, topicLists, minDt, maxDt):
+def plotTopicalCheetahHistograms(engine, urls, topicLists, minDt, maxDt):
 	"""
 	Plot topical cheetah values as histograms. One plot, multiple histograms, one for each topic.
-	@df: A source-filtered df derived from the harvard df. NOTE: Must have publish_date values converted to datetime before calling!
+	@engine: A HarvardQueryEngine of the harvard df. NOTE: Must have publish_date values converted to datetime before calling!
+	@urls: The sources by which to filter, see filterBySource()
 	"""
 	# plot basic, unweighted cheetah histogram
 	bins = 100
+	engine.GetTopicMatrix(topicLists)
 	for topicList in topicLists:
-		df = filterByDateTimeRange(df, minDt, maxDt)
-		tf = queryTopic(df, topicList)
-		tf = filterCheetahNans(tf)
 		# filtering zeroes must be done since zero is an ambiguous value: it could mean no-score or that the actual cheetah score is zero. The latter would be extremely rare, in floating point.
-		tf = filterCheetahZeroes(tf)
+		tf = engine.Query(urls, topicList, minDt, maxDt, dropNans=True, dropZeroes=True)
 		plotHist(tf, "cheetah", bins, bestFit=True, label=topicList[0])
 
 	#plt.grid(b=True, which='major', color='#666666', linestyle='-')
@@ -161,41 +175,36 @@ def plotTopicalCheetahHistograms(df, topicLists, minDt, maxDt):
 	tweet_column = "normalized_tweet_count"
 	share_column = fb_column
 	for topicList in topicLists:
-		df = filterByDateTimeRange(df, minDt, maxDt)
-		tf = queryTopic(df, topicList)
-		tf = filterCheetahNans(tf)
-		# filtering zeroes must be done since zero is an ambiguous value: it could mean no-score or that the actual cheetah score is zero. The latter would be extremely rare, in floating point.
-		tf = filterCheetahZeroes(tf)
+		tf = engine.Query(urls, topicList, minDt, maxDt, dropNans=True, dropZeroes=True)
 		plotHist(tf, "cheetah", bins, weightCol=share_column, bestFit=True, label=topicList[0])	
 
 	plt.legend(loc=0)	
 	plt.title("Cheetah histogram, weighted by "+share_column) 
 	plt.show()
 
-def filterBySource(df, urls):
+def filterBySource(df, urls, sourceIndex=None):
+	"""
+	@sourceIndex: Optionally, a SourceIndex of @df, so only its distinct urls are matched and the matching rows gathered
+	"""
 	print("Getting by source per urls: ", urls)
 
 	# If querying for all, just return all records
 	if isKleene(urls):
 		return df
 
+	if sourceIndex is not None:
+		return df.iloc[sourceIndex.GetRowPositions(urls)]
 	return df[ df['media_url'].str.contains("|".join(urls), case=False, na=False) ]
 
-def getSourceUrls(df):
+def getSourceUrls(sourceIndex):
+	# @sourceIndex: A SourceIndex of the harvard data frame, e.g. HarvardQueryEngine.Sources
 	valid = False
 	while not valid:
 		urls = [url.strip() for url in input("Enter urls separated by commas, by which to substring match on media_url: ").split(",") if len(url.strip()) > 0]
 		if len(urls) == 0:
 			print("Empty list. Re-enter urls.")
 		else:
-			if isKleene(urls):
-				urlSeries = df["media_url"]
-			else:
-				urlSeries = df[ df['media_url'].str.contains("|".join(urls), case=False) ]['media_url']
-			hitCount = urlSeries.size
-			hits = urlSeries.values.tolist()
-			# uniquify hits
-			hits = sorted(list(set(hits)))
+			hits, hitCount = sourceIndex.GetMatchingUrls(urls)
 			print("{} matching urls in data {}".format(len(hits), "\n\t"+"\n\t".join(hits)))
 			print("{} org hits (records)".format(hitCount))
 			valid = len(hits) > 0
@@ -237,22 +246,22 @@ def getTopicLists():
 	return topicLists
 
 def seriesMunging():
-	# load harvard data
+	# load harvard data, and index it once for all of the queries below
 	harvardDf = loadData()
+	engine = HarvardQueryEngine(harvardDf)
 
 	done = False
 	while not done:
 		# filter by source/organization via the media_url field
-		urls = getSourceUrls(harvardDf)
-		df = filterBySource(harvardDf, urls)
+		urls = getSourceUrls(engine.Sources)
 		# get multiple topic sets to plot
 		topicLists = getTopicLists()
 		# get topics, group by week, and plot aggregate cheetah values by week
 		minDt = datetime.datetime(year=2015, month=1, day=1)
 		maxDt = datetime.datetime(year=2016, month=12, day=31)
-		plotTopicalCheetahTimeSeries(df, topicLists, minDt, maxDt)
-		plotTopicalCheetahTimeSeries(df, topicLists, minDt, maxDt, weightByShares=True)
-		plotTopicalCheetahHistograms(df, topicLists, minDt, maxDt)
+		plotTopicalCheetahTimeSeries(engine, urls, topicLists, minDt, maxDt)
+		plotTopicalCheetahTimeSeries(engine, urls, topicLists, minDt, maxDt, weightByShares=True)
+		plotTopicalCheetahHistograms(engine, urls, topicLists, minDt, maxDt)
 		done = input("Analyze another topic and source? Enter y or n: ").lower() == "n"
 
 
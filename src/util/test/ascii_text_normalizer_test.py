@@ -0,0 +1,46 @@
+"""
+Verifies the fast paths of AsciiTextNormalizer.NormalizeText() (ascii shortcut, regex tag stripping, combined translation table)
+give exactly the same output as the original step by step pipeline, which is composed here from the normalizer's other public methods.
+"""
+
+import os
+import sys
+import random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from ascii_text_normalizer import AsciiTextNormalizer
+
+
+def reference_normalize(normalizer, text, filterNonAlphaNum, deleteFiltered, lowercase):
+	text = normalizer.EncodeAscii(text)
+	text = normalizer.DecodeInTextLinks(text)
+	if filterNonAlphaNum:
+		text = normalizer.FilterNonAlphaNum(text, deleteMode=deleteFiltered)
+	if lowercase:
+		text = text.lower()
+	return normalizer.CompressWhitespace(text)
+
+def test_matches_reference_pipeline():
+	pieces = ["Trump", " ", "   ", "\t", "\n", "\r\n", "Hillary's", "<b>", "</b>", "<a href=\"http://t.co/x?a=1\">", "</a>", "<br/>", "<I>", "</i>",
+		"<script>x</script>", "<!-- c -->", "&amp;", "&#233;", "\\u00e9", "é", "Ж", "—", "<", ">", "<div>", "<b title=\"a>b\">", "  " * 10, "!?"]
+	rng = random.Random(11)
+	normalizer = AsciiTextNormalizer()
+	for _ in range(3000):
+		text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 10)))
+		for flags in [(True, False, True), (True, True, True), (False, False, False)]:
+			assert normalizer.NormalizeText(text, *flags) == reference_normalize(normalizer, text, *flags)
+
+def test_cache_and_normalized_terms(tmp_path):
+	normalizer = AsciiTextNormalizer(cacheSize=10)
+	assert normalizer.NormalizeText("Trump's <b>Wall</b>") == normalizer.NormalizeText("Trump's <b>Wall</b>") == "trump s wall"
+	assert normalizer.GetCacheInfo().hits == 1 and normalizer.GetCacheInfo().misses == 1
+	assert AsciiTextNormalizer().GetCacheInfo() is None
+
+	terms = ["Good", "Café", "well-being"]
+	cacheDir = str(tmp_path / "lexicon.normcache")
+	normalized = normalizer.NormalizeTerms(terms, cacheDir=cacheDir)
+	assert normalized == ["good", "cafe", "well being"]
+	assert len(os.listdir(cacheDir)) == 1
+	assert AsciiTextNormalizer().NormalizeTerms(terms, cacheDir=cacheDir) == normalized
+	assert normalizer.NormalizeTerms(terms, deleteFiltered=True, cacheDir=cacheDir) == ["good", "cafe", "wellbeing"]
+	assert len(os.listdir(cacheDir)) == 2
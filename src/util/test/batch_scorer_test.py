@@ -0,0 +1,87 @@
+"""
+Verifies batch_scorer.BatchScorer gives the same cheetah scores as the per-headline loop in
+cheetah.cheetifyHeadline_optimized(), which is reproduced here since cheetah.py requires gensim.
+"""
+
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+import vector_store
+from batch_scorer import BatchScorer
+from vector_store_test import write_vec_model
+
+
+class StoreModel(object):
+	def __init__(self, store):
+		self.wv = store
+		self.vector_size = store.vector_size
+
+class Doc(object):
+	def __init__(self, text):
+		self.Text = text
+		self.Attrib = dict()
+	def GetFullText(self):
+		return self.Text
+
+def loop_score(text, sumPosUnitVec, sumNegUnitVec, model):
+	# cheetah.cheetifyHeadline_optimized()
+	avgVec = np.zeros(model.vector_size)
+	n = 0.0
+	sumSimilarity = 0.0
+	for word in text.split():
+		if word in model.wv.vocab:
+			avgVec += model.wv[word]
+			n += 1.0
+	if n > 0.0:
+		avgVec /= n
+		sumSimilarity = (avgVec.dot(sumPosUnitVec) - avgVec.dot(sumNegUnitVec)) / np.linalg.norm(avgVec)
+	return sumSimilarity
+
+def test():
+	words = ["w{}".format(i) for i in range(200)]
+	vecs = np.random.randn(len(words), 30).astype(np.float32)
+	with tempfile.TemporaryDirectory() as tempDir:
+		vecPath = os.path.join(tempDir, "test.vec")
+		write_vec_model(vecPath, words, vecs)
+		model = StoreModel(vector_store.VectorStore(vector_store.convertVecToStore(vecPath)))
+
+		sumPosUnitVec = np.sum([model.wv[w] / np.linalg.norm(model.wv[w]) for w in words[0:20]], axis=0)
+		sumNegUnitVec = np.sum([model.wv[w] / np.linalg.norm(model.wv[w]) for w in words[20:40]], axis=0)
+		texts = [" ".join(np.random.choice(words + ["oov1", "oov2"], size=np.random.randint(1, 15))) for i in range(500)]
+		texts += ["", "oov1 oov2", "w1 w1 w1 w2"]
+		docs = [Doc(text) for text in texts]
+
+		scorer = BatchScorer(model, sumPosUnitVec - sumNegUnitVec, batchSize=64)
+		scores = scorer.ScoreHeadlines(docs)
+		expected = [loop_score(text, sumPosUnitVec, sumNegUnitVec, model) for text in texts]
+		assert np.allclose(scores, expected, atol=1e-5)
+		assert all(doc.Attrib["cheetah"] == score for doc, score in zip(docs, scores))
+		assert docs[-3].Attrib["cheetah"] == 0.0 and docs[-2].Attrib["cheetah"] == 0.0
+
+class RowsOnly(object):
+	# an embedding matrix that only supports row gathers, so any product with (or conversion of) the whole matrix fails
+	def __init__(self, vectors):
+		self._vectors = vectors
+		self.shape = vectors.shape
+	def __getitem__(self, rows):
+		return self._vectors[rows]
+
+def test_gathers_only_batch_rows():
+	words = ["w{}".format(i) for i in range(100)]
+	vecs = np.random.randn(len(words), 8).astype(np.float32)
+	with tempfile.TemporaryDirectory() as tempDir:
+		vecPath = os.path.join(tempDir, "test.vec")
+		write_vec_model(vecPath, words, vecs)
+		model = StoreModel(vector_store.VectorStore(vector_store.convertVecToStore(vecPath)))
+		scorer = BatchScorer(model, np.ones(8))
+		texts = ["w3 w7 w3", "oov", "", "w99 w0"]
+		expected, expectedCounts = scorer.MeanVectors(texts)
+		scorer._vectors = RowsOnly(model.wv.vectors)
+		meanVecs, counts = scorer.MeanVectors(texts)
+		assert meanVecs.dtype == np.float64 and meanVecs.shape == (4, 8)
+		assert np.array_equal(meanVecs, expected) and counts.tolist() == [3, 0, 0, 2]
+		assert np.allclose(meanVecs[0], (2 * model.wv["w3"] + model.wv["w7"]) / 3, atol=1e-6)
+		assert np.allclose(scorer.MeanVectors([])[0], np.zeros((0, 8)))
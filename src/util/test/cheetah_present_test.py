@@ -0,0 +1,56 @@
+"""
+Verifies cheetah reports hold the same series as getCheetahScores(), and render headlessly to files without switching the pyplot backend.
+cheetah.py requires gensim, which report building and rendering don't use, so gensim is stubbed here if it is missing.
+"""
+
+import os
+import sys
+import json
+import types
+from datetime import date
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+try:
+	import gensim
+except ImportError:
+	sys.modules["gensim"] = types.ModuleType("gensim")
+
+import matplotlib
+from result_collection import ResultCollection
+import cheetah_present
+from score_aggregation_test import make_headlines
+
+
+def make_collection(name):
+	collection = ResultCollection(name)
+	collection.AddResult(["trump"], make_headlines(1, 300))
+	collection.AddResult(["clinton"], make_headlines(2, 200))
+	return collection
+
+def test_build_report():
+	collection = make_collection("cnn")
+	report = cheetah_present.buildCheetahReport(collection, date(2016, 1, 1), date(2016, 12, 31), "monthly", k=3)
+	for result, netScores in zip(collection.QueryResults, report["netScores"]):
+		scores, binKeys = cheetah_present.getCheetahScores(result.Headlines, date(2016, 1, 1), date(2016, 12, 31), "monthly", True)
+		assert netScores == scores and report["binKeys"] == binKeys
+	assert report["topicLists"] == [["trump"], ["clinton"]]
+	assert report["grossScores"] == [int(sum(scores)) for scores in report["netScores"]]
+	assert all(len(smoothed) == 12 for smoothed in report["smoothedScores"])
+	histogram = report["histograms"][0]
+	assert [sum(counts) for counts in histogram["counts"]] == [300, 200] and len(histogram["edges"]) == 76
+	assert json.loads(json.dumps(report))["netScores"] == report["netScores"]
+
+def test_render_reports_headless(tmp_path, monkeypatch):
+	def failUse(*args, **kwargs):
+		raise AssertionError("headless rendering must not switch the pyplot backend")
+	monkeypatch.setattr(matplotlib, "use", failUse)
+	reports = [cheetah_present.buildCheetahReport(make_collection(name), date(2016, 1, 1), date(2016, 12, 31), "weekly") for name in ["cnn", "fox"]]
+	assert cheetah_present.renderCheetahReports(reports, str(tmp_path), ("png", "svg"), numWorkers=1) == 2
+	files = set(os.listdir(str(tmp_path)))
+	for name in ["cnn", "fox"]:
+		prefix = name + "_trump_clinton_cheetah"
+		assert prefix + "_netscores.json" in files
+		for suffix in ["_raw_weekly", "_smoothed_2bin_avg", "_hist_75bin", "_hist_75bin_share_weighted", "_hist_as_density_75bin_share_weighted"]:
+			assert prefix + suffix + ".png" in files and prefix + suffix + ".svg" in files
+	with open(os.path.join(str(tmp_path), "cnn_trump_clinton_cheetah_netscores.json")) as jsonFile:
+		assert json.load(jsonFile)["output"][0]["scores"] == reports[0]["netScores"][0]
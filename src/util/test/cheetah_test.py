@@ -0,0 +1,108 @@
+"""
+Verifies the cached and factored cheetah computations against direct loops over the term vectors of a small random model.
+cheetah.py requires gensim, which these computations don't use, so it is stubbed here if gensim is missing.
+"""
+
+import os
+import sys
+import types
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+try:
+	import gensim
+except ImportError:
+	sys.modules["gensim"] = types.ModuleType("gensim")
+
+import cheetah
+
+
+class KeyedVectors(object):
+	# the parts of gensim's KeyedVectors that cheetah uses
+	def __init__(self, words, vectors):
+		self.index2word = list(words)
+		self.vocab = dict((word, i) for i, word in enumerate(self.index2word))
+		self.vectors = vectors
+	def __contains__(self, word):
+		return word in self.vocab
+	def __getitem__(self, word):
+		return self.vectors[self.vocab[word]]
+
+class Model(object):
+	def __init__(self, words, vectors):
+		self.wv = KeyedVectors(words, vectors)
+		self.vector_size = vectors.shape[1]
+
+def make_model(seed, numWords, dim=16):
+	rng = np.random.RandomState(seed)
+	return Model(["w{}".format(i) for i in range(numWords)], rng.randn(numWords, dim).astype(np.float32))
+
+def test_sum_unit_vec_cache(tmp_path):
+	cacheDir = str(tmp_path / "model.sigcache")
+	model = cheetah.NormalizedModelWrapper(make_model(1, 50), cacheDir, maxCachedLexica=3)
+	lexica = [["w{}".format(j) for j in range(i, i + 5)] for i in range(6)]
+	for words in lexica:
+		expected = sum(model.wv[w] / np.linalg.norm(model.wv[w]) for w in words)
+		assert np.allclose(model.GetSumUnitVec(words), expected, atol=1e-5)
+		assert np.allclose(model.GetSumUnitVec(words, persist=False), expected, atol=1e-5)
+	assert len(model._sumUnitVecs) == 3 and len(os.listdir(cacheDir)) == 6
+	# ad-hoc queries are neither cached in memory nor persisted
+	cheetah.cossimLexiconGenerator(model, ["w7", "w9", "w11"], k=5)
+	assert len(model._sumUnitVecs) == 3 and len(os.listdir(cacheDir)) == 6
+
+class SentLex(object):
+	def __init__(self, positives, negatives):
+		self.Positives = positives
+		self.Negatives = negatives
+
+def pairwise_sum_cossim(terms1, terms2, model):
+	# the double loop of cossims that sumCossim() factors
+	netSim = 0.0
+	for w1 in [w for w in terms1 if w in model.wv.vocab]:
+		for w2 in [w for w in terms2 if w in model.wv.vocab]:
+			v1, v2 = model.wv[w1].astype(np.float64), model.wv[w2].astype(np.float64)
+			netSim += v1.dot(v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
+	return netSim
+
+def pairwise_net_sentiment(queryTerms, sentLex, model, avgByHits):
+	posSim = pairwise_sum_cossim(queryTerms, sentLex.Positives, model)
+	negSim = pairwise_sum_cossim(queryTerms, sentLex.Negatives, model)
+	if not avgByHits:
+		return posSim - negSim
+	posHits = len([w for w in sentLex.Positives if w in model.wv.vocab])
+	negHits = len([w for w in sentLex.Negatives if w in model.wv.vocab])
+	return posSim / posHits - negSim / negHits
+
+def test_net_algebraic_sentiment_matches_pairwise_loop():
+	rng = np.random.RandomState(7)
+	rawModel = make_model(2, 200)
+	sentLex = SentLex(["w{}".format(i) for i in rng.choice(200, 30, replace=False)] + ["oov_pos"], ["w{}".format(i) for i in rng.choice(200, 20, replace=False)] + ["oov_neg"])
+	topicLists = [["w{}".format(i) for i in rng.choice(200, rng.randint(1, 8))] for _ in range(20)]
+	# duplicate terms, partly and wholly out-of-vocabulary topics, and an empty topic
+	topicLists += [["w3", "w3", "w5"], ["w4", "oov"], ["oov", "oov2"], []]
+	for model in [rawModel, cheetah.NormalizedModelWrapper(rawModel)]:
+		for avgByHits in [True, False]:
+			expected = [pairwise_net_sentiment(topic, sentLex, rawModel, avgByHits) for topic in topicLists]
+			assert np.allclose([cheetah.netAlgebraicSentiment(topic, sentLex, model, avgByHits) for topic in topicLists], expected, atol=1e-5)
+			assert np.allclose(cheetah.netAlgebraicSentimentBatch(topicLists, sentLex, model, avgByHits), expected, atol=1e-5)
+			assert expected[-2:] == [0.0, 0.0]
+	assert cheetah.netAlgebraicSentimentBatch([], sentLex, rawModel).tolist() == []
+	assert cheetah.netAlgebraicSentimentBatch([["oov"], []], sentLex, rawModel).tolist() == [0.0, 0.0]
+
+def test_cossim_lexicon_generator_matches_full_sort():
+	model = make_model(3, 120)
+	# exact duplicates of w3 tie with it, wherever its rank falls
+	model.wv.vectors[[10, 50, 51]] = model.wv.vectors[3]
+	n = len(model.wv.index2word)
+	for queryTerms in [["w1", "w2", "w5", "oov"], ["w3"], ["oov"]]:
+		sumQueryVec = sum((model.wv[w].astype(np.float64) / np.linalg.norm(model.wv[w]) for w in queryTerms if w in model.wv.vocab), np.zeros(model.vector_size))
+		cossims = [float(model.wv[w].astype(np.float64).dot(sumQueryVec) / np.linalg.norm(model.wv[w])) for w in model.wv.index2word]
+		# a full sort by descending cossim, with ties in model order
+		expected = sorted(range(n), key=lambda i: (-cossims[i], i))
+		for chunkSize in [None, 7, 1000]:
+			for k in [None, 1, 2, n - 1, n, n + 5] + list(range(3, n, 13)):
+				ranked = cheetah.cossimLexiconGenerator(model, queryTerms, k=k, chunkSize=chunkSize)
+				assert [term for term, _ in ranked] == [model.wv.index2word[i] for i in expected[:k]]
+				assert np.allclose([cossim for _, cossim in ranked], [cossims[i] for i in expected[:k]], atol=1e-5)
+	# a cut through the ties of w3 and its duplicates keeps the first of them, in model order
+	top = [term for term, _ in cheetah.cossimLexiconGenerator(model, ["w3"], k=3)]
+	assert top == ["w3", "w10", "w50"]
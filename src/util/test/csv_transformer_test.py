@@ -0,0 +1,181 @@
+"""
+Verifies that a csv_transformer.transformCsv() run interrupted mid-file and then resumed from its checkpoint
+produces exactly the same output as an uninterrupted run, and that transformCsvParallel() produces the same output
+as transformCsv() for any number of shards.
+"""
+
+import os
+import sys
+import csv
+import random
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+import csv_transformer
+
+
+class Interrupt(Exception):
+	pass
+
+def write_csv(path, numRecords):
+	with open(path, "w+", newline="") as csvFile:
+		writer = csv.writer(csvFile)
+		writer.writerow(["id", "text"])
+		for i in range(numRecords):
+			# include some quoted fields with embedded newlines, which span multiple lines of the file
+			writer.writerow([str(i), "line one\nline two, {}".format(i) if i % 7 == 0 else "text {}".format(i)])
+
+def append_column(rec):
+	return rec + [str(len(rec[1]))]
+
+def append_header(header):
+	return header + ["length"]
+
+def test_resume_matches_uninterrupted_run():
+	with tempfile.TemporaryDirectory() as tempDir:
+		csvPath = os.path.join(tempDir, "input.csv")
+		refPath = os.path.join(tempDir, "reference.csv")
+		opath = os.path.join(tempDir, "output.csv")
+		write_csv(csvPath, 3500)
+		csv_transformer.transformCsv(csvPath, append_column, append_header, refPath)
+
+		calls = [0]
+		def interrupted_transform(rec):
+			calls[0] += 1
+			if calls[0] == 2500:
+				raise Interrupt()
+			return append_column(rec)
+
+		csv_transformer.transformCsv(csvPath, interrupted_transform, append_header, opath)
+		assert csv_transformer.isResumable(opath)
+		csv_transformer.transformCsv(csvPath, append_column, append_header, opath, resume=True)
+		assert not csv_transformer.isResumable(opath)
+
+		with open(refPath, "rb") as refFile, open(opath, "rb") as outputFile:
+			assert refFile.read() == outputFile.read()
+
+_failId = [None]
+
+def init_failing_worker(failId):
+	_failId[0] = failId
+
+def failing_append_column(rec):
+	if rec[0] == _failId[0]:
+		raise Interrupt()
+	return append_column(rec)
+
+def test_parallel_resume_redoes_shard_killed_before_first_commit():
+	with tempfile.TemporaryDirectory() as tempDir:
+		csvPath = os.path.join(tempDir, "input.csv")
+		refPath = os.path.join(tempDir, "reference.csv")
+		opath = os.path.join(tempDir, "output.csv")
+		write_csv(csvPath, 1500)
+		csv_transformer.transformCsv(csvPath, append_column, append_header, refPath)
+
+		# record 700 is early in the second of three shards, so that shard fails before committing any records
+		csv_transformer.transformCsvParallel(csvPath, failing_append_column, append_header, opath, numWorkers=3, initializer=init_failing_worker, initargs=("700",))
+		assert not os.path.exists(opath) and csv_transformer.isResumable(opath)
+		shardPaths = [opath + ".shard{}".format(i) for i in range(3)]
+		assert [os.path.exists(shardPath + ".done") for shardPath in shardPaths] == [True, False, True]
+		# as if the shard had been killed after opening its file but before writing its first checkpoint
+		os.remove(csv_transformer.getCheckpointPath(shardPaths[1]))
+		with open(shardPaths[1], "a") as shardFile:
+			shardFile.write("partial,row\n")
+
+		csv_transformer.transformCsvParallel(csvPath, append_column, append_header, opath, numWorkers=3, resume=True)
+		assert not csv_transformer.isResumable(opath)
+		assert not any(os.path.exists(shardPath) or os.path.exists(shardPath + ".done") for shardPath in shardPaths)
+		with open(refPath, "rb") as refFile, open(opath, "rb") as outputFile:
+			assert refFile.read() == outputFile.read()
+
+def write_fuzz_csv(path, seed, numRecords, lineterminator):
+	rng = random.Random(seed)
+	pieces = ["plain", "comma, inside", "\"quoted\"", "multi\nline", "crlf\r\nline", "ünïcode", "", " "]
+	with open(path, "w+", newline="", encoding="utf-8") as csvFile:
+		writer = csv.writer(csvFile, lineterminator=lineterminator)
+		writer.writerow(["id", "text"])
+		for i in range(numRecords):
+			writer.writerow([str(i), "".join(rng.choice(pieces) for _ in range(rng.randint(0, 4)))])
+
+_stats = {"empty": 0}
+
+def counting_append_column(rec):
+	if len(rec[1]) == 0:
+		_stats["empty"] += 1
+	return append_column(rec)
+
+def pop_stats():
+	stats = dict(_stats)
+	_stats["empty"] = 0
+	return stats
+
+def test_parallel_matches_sequential_fuzz():
+	with tempfile.TemporaryDirectory() as tempDir:
+		for seed, lineterminator in [(1, "\r\n"), (2, "\n"), (3, "\r\n")]:
+			csvPath = os.path.join(tempDir, "input{}.csv".format(seed))
+			write_fuzz_csv(csvPath, seed, 300 * seed, lineterminator)
+			refPath = csvPath + ".reference"
+			csv_transformer.transformCsv(csvPath, append_column, append_header, refPath)
+			with open(csvPath, newline="", encoding="utf-8") as csvFile:
+				records = list(csv.reader(csvFile))[1:]
+			with open(refPath, "rb") as refFile:
+				reference = refFile.read()
+			numEmpty = sum(1 for rec in records if len(rec[1]) == 0)
+
+			for numShards in [1, 2, 3, 7, 50]:
+				boundaries = csv_transformer.findRecordBoundaries(csvPath, numShards)
+				assert len(boundaries) <= numShards
+				assert all(end == start for (_, end), (start, _) in zip(boundaries, boundaries[1:]))
+				# the records of the shards are exactly the records of the file, in order
+				shardRecords = []
+				for start, end in boundaries:
+					reader = csv_transformer.CsvRecordGenerator(csvPath, startOffset=start, endOffset=end, verbose=False)
+					shardRecords += list(reader)
+				assert shardRecords == records
+
+				opath = os.path.join(tempDir, "output{}_{}.csv".format(seed, numShards))
+				stats = csv_transformer.transformCsvParallel(csvPath, counting_append_column, append_header, opath, numWorkers=numShards, shardStatsFunc=pop_stats)
+				assert stats == {"empty": numEmpty}
+				with open(opath, "rb") as outputFile:
+					assert outputFile.read() == reference
+
+def test_export_columns_round_trip(tmp_path):
+	import datetime
+	import pyarrow as pa
+	import pyarrow.feather
+	import pyarrow.parquet
+	csvPath = str(tmp_path / "input.csv")
+	rows = [
+		["2016-01-02 03:04:05", "1.5", "12", "cnn", "unused"],
+		["undateable", "", "", "", "x"],
+		["", "nan?", "1.5", "fox, news", "x"],
+		["2016-12-31 23:59:59", "-2e-3", "-7", "ünïcode\nline", "x"],
+	]
+	with open(csvPath, "w+", newline="", encoding="utf-8") as csvFile:
+		writer = csv.writer(csvFile)
+		writer.writerow(["publish_date", "cheetah", "shares", "media_url", "other"])
+		writer.writerows(rows)
+	# a short record is missing its trailing columns, which are null
+	with open(csvPath, "a", encoding="utf-8") as csvFile:
+		csvFile.write("2016-05-05 00:00:00,0.25\n")
+
+	columnTypes = [("media_url", "string"), ("publish_date", "datetime"), ("cheetah", "float"), ("shares", "int")]
+	expected = {
+		"media_url": ["cnn", None, "fox, news", "ünïcode\nline", None],
+		"publish_date": [datetime.datetime(2016, 1, 2, 3, 4, 5), None, None, datetime.datetime(2016, 12, 31, 23, 59, 59), datetime.datetime(2016, 5, 5)],
+		"cheetah": [1.5, None, None, -2e-3, 0.25],
+		"shares": [12, None, None, -7, None]
+	}
+	expectedTypes = [pa.string(), pa.timestamp("ms"), pa.float64(), pa.int64()]
+	for fname, read in [("out.parquet", pyarrow.parquet.read_table), ("out.feather", pyarrow.feather.read_table)]:
+		# batches smaller than the file, so the output spans several row groups/record batches
+		opath = str(tmp_path / fname)
+		assert csv_transformer.exportCsvColumns(csvPath, opath, columnTypes, batchSize=2) == opath
+		table = read(opath)
+		assert table.column_names == [name for name, _ in columnTypes]
+		assert [field.type for field in table.schema] == expectedTypes
+		assert table.to_pydict() == expected
+	assert csv_transformer.exportCsvColumns(csvPath, str(tmp_path / "out.parquet"), columnTypes) is None
+	assert csv_transformer.exportCsvColumns(csvPath, str(tmp_path / "bad.parquet"), [("missing", "int")]) is None
+	assert csv_transformer.exportCsvColumns(csvPath, str(tmp_path / "bad.parquet"), [("shares", "bogus")]) is None
+	assert not os.path.exists(str(tmp_path / "bad.parquet"))
@@ -0,0 +1,64 @@
+"""
+Verifies the fused PrimaryResultCollectionFilter() outputs the same headlines and topics as running each filter stage in sequence.
+"""
+
+import os
+import sys
+import random
+from datetime import datetime, date
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from headline import Headline
+from result_collection import ResultCollection
+from data_transformer import DataTransformer
+
+
+def make_collections(seed):
+	rng = random.Random(seed)
+	words = ["The", "North Korea", "north  korea's", "Trump", "trump", "Clinton", "Hillary", "élu", "wins", "AP", "-", "tax", "Donald", "u.s."]
+	collections = []
+	for name in ["cnn", "fox"]:
+		collection = ResultCollection(name)
+		for topics in [["Donald", "Trump"], ["Clinton", "Hillary"], ["North Korea"]]:
+			headlines = []
+			for i in range(120):
+				h = Headline().BuildFromHarvardRecord(" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))), datetime(2016, 11, rng.randint(1, 20), rng.randint(0, 23)), 0)
+				h.Description = " ".join(rng.choice(words) for _ in range(rng.randint(0, 10)))
+				h.URI = "http://{}.com/{}".format(name, rng.randint(0, 60))
+				headlines.append(h)
+			collection.AddResult(topics, headlines)
+		collections.append(collection)
+	return collections
+
+def sequential_filter(resultCollections, dtLow, dtHigh, topicCrossFilter, removeOffTopicTerms, uniquify):
+	DataTransformer.FilterResultCollectionsByDtRange(resultCollections, dtLow, dtHigh)
+	results = [result for collection in resultCollections for result in collection.QueryResults]
+	if uniquify:
+		for result in results:
+			result.Headlines = DataTransformer.UniquifyHeadlinesByDay(result.Headlines, "URI")
+	for result in results:
+		DataTransformer.TextNormalizeHeadlines(result.Headlines)
+		result.Topics = DataTransformer.TextNormalizeTerms(result.Topics)
+	DataTransformer.CondenseMultiwordQueryTerms(resultCollections)
+	if topicCrossFilter:
+		topicUnion = [topic for topics in set(tuple(result.Topics) for result in results) for topic in topics]
+		for result in results:
+			result.Headlines = DataTransformer.TopicFilterHeadlines(result.Headlines, [topic for topic in topicUnion if topic not in result.Topics])
+	if removeOffTopicTerms:
+		DataTransformer.RemoveOffTopicTerms(resultCollections)
+	return resultCollections
+
+def snapshot(resultCollections):
+	return [(result.Topics, [h.ToDict() for h in result.Headlines]) for collection in resultCollections for result in collection.QueryResults]
+
+def test_fused_filter_matches_sequential():
+	for flags in [(False, False, False), (True, True, True), (True, False, True), (False, True, False)]:
+		expected = snapshot(sequential_filter(make_collections(20), date(2016, 11, 3), date(2016, 11, 17), *flags))
+		assert any(len(headlines) > 0 for _, headlines in expected)
+		collections = make_collections(20)
+		originalIds = set(id(h) for collection in collections for result in collection.QueryResults for h in result.Headlines)
+		fused = DataTransformer.PrimaryResultCollectionFilter(collections, date(2016, 11, 3), date(2016, 11, 17), *flags)
+		assert snapshot(fused) == expected
+		# the surviving headlines are the original objects, filtered in place
+		survivors = [h for collection in fused for result in collection.QueryResults for h in result.Headlines]
+		assert all(id(h) in originalIds for h in survivors)
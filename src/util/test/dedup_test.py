@@ -0,0 +1,39 @@
+"""
+Verifies exact dedup keeps the same headlines as per-headline GetValue() keys did, and that MinHash near-duplicate detection catches
+small edits of a text but not different texts.
+"""
+
+import os
+import sys
+import random
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from headline import Headline
+import dedup
+
+
+def test_exact_uniquify():
+	rng = random.Random(19)
+	headlines = []
+	for i in range(300):
+		h = Headline().BuildFromHarvardRecord("h", datetime(2016, 11, rng.randint(1, 5), rng.randint(0, 23)), 0)
+		h.URI = "http://cnn.com/{}".format(rng.randint(0, 40))
+		headlines.append(h)
+	byDay = dedup.uniquify(headlines, dedup.getKeyFunc(["URI"], byDay=True))
+	expected, seen = [], set()
+	for h in headlines:
+		if (h.GetValue("uri"), h.DT.date()) not in seen:
+			seen.add((h.GetValue("uri"), h.DT.date()))
+			expected.append(h)
+	assert byDay == expected
+	assert len(dedup.uniquify(headlines, dedup.getKeyFunc(["uri"]))) == len(set(h.URI for h in headlines))
+
+def test_near_duplicates():
+	index = dedup.NearDuplicateIndex(threshold=0.7)
+	assert index.AddIfUnique("trump wins the presidency in stunning upset over clinton")
+	assert not index.AddIfUnique("trump wins the presidency in a stunning upset over clinton")
+	assert not index.AddIfUnique("trump wins the presidency in stunning upset over clinton")
+	assert index.AddIfUnique("clinton concedes the election in a phone call to trump")
+	headlines = [Headline().BuildFromHarvardRecord(text, datetime(2016, 11, 9), 0) for text in ["Trump wins — AP", "Trump wins - AP", "Clinton concedes"]]
+	assert dedup.uniquifyNearDuplicates(headlines) == [headlines[0], headlines[2]]
@@ -0,0 +1,29 @@
+"""
+Verifies file_util.atomicWrite() replaces a file only once its block completes, and leaves no temporary files behind.
+"""
+
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from file_util import atomicWrite
+
+
+def test_atomic_write(tmp_path):
+	path = str(tmp_path / "out.json")
+	with atomicWrite(path, fsync=True) as ofile:
+		ofile.write("first")
+		assert not os.path.exists(path)
+	try:
+		with atomicWrite(path, encoding="utf-8") as ofile:
+			ofile.write("second")
+			raise KeyboardInterrupt()
+	except KeyboardInterrupt:
+		pass
+	with open(path) as ifile:
+		assert ifile.read() == "first"
+	with atomicWrite(path, "wb") as ofile:
+		ofile.write(b"third")
+	with open(path, "rb") as ifile:
+		assert ifile.read() == b"third"
+	assert os.listdir(str(tmp_path)) == ["out.json"]
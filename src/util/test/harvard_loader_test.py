@@ -0,0 +1,73 @@
+"""
+Verifies harvard_loader.getTopicalHeadlinesFromHarvardCsv() returns, in a single pass, the same headlines per topic as the
+per-topic passes of the original getHeadlinesFromHarvardCsv(), which is reproduced here.
+"""
+
+import os
+import sys
+import csv
+import random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+import harvard_loader
+from data_transformer import DataTransformer
+from ascii_text_normalizer import AsciiTextNormalizer
+
+
+def write_harvard_csv(path, seed, numRecords):
+	rng = random.Random(seed)
+	words = ["Trump", "Donald", "Clinton's", "HILLARY", "wins", "e-mail", "Café", "debate", "trumpet"]
+	with open(path, "w+", newline="", encoding="utf-8") as csvFile:
+		writer = csv.writer(csvFile)
+		writer.writerow(["stories_id", "title", "url", "publish_date"] + ["col{}".format(i) for i in range(4, 11)] + ["facebook_share_count"])
+		for i in range(numRecords):
+			title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+			date = rng.choice(["undateable", "2015-12-31 23:59:59", "2016-{:02d}-{:02d} 12:00:00".format(rng.randint(1, 12), rng.randint(1, 28))])
+			record = [str(i), title, "http://cnn.com/{}".format(i), date] + [""] * 7 + [str(rng.randint(0, 500))]
+			# some records are too short or malformed to parse, and are skipped
+			if i % 50 == 0:
+				record = record[:5]
+			writer.writerow(record)
+
+def per_topic_pass(csvPath, targetYear, targetTerms):
+	# the original getHeadlinesFromHarvardCsv(), run once per topic
+	headlines = []
+	if targetTerms is not None:
+		targetTerms = [term.lower() for term in targetTerms]
+	normalizer = AsciiTextNormalizer()
+	with open(csvPath, "r", encoding="utf-8") as infile:
+		csvReader = csv.reader(infile)
+		next(csvReader)
+		for record in csvReader:
+			headline = harvard_loader.harvardRecordToHeadline(record)
+			if headline is not None:
+				DataTransformer.TextNormalizeHeadline(headline, normalizer, filterNonAlphaNum=True, deleteFiltered=False, lowercase=True)
+				if targetYear is None or (headline.DT is not None and headline.DT.year == targetYear):
+					if targetTerms is None or any(term in headline.Headline for term in targetTerms):
+						headlines.append(headline)
+	return headlines
+
+def key(headline):
+	return (headline.Headline, headline.DT, headline.Attrib["share_count"])
+
+def test_single_pass_matches_per_topic_passes(tmp_path):
+	csvPath = str(tmp_path / "harvard.csv")
+	write_harvard_csv(csvPath, 8, 1000)
+	topicLists = [["trump", "Donald"], ["clinton", "hillary"], ["e-mail"], None, ["nothing"]]
+	for targetYear in [None, 2016]:
+		topicHeadlines = harvard_loader.getTopicalHeadlinesFromHarvardCsv(csvPath, topicLists, targetYear)
+		assert len(topicHeadlines) == len(topicLists)
+		for targetTerms, headlines in zip(topicLists, topicHeadlines):
+			assert [key(h) for h in headlines] == [key(h) for h in per_topic_pass(csvPath, targetYear, targetTerms)]
+		assert len(topicHeadlines[-1]) == 0
+		if targetYear is not None:
+			assert all(h.DT.year == targetYear for headlines in topicHeadlines for h in headlines)
+		# a headline on several topics is a distinct copy in each, with its own Attrib
+		trumpHeadlines = dict((h.Headline, h) for h in topicHeadlines[0])
+		shared = [h for h in topicHeadlines[1] if h.Headline in trumpHeadlines]
+		assert len(shared) > 0
+		for h in shared:
+			assert h is not trumpHeadlines[h.Headline] and h.Attrib is not trumpHeadlines[h.Headline].Attrib
+	# the year filter drops the undateable and 2015 headlines
+	assert len(harvard_loader.getTopicalHeadlinesFromHarvardCsv(csvPath, [None], 2016)[0]) < len(per_topic_pass(csvPath, None, None))
+	assert [key(h) for h in harvard_loader.getHeadlinesFromHarvardCsv(csvPath, 2016, ["trump"])] == [key(h) for h in per_topic_pass(csvPath, 2016, ["trump"])]
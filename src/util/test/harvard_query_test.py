@@ -0,0 +1,80 @@
+"""
+Verifies HarvardQueryEngine queries return the same rows as filtering the data frame by source, date, topic regex and score in turn.
+"""
+
+import os
+import sys
+import random
+import warnings
+from datetime import datetime
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../scripts"))
+
+from harvard_query import HarvardQueryEngine
+
+
+def make_df(seed, n):
+	rng = random.Random(seed)
+	words = ["Trump", "trump's", "Donald", "Clinton", "HILLARY", "wins", "north korea", "e-mail", "email"]
+	rows = []
+	for i in range(n):
+		title = None if rng.random() < 0.05 else " ".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+		date = pd.NaT if rng.random() < 0.03 else datetime(2016, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23))
+		score = rng.choice([np.nan, 0.0, rng.uniform(-2, 2), rng.uniform(-2, 2)])
+		rows.append({"publish_date": date, "title": title, "media_url": rng.choice(["http://cnn.com", "http://foxnews.com", None]), "cheetah": score})
+	return pd.DataFrame(rows)
+
+def reference_query(df, urls, topics, minDt, maxDt, dropZeroes):
+	if "*" not in urls:
+		df = df[df["media_url"].str.contains("|".join(urls), case=False, na=False)]
+	df = df[(df["publish_date"] >= minDt) & (df["publish_date"] <= maxDt)]
+	if "*" not in topics:
+		with warnings.catch_warnings():
+			# the old queryTopic() warned about patterns with groups
+			warnings.simplefilter("ignore", UserWarning)
+			df = df[df["title"].str.contains("|".join(topics), case=False, regex=True, na=False)]
+	df = df[df["cheetah"].notnull()]
+	if dropZeroes:
+		df = df[df["cheetah"] != 0.0]
+	return df
+
+def test_queries_match_reference():
+	df = make_df(24, 3000)
+	engine = HarvardQueryEngine(df)
+	topicLists = [["trump", "donald"], ["Clinton", "hillary"], ["e-?mail"], ["north korea"], ["*"], [r"(\w+) \1"]]
+	matrix = engine.GetTopicMatrix(topicLists)
+	assert list(matrix.columns) == list(range(len(topicLists)))
+	# topic lists sharing a first term keep their own columns
+	sameFirst = engine.GetTopicMatrix([["trump"], ["trump", "clinton"]])
+	assert sameFirst.shape[1] == 2 and (sameFirst[1] & ~sameFirst[0]).any()
+	minDt, maxDt = datetime(2016, 3, 1), datetime(2016, 9, 15, 12)
+	for urls in [["cnn"], ["*"], ["fox", "CNN"]]:
+		for topics in topicLists:
+			for dropZeroes in [False, True]:
+				result = engine.Query(urls, topics, minDt, maxDt, dropZeroes=dropZeroes)
+				expected = reference_query(df, urls, topics, minDt, maxDt, dropZeroes)
+				assert sorted(result.index) == sorted(expected.index)
+				assert engine.Query(urls, topics, minDt, maxDt, dropZeroes=dropZeroes) is result
+	assert len(engine.Query(["*"], ["*"], datetime(2017, 1, 1), datetime(2015, 1, 1))) == 0
+
+def test_source_index_matches_str_contains():
+	from harvard_query import SourceIndex
+	df = make_df(25, 2000)
+	df["media_url"] = [url + "/" + str(i % 7) if isinstance(url, str) else url for i, url in enumerate(df["media_url"])]
+	index = SourceIndex(df)
+	for urls in [["cnn"], ["FOX", "cnn.com/3"], ["nothing"], [r"cnn\.com/[12]"]]:
+		expected = df[df["media_url"].str.contains("|".join(urls), case=False, na=False)]
+		assert df.iloc[index.GetRowPositions(urls)].index.tolist() == expected.index.tolist()
+		hits, numRows = index.GetMatchingUrls(urls)
+		assert hits == sorted(set(expected["media_url"])) and numRows == len(expected)
+	assert len(index.GetRowPositions(["*"])) == len(df) and index.GetMatchingUrls(["*"])[1] == len(df)
+
+def test_filter_by_source_with_engine_index():
+	from topical_sentiment_series import filterBySource
+	df = make_df(26, 2000)
+	engine = HarvardQueryEngine(df)
+	for urls in [["cnn"], ["FOX"], ["*"]]:
+		expected = df if "*" in urls else df[df["media_url"].str.contains("|".join(urls), case=False, na=False)]
+		assert filterBySource(df, urls, engine.Sources).index.tolist() == expected.index.tolist()
@@ -0,0 +1,45 @@
+"""
+Verifies the slotted Headline still copies, pickles and round-trips through ToDict()/FromDict(), and interns repeated string fields.
+"""
+
+import os
+import sys
+import copy
+import pickle
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from headline import Headline
+
+
+def test_slotted_headline():
+	h = Headline().BuildFromHarvardRecord("trump wins", datetime(2016, 11, 9, 3, 0, 0), 12)
+	assert not hasattr(h, "__dict__")
+	for other in [copy.copy(h), pickle.loads(pickle.dumps(h))]:
+		assert other.ToDict() == h.ToDict()
+
+	d = h.ToDict()
+	d["layout"] = "".join(["top", "-story"])
+	h2 = Headline()
+	assert h2.FromDict(d)
+	assert h2.ToDict() == d
+	assert h2.Layout is sys.intern("top-story")
+
+def test_from_dicts():
+	h = Headline().BuildFromHarvardRecord("trump wins", datetime(2016, 11, 9, 3, 0, 0), 12)
+	d = h.ToDict(filterSource=False)
+	partial = {"headline": "x", "datetime": "2016-1-9 1:02:03", "rank": "3", "imageuri": "i", "id": 4}
+	bad = dict(d, datetime="2016-11-09T03:00:00")
+	loaded = Headline.FromDicts([d, partial, bad])
+	assert len(loaded) == 2
+	assert loaded[0].ToDict(filterSource=False) == d
+	assert loaded[1].DT == datetime(2016, 1, 9, 1, 2, 3) and loaded[1].Rank == 3 and loaded[1].Thumbnail == "i"
+	assert Headline.ToDicts(loaded[:1]) == [h.ToDict()]
+
+def test_to_dict_aware_datetimes():
+	from datetime import timezone, timedelta
+	utc = Headline().BuildFromHarvardRecord("a", datetime(2016, 10, 23, 12, 0, 0, tzinfo=timezone.utc), 0)
+	est = Headline().BuildFromHarvardRecord("b", datetime(2016, 10, 23, 7, 0, 0, tzinfo=timezone(timedelta(hours=-5))), 0)
+	assert utc.DT == est.DT
+	assert utc.ToDict()["datetime"] == "2016-10-23 12:00:00"
+	assert est.ToDict()["datetime"] == "2016-10-23 07:00:00"
@@ -0,0 +1,50 @@
+"""
+Verifies result collections round-trip through the JSON Lines format, both loaded whole and iterated lazily.
+"""
+
+import os
+import sys
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from headline import Headline
+from result_collection import ResultCollection
+
+
+def make_headline(text, day):
+	return Headline().BuildFromHarvardRecord(text, datetime(2016, 11, day, 12, 0, 0), day)
+
+def test_jsonl_round_trip(tmp_path):
+	collections = [ResultCollection("cnn"), ResultCollection("fox"), ResultCollection("empty")]
+	collections[0].AddResult(["trump", "donald"], [make_headline("trump wins", 9), make_headline("donald élu", 10)])
+	collections[0].AddResult(["clinton"], [])
+	collections[1].AddResult(["clinton"], [make_headline("clinton concedes", 9)])
+	savePath = str(tmp_path / "filtered.jsonl")
+	ResultCollection.SaveCollections(collections, savePath)
+
+	loaded = ResultCollection.LoadCollections(savePath)
+	assert [c.Name for c in loaded] == ["cnn", "fox", "empty"]
+	for collection, other in zip(collections, loaded):
+		assert [r.Topics for r in collection.QueryResults] == [r.Topics for r in other.QueryResults]
+		assert [[h.ToDict() for h in r.Headlines] for r in collection.QueryResults] == [[h.ToDict() for h in r.Headlines] for r in other.QueryResults]
+
+	triples = list(ResultCollection.IterJsonl(savePath))
+	assert [(name, topics, h.Headline) for name, topics, h in triples] == [("cnn", ["donald", "trump"], "trump wins"), ("cnn", ["donald", "trump"], "donald élu"), ("fox", ["clinton"], "clinton concedes")]
+
+def test_dt_index_matches_linear_scan():
+	import random
+	from datetime import date
+	from result_collection import QueryResult
+	rng = random.Random(17)
+	headlines = [make_headline("h{}".format(i), rng.randint(1, 30)) for i in range(200)]
+	result = QueryResult(["trump"], headlines)
+	for _ in range(50):
+		lowDate, highDate = date(2016, 11, rng.randint(1, 30)), date(2016, 11, rng.randint(1, 30))
+		assert result.FilterByDtDate(lowDate, highDate) == [h for h in headlines if h.IsInDateRange(lowDate, highDate)]
+	assert result.GetMinMaxDt() == (min(h.DT for h in headlines), max(h.DT for h in headlines))
+
+	#appending invalidates the index, and undated headlines fall back to scanning
+	result.Headlines.append(Headline().BuildFromHarvardRecord("late", datetime(2017, 1, 1), 0))
+	assert result.GetMinMaxDt()[1] == datetime(2017, 1, 1)
+	result.Headlines.append(Headline().BuildFromHarvardRecord("undated", None, 0))
+	assert result.GetDtIndex() is None
@@ -0,0 +1,52 @@
+"""
+Verifies HeadlineScores bins and histograms match the per-headline python lists and matplotlib-equivalent histograms they replace.
+"""
+
+import os
+import sys
+import random
+from datetime import datetime, date
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from headline import Headline
+from score_aggregation import HeadlineScores, getCollectionScoreRange
+
+
+def make_headlines(seed, n):
+	rng = random.Random(seed)
+	headlines = []
+	for i in range(n):
+		h = Headline().BuildFromHarvardRecord("h", datetime(2016, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23)), 0)
+		h.Attrib["cheetah"] = rng.uniform(-3, 3)
+		if rng.random() < 0.7:
+			h.Attrib["share_count"] = rng.choice([0, -1, 5, 120])
+		headlines.append(h)
+	return headlines
+
+def test_histograms_match_lists():
+	headlines = make_headlines(21, 500)
+	scores = HeadlineScores(headlines)
+	sents = [h.Attrib["cheetah"] for h in headlines]
+	weights = [h.Attrib["share_count"] if "share_count" in h.Attrib and h.Attrib["share_count"] > 0 else 1 for h in headlines]
+	valueRange = getCollectionScoreRange([scores, HeadlineScores([])])
+	assert valueRange == (min(sents), max(sents))
+	for density in [False, True]:
+		counts, edges = scores.Histogram(75, valueRange, density=density)
+		expected, expectedEdges = np.histogram(sents, 75, valueRange, density=density)
+		assert np.allclose(counts, expected) and np.array_equal(edges, expectedEdges)
+		counts, _ = scores.Histogram(75, valueRange, shareWeighted=True, density=density)
+		assert np.allclose(counts, np.histogram(sents, 75, valueRange, weights=weights, density=density)[0])
+	assert abs(scores.GetMeanScore() - sum(sents) / len(sents)) < 1e-9
+	assert getCollectionScoreRange([HeadlineScores([])]) is None
+
+def test_bin_scores_by_month():
+	headlines = make_headlines(22, 300)
+	binKeys, counts, sums, means = HeadlineScores(headlines).BinScores(date(2016, 1, 1), date(2016, 12, 31), "monthly")
+	assert binKeys == [(month, 2016) for month in range(1, 13)]
+	for i, (month, year) in enumerate(binKeys):
+		binSents = [h.Attrib["cheetah"] for h in headlines if h.DT.month == month]
+		assert counts[i] == len(binSents)
+		assert abs(sums[i] - sum(binSents)) < 1e-9
+	# the bin range defaults to the headline date range
+	assert HeadlineScores(headlines).BinScores(dtGrouping="monthly")[0] == binKeys
@@ -0,0 +1,34 @@
+"""
+Verifies the cumulative-sum moving averages and filtered EWMA match pandas' rolling(center=True) and ewm(span=...) means.
+"""
+
+import os
+import sys
+import random
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+import smoothing
+
+
+def test_moving_average_matches_pandas():
+	rng = random.Random(23)
+	seq = [rng.uniform(-10, 10) for _ in range(500)]
+	for k in [1, 2, 3, 4, 7]:
+		expected = pd.Series(seq).rolling(k, center=True).mean().values
+		assert np.allclose(smoothing.movingAverage(seq, k, edges="nan"), expected, equal_nan=True)
+		assert np.allclose(smoothing.movingAverage(seq, k, edges="trim"), expected[~np.isnan(expected)])
+		shrunk = smoothing.movingAverage(seq, k)
+		assert np.allclose(shrunk, pd.Series(seq).rolling(k, center=True, min_periods=1).mean().values)
+	assert smoothing.movingAverage([1.0, 2.0, 4.0], 2).tolist() == [1.0, 1.5, 3.0]
+	assert len(smoothing.movingAverage([], 3)) == 0
+	assert smoothing.movingAverage(seq, 3, edges="bogus") is None
+
+def test_ewma_matches_pandas():
+	rng = random.Random(24)
+	seq = [rng.uniform(-10, 10) for _ in range(2000)]
+	for span in [2, 3, 10]:
+		for adjust in [True, False]:
+			assert np.allclose(smoothing.ewma(seq, span, adjust), pd.Series(seq).ewm(span=span, adjust=adjust).mean().values)
+	assert len(smoothing.ewma([], 2)) == 0
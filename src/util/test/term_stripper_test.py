@@ -0,0 +1,26 @@
+"""
+Verifies term_stripper.TermStripper removes terms only as whole tokens, including multi-token terms, as the token list filter it replaces.
+"""
+
+import os
+import sys
+import random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from term_stripper import TermStripper, getTermStripper
+
+
+def test_strips_whole_tokens():
+	stripper = TermStripper(["the", "don t", "at", " ", "trump"])
+	assert stripper.Strip("the therapy at the  office") == "therapy office"
+	assert stripper.Strip("trumps day, don t   tell\tthe donald") == "trumps day, tell donald"
+	assert stripper.Strip("") == ""
+	assert getTermStripper(["a", "b"]) is getTermStripper(set(["b", "a"]))
+
+def test_matches_token_filter():
+	rng = random.Random(13)
+	vocab = ["a", "b", "ab", "ba", "c"]
+	for _ in range(500):
+		terms = [rng.choice(vocab) for _ in range(rng.randint(0, 4))]
+		text = " ".join(rng.choice(vocab) for _ in range(rng.randint(0, 12)))
+		assert TermStripper(terms).Strip(text) == " ".join(token for token in text.split() if token not in terms)
@@ -0,0 +1,54 @@
+"""
+Verifies time_binning gives the same bins as the day-by-day iteration of the former DataTransformer.BetterBinHeadlinesByWeek/Month,
+including the calendar-year week keys and the leading week 52/53 rotation, and the same per-bin sums and means.
+"""
+
+import os
+import sys
+import random
+import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+import time_binning
+
+
+def day_by_day_bins(dts, lowDate, highDate, keyFunc, rotate):
+	keys, index = [], {}
+	day = lowDate
+	while day <= highDate:
+		if keyFunc(day) not in index:
+			index[keyFunc(day)] = len(keys)
+			keys.append(keyFunc(day))
+		day += datetime.timedelta(days=1)
+	bins = [(key, []) for key in keys]
+	for i, dt in enumerate(dts):
+		bins[index[keyFunc(dt)]][1].append(i)
+	for week in ([52, 53] if rotate else []):
+		if bins[0][0][0] == week:
+			bins = bins[1:] + bins[:1]
+	return bins
+
+def test_matches_day_by_day_binning():
+	rng = random.Random(18)
+	keyFuncs = {
+		"daily": (lambda d: (d.day, d.month, d.year)),
+		"weekly": (lambda d: (d.isocalendar()[1], d.year)),
+		"monthly": (lambda d: (d.month, d.year)),
+		"yearly": (lambda d: (d.year,))
+	}
+	for _ in range(40):
+		lowDate = datetime.date(2014, 12, 1) + datetime.timedelta(days=rng.randint(0, 800))
+		highDate = lowDate + datetime.timedelta(days=rng.randint(0, 500))
+		dts = [datetime.datetime.combine(lowDate, datetime.time(rng.randint(0, 23))) + datetime.timedelta(days=rng.randint(0, (highDate - lowDate).days)) for _ in range(rng.randint(0, 60))]
+		scores = [rng.uniform(-1, 1) for _ in dts]
+		for dtGrouping, keyFunc in keyFuncs.items():
+			expected = day_by_day_bins(dts, lowDate, highDate, keyFunc, dtGrouping == "weekly")
+			binKeys, counts, sums, means = time_binning.binScores(dts, scores, lowDate, highDate, dtGrouping)
+			assert binKeys == [key for key, _ in expected]
+			assert counts.tolist() == [len(indices) for _, indices in expected]
+			assert sums.tolist() == [sum(scores[i] for i in indices) for _, indices in expected]
+			assert means.tolist() == [sum(scores[i] for i in indices) / len(indices) if indices else 0.0 for _, indices in expected]
+
+def test_out_of_range():
+	assert time_binning.binScores([datetime.datetime(2016, 1, 5)], [1.0], datetime.date(2016, 1, 6), datetime.date(2016, 2, 1)) is None
+	assert time_binning.binScores([None], [1.0], datetime.date(2016, 1, 1), datetime.date(2016, 2, 1)) is None
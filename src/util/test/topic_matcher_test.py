@@ -0,0 +1,37 @@
+"""
+Verifies topic_matcher.TopicMatcher gives the same hits as the per-term str.count and 'in' matching it replaces, including
+overlapping terms, terms which are prefixes of one another, mixed case and non-ascii text.
+"""
+
+import os
+import sys
+import random
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+from topic_matcher import TopicMatcher, getTopicMatcher
+
+
+def random_text(rng, alphabet, length):
+	return "".join(rng.choice(alphabet) for _ in range(length))
+
+def test_matches_str_count():
+	rng = random.Random(7)
+	alphabet = ["a", "b", "A", "B", " ", "aa", "ab", "É", "é", "İ"]
+	for _ in range(300):
+		topicLists = [[random_text(rng, alphabet, rng.randint(1, 3)) for _ in range(rng.randint(1, 4))] for _ in range(rng.randint(1, 3))]
+		matcher = TopicMatcher(topicLists)
+		for _ in range(10):
+			text = random_text(rng, alphabet, rng.randint(0, 30))
+			lowered = text.lower()
+			expected = [sum(lowered.count(term.lower()) for term in topics) for topics in topicLists]
+			assert matcher.CountTopicHits(text, ignoreCase=True) == expected
+			assert matcher.HasHit(text, ignoreCase=True) == any(count > 0 for count in expected)
+			# case-sensitive matching against the (lowercased) topic terms, as in Headline.HasTopicalHeadlineHit()
+			assert matcher.HasTopicHits(text) == [any(term.lower() in text for term in topics) for topics in topicLists]
+
+def test_cached_and_empty_terms():
+	assert getTopicMatcher([["Trump", "donald"]]) is getTopicMatcher([["Trump", "donald"]])
+	matcher = TopicMatcher([["trump", "trumps", "trump"], [""], []])
+	assert matcher.CountTopicHits("trumps trump") == [5, 13, 0]
+	assert matcher.HasHit("clinton")
+	assert not TopicMatcher([[]]).HasHit("clinton")
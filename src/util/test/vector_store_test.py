@@ -0,0 +1,42 @@
+"""
+Round-trips a small word2vec-formatted text model through vector_store.convertVecToStore() and checks
+the memory-mapped VectorStore returns the same vectors as the text model, in both float32 and float16.
+"""
+
+import os
+import sys
+import pickle
+import tempfile
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../common"))
+
+import vector_store
+
+
+def write_vec_model(path, words, vecs):
+	with open(path, "w+", encoding="utf-8") as ofile:
+		ofile.write("{} {}\n".format(len(words), vecs.shape[1]))
+		for word, vec in zip(words, vecs):
+			ofile.write(word+" "+" ".join("{:.5f}".format(v) for v in vec)+" \n")
+
+def test():
+	words = ["the", "cheetah", "über", "fast", "the"]
+	vecs = np.random.rand(len(words), 12).astype(np.float32)
+	with tempfile.TemporaryDirectory() as tempDir:
+		vecPath = os.path.join(tempDir, "test.vec")
+		write_vec_model(vecPath, words, vecs)
+		for dtype, tolerance in [("float32", 1e-5), ("float16", 1e-3)]:
+			storeDir = vector_store.convertVecToStore(vecPath, os.path.join(tempDir, dtype), dtype=dtype)
+			store = vector_store.VectorStore(storeDir)
+			# the duplicate 'the' is ignored, like gensim
+			assert store.index2word == ["the", "cheetah", "über", "fast"]
+			assert store.vector_size == 12
+			assert "cheetah" in store and "leopard" not in store
+			for i, word in enumerate(store.index2word):
+				assert store[word].dtype == np.float32
+				assert np.allclose(store[word], vecs[i], atol=tolerance)
+			# pickling re-maps the store rather than copying it
+			assert np.array_equal(pickle.loads(pickle.dumps(store))["fast"], store["fast"])
+
+		limited = vector_store.VectorStore(vector_store.convertVecToStore(vecPath, os.path.join(tempDir, "limited"), limit=2))
+		assert limited.index2word == ["the", "cheetah"]